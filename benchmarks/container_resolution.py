@@ -0,0 +1,60 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+"""
+Controller resolution benchmark.
+
+Compares the resolution of the dummy extension controllers using the plain
+pinject reflection (ObjectGraph.provide) against the precomputed injection
+plans of the Container.
+
+    python -m benchmarks.container_resolution
+"""
+import timeit
+from logging import getLogger, LoggerAdapter
+
+import pinject
+
+from connect.client import ConnectClient
+from connect.processors_toolkit.dependency_injection.container import Container, Dependencies
+
+from tests.dummy_extension.actions import SSO
+from tests.dummy_extension.custom_events import HelloWorld
+
+NUMBER = 20000
+
+
+def main():
+    client = ConnectClient('Key', use_specs=False)
+    logger = LoggerAdapter(getLogger('benchmark'), {})
+    config = {'my_app_name': 'benchmark'}
+
+    class Spec(pinject.BindingSpec):
+        def configure(self, bind):
+            bind('client', to_instance=client)
+            bind('logger', to_instance=logger)
+            bind('config', to_instance=config)
+            bind('my_app_name', to_instance=config['my_app_name'])
+
+    graph = pinject.new_object_graph(binding_specs=[Spec()], modules=None)
+
+    dependencies = Dependencies()
+    dependencies.to_instance('config', config)
+    dependencies.to_instance('my_app_name', config['my_app_name'])
+    dependencies.per_request('client')
+    dependencies.per_request('logger')
+
+    container = Container(dependencies).compile([SSO, HelloWorld])
+    child = container.child({'client': client, 'logger': logger})
+
+    print(f'{"controller":<12} {"pinject provide (us)":>22} {"injection plan (us)":>22}')
+    for controller in [SSO, HelloWorld]:
+        before = timeit.timeit(lambda c=controller: graph.provide(c), number=NUMBER) / NUMBER * 1e6
+        after = timeit.timeit(lambda c=controller: child.get(c), number=NUMBER) / NUMBER * 1e6
+        print(f'{controller.__name__:<12} {before:>22.2f} {after:>22.2f}')
+
+
+if __name__ == '__main__':
+    main()
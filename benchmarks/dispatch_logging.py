@@ -0,0 +1,64 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+"""
+Dispatch logging benchmark.
+
+Compares the eager f-string debug logging of a large request against the
+level-gated and lazy logging of the router, with DEBUG disabled and
+enabled (the records are formatted by a handler that discards them).
+
+    python -m benchmarks.dispatch_logging
+"""
+import logging
+import timeit
+from logging import getLogger, LoggerAdapter
+
+from connect.processors_toolkit.logger import LazyRepr
+
+NUMBER = 20000
+
+
+def make_request() -> dict:
+    return {
+        'id': 'PR-0000-0000-0000-001',
+        'type': 'purchase',
+        'asset': {
+            'id': 'AS-0000-0000-0000',
+            'params': [{'id': f'PARAM_{i}', 'value': 'x' * 64} for i in range(200)],
+        },
+    }
+
+
+def eager(logger: LoggerAdapter, request: dict):
+    logger.debug(f"Processing product action: {request}")
+
+
+def lazy(logger: LoggerAdapter, request: dict):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Processing %s: %s", 'product action', LazyRepr(request))
+
+
+def main():
+    class DiscardHandler(logging.Handler):
+        def emit(self, record: logging.LogRecord):
+            self.format(record)
+
+    base = getLogger('benchmark.dispatch_logging')
+    base.addHandler(DiscardHandler())
+    base.propagate = False
+    logger = LoggerAdapter(base, {})
+    request = make_request()
+
+    print(f'{"level":<8} {"eager f-string (us)":>22} {"lazy (us)":>12}')
+    for level in [logging.INFO, logging.DEBUG]:
+        base.setLevel(level)
+        before = timeit.timeit(lambda: eager(logger, request), number=NUMBER) / NUMBER * 1e6
+        after = timeit.timeit(lambda: lazy(logger, request), number=NUMBER) / NUMBER * 1e6
+        print(f'{logging.getLevelName(level):<8} {before:>22.2f} {after:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ from typing import Any, Callable, Dict, List, Optional, Union
 from connect.client import AsyncConnectClient, ClientError, ConnectClient
 from connect.processors_toolkit.requests import RequestBuilder
 from connect.processors_toolkit.requests.assets import AssetBuilder
+from connect.processors_toolkit.retry import RetryPolicy
 
 ASSET = 'asset'
 APPROVE = 'approve'
@@ -27,13 +28,25 @@ PARAMS = 'params'
 
 
 class WithAssetHelper:
+    """
+    Connect asset and asset request helpers.
+
+    If a retry_policy is set, the transient Connect errors of the idempotent
+    calls (the asset and request lookups and the parameters update) are
+    retried before reaching the on_error callbacks. The status transitions
+    (approve, fail and inquire) are never retried.
+    """
     client: Union[ConnectClient, AsyncConnectClient]
+    retry_policy: Optional[RetryPolicy] = None
+
+    def _call_connect(self, call: Callable[[], Any]) -> Any:
+        return call() if self.retry_policy is None else self.retry_policy.call(call)
 
     def find_asset(self, asset_id: str) -> AssetBuilder:
-        return AssetBuilder(self.client.assets[asset_id].get())
+        return AssetBuilder(self._call_connect(lambda: self.client.assets[asset_id].get()))
 
     def find_asset_request(self, request_id: str) -> RequestBuilder:
-        return RequestBuilder(self.client.requests[request_id].get())
+        return RequestBuilder(self._call_connect(lambda: self.client.requests[request_id].get()))
 
     def approve_asset_request(
             self,
@@ -148,11 +161,11 @@ class WithAssetHelper:
             def on_error(error: ClientError):
                 raise error
         try:
-            updated = RequestBuilder(self.client.requests[request.id()].update(payload={
+            updated = RequestBuilder(self._call_connect(lambda: self.client.requests[request.id()].update(payload={
                 "asset": {
                     "params": parameters,
                 },
-            }))
+            })))
 
             return on_success(
                 request.with_asset(updated.asset()),
@@ -5,18 +5,31 @@
 #
 from __future__ import annotations
 
+import importlib
+import threading
 from abc import ABC
+from contextlib import contextmanager
+from contextvars import ContextVar
 from logging import LoggerAdapter
-from typing import Dict, Optional, Union
+from types import ModuleType
+from typing import Dict, Hashable, Iterable, Iterator, MutableMapping, Optional, Tuple, Type, Union
+from weakref import ref, WeakKeyDictionary
 
 from connect.client import AsyncConnectClient, ConnectClient
 from connect.eaas.extension import Extension
+from connect.processors_toolkit.configuration.schema import Configuration, ConfigurationSchema
 from connect.processors_toolkit.dependency_injection.container import (  # noqa: F401
     Container,
     Dependencies,
     DependencyBuildingFailure,
+    WarmUpFailure,
 )
-from connect.processors_toolkit.requests import RequestBuilder
+from connect.processors_toolkit.dependency_injection.profiling import ResolutionProfiler
+from connect.processors_toolkit.requests import MissingParameterError, RequestBuilder
+
+# The request-scoped containers attached by with_request() to the current thread
+# or asyncio task, along with a weak reference to their application.
+_request_containers: ContextVar[Tuple[Tuple[ref, Container], ...]] = ContextVar('request_containers', default=())
 
 
 class Application(Extension, ABC):
@@ -25,8 +38,26 @@ class Application(Extension, ABC):
 
     Defines the entrypoint of the service and creates the dependency
     container with all the declared dependencies.
+
+    The dependency container is built once per process (by application
+    class and configuration), each application instance only makes a cheap
+    request-scoped child with the client, logger and request bindings. The
+    dependencies() are only declared to build that container, so they must
+    not depend on the instance state.
+
+    The configuration is parsed once per process (by application class and
+    configuration) using the configuration_schema(), the typed snapshot is
+    bound as config and each key is bound with its typed value.
+
+    The request attached with with_request() is stored in a context variable,
+    so a single application instance can serve concurrent requests from
+    different threads or asyncio tasks.
     """
 
+    __containers: MutableMapping[type, Tuple[Hashable, Container]] = WeakKeyDictionary()
+    __configurations: MutableMapping[type, Tuple[Hashable, Configuration]] = WeakKeyDictionary()
+    __lock = threading.Lock()
+
     def __init__(
             self,
             client: Union[ConnectClient, AsyncConnectClient],
@@ -36,42 +67,200 @@ class Application(Extension, ABC):
     ):
         super().__init__(client, logger, config)
 
-        self.__dependencies = self.dependencies() if dependencies is None else dependencies
-        self.__dependencies.to_instance('config', config)
-        self.__dependencies.to_instance('client', client)
-        self.__dependencies.to_instance('logger', logger)
-        for key, value in config.items():
-            self.__dependencies.to_instance(key.lower(), value.strip())
+        self.__shared = dependencies is None
+        self.__dependencies = dependencies
+        self.__configuration = self.__parse_configuration()
 
-        self.__container = Container.deferred()
+        self.__values = {'client': client, 'logger': logger, 'route_params': {}}
+        self.__root = None
+        self.__container = None
 
     @property
     def container(self) -> Container:
         """
-        Container Accessor. If the container is deferred this method
-        will resolve it injecting the dependencies.
+        Container Accessor. Provides the request-scoped container attached
+        to the current thread or asyncio task, if there is no attached request
+        provides the default request-scoped container (client and logger).
 
         :return: Container
         """
-        if callable(self.__container):
-            # if the container is callable, inject the dependencies
-            # to the callable and resolve it, the
-            self.__container = self.__container(self.__dependencies)
+        for application, container in _request_containers.get():
+            if application() is self:
+                return container
+
+        if self.__container is None:
+            self.__container = self.__root_container().child(self.__values)
 
         return self.__container
 
+    @property
+    def configuration_snapshot(self) -> Configuration:
+        return self.__configuration
+
     def dependencies(self) -> Dependencies:
+        """
+        Declares the dependencies of the application. It is only called to
+        build the shared container, once per process (by application class
+        and configuration), so it must not depend on the instance state.
+
+        :return: Dependencies
+        """
         return Dependencies()
 
+    def configuration_schema(self) -> ConfigurationSchema:
+        """
+        Declares the typed configuration parameters, every parameter is parsed
+        and validated once on startup.
+
+        :return: ConfigurationSchema
+        """
+        return ConfigurationSchema()
+
+    def profiler(self) -> Optional[ResolutionProfiler]:
+        """
+        Provides the optional profiler that records the build costs of
+        each dependency, as the container it should be process-wide.
+
+        :return: Optional[ResolutionProfiler]
+        """
+        return None
+
+    def factories(self) -> Optional[str]:
+        """
+        Provides the import path of the module generated by the codegen tool
+        (connect.processors_toolkit.dependency_injection.codegen) for this
+        application. The container falls back to pinject if the module does
+        not exist or was generated for other dependencies.
+
+        :return: Optional[str]
+        """
+        return None
+
     def with_request(self, request: dict):
         """
-        Attach the given request to the dependency spec and set
-        the container as a deferred container, so it can resolve
-        new dependencies using the newly attached request.
+        Attach the given request to a new request-scoped container for the
+        current thread or asyncio task, so it can resolve new dependencies
+        using the newly attached request.
 
         :param request: dict The request to attach to the dependencies.
         :return: Application The application with the attached request.
         """
-        self.__dependencies.to_instance('request', RequestBuilder(request))
-        self.__container = Container.deferred()
+        _request_containers.set(self.__attach(self.__request_container(request)))
+        return self
+
+    def warm_up(self, classes: Iterable[Type]) -> Application:
+        """
+        Resolves the given classes (usually the routed controllers) with an
+        empty request, so their injection plans are compiled and the shared
+        bindings are built before the first request. The instances are
+        discarded.
+
+        Every bootstrap failure (any error raised while building a class) is
+        reported at once, the failures that depend on the request data
+        (MissingParameterError) are ignored.
+
+        :param classes: Iterable[Type] The classes to warm up.
+        :return: Application
+        :raise WarmUpFailure: With the failure of each class that can not be built.
+        """
+        container = self.__request_container({})
+
+        failures = {}
+        for cls in dict.fromkeys(classes):
+            try:
+                container.get(cls)
+            except MissingParameterError:
+                pass
+            except Exception as e:
+                failures[cls] = e
+
+        if failures:
+            raise WarmUpFailure(failures)
+
         return self
+
+    @contextmanager
+    def request_scope(self, request: dict) -> Iterator[Container]:
+        """
+        Attach the given request to a new request-scoped container for the
+        current thread or asyncio task, restoring the previous one on exit.
+
+        :param request: dict The request to attach to the dependencies.
+        :return: Iterator[Container] The request-scoped container.
+        """
+        container = self.__request_container(request)
+        token = _request_containers.set(self.__attach(container))
+        try:
+            yield container
+        finally:
+            _request_containers.reset(token)
+
+    def __attach(self, container: Container) -> Tuple[Tuple[ref, Container], ...]:
+        # keep the containers of the other living applications of the context.
+        attached = tuple(
+            (application, other) for application, other in _request_containers.get()
+            if application() not in [None, self]
+        )
+        return attached + ((ref(self), container),)
+
+    def __request_container(self, request: dict) -> Container:
+        return self.__root_container().child({**self.__values, 'request': RequestBuilder(request)})
+
+    def __root_container(self) -> Container:
+        if self.__root is None:
+            self.__root = self.__make_container()
+
+        return self.__root
+
+    def __parse_configuration(self) -> Configuration:
+        key = tuple(sorted(self.config.items()))
+        with Application.__lock:
+            cached_key, configuration = Application.__configurations.get(self.__class__, (None, None))
+
+        if configuration is None or cached_key != key:
+            configuration = self.configuration_schema().parse(self.config)
+            with Application.__lock:
+                Application.__configurations[self.__class__] = (key, configuration)
+
+        return configuration
+
+    def __bind(self, dependencies: Dependencies) -> Dependencies:
+        dependencies.to_instance('config', self.__configuration)
+        dependencies.per_request('client')
+        dependencies.per_request('logger')
+        dependencies.per_request('request')
+        # the params captured by the route pattern of the dispatched controller.
+        dependencies.per_request('route_params')
+        for key, value in self.__configuration.items():
+            typed = self.__configuration.is_typed(key)
+            dependencies.to_instance(key.lower(), value if typed else value.strip())
+
+        return dependencies
+
+    def __new_container(self, dependencies: Dependencies) -> Container:
+        return Container(self.__bind(dependencies), profiler=self.profiler(), factories=self.__load_factories())
+
+    def __make_container(self) -> Container:
+        if not self.__shared:
+            return self.__new_container(self.__dependencies)
+
+        key = tuple(sorted(self.config.items()))
+        with Application.__lock:
+            cached_key, container = Application.__containers.get(self.__class__, (None, None))
+            if container is None or cached_key != key:
+                container = self.__new_container(self.dependencies())
+                Application.__containers[self.__class__] = (key, container)
+
+        return container
+
+    def __load_factories(self) -> Optional[ModuleType]:
+        path = self.factories()
+        if path is None:
+            return None
+
+        try:
+            return importlib.import_module(path)
+        except ModuleNotFoundError as e:
+            if e.name != path:
+                raise
+            return None
@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import Dict, List, Optional
 
 
 class MissingConfigurationParameterError(Exception):
@@ -7,3 +7,19 @@ class MissingConfigurationParameterError(Exception):
         self.parameter = parameter
 
         super().__init__(self.message)
+
+
+class InvalidConfigurationError(MissingConfigurationParameterError):
+    def __init__(self, errors: Dict[str, Exception]):
+        self.errors = errors
+
+        super().__init__(
+            'Invalid configuration: {errors}'.format(
+                errors=', '.join(f'{key} ({error})' for key, error in errors.items()),
+            ),
+            ', '.join(errors),
+        )
+
+    @property
+    def missing(self) -> List[str]:
+        return [key for key, error in self.errors.items() if isinstance(error, MissingConfigurationParameterError)]
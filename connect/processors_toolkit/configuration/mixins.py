@@ -1,12 +1,16 @@
-from typing import Dict
+from typing import Any, Mapping
 
 from connect.processors_toolkit.configuration.exceptions import MissingConfigurationParameterError
 
 
 class WithConfigurationHelper:
-    config: Dict[str, str]
+    """
+    Configuration accessor, if the injected config is the Configuration
+    snapshot parsed by the application schema the values are the typed ones.
+    """
+    config: Mapping[str, Any]
 
-    def configuration(self, key: str) -> str:
+    def configuration(self, key: str) -> Any:
         if key not in self.config:
             raise MissingConfigurationParameterError(
                 f'Missing configuration parameter with key {key}',
@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any, Callable, Dict, Iterator, Mapping
+
+from connect.processors_toolkit.configuration.exceptions import (
+    InvalidConfigurationError,
+    MissingConfigurationParameterError,
+)
+
+REQUIRED = object()
+
+_TRUE = frozenset(['1', 'true', 'yes', 'on'])
+_FALSE = frozenset(['0', 'false', 'no', 'off'])
+
+_DURATION = re.compile(r'^(\d+(?:\.\d+)?)\s*(ms|s|m|h|d)?$')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_boolean(value: str) -> bool:
+    if value.lower() in _TRUE:
+        return True
+    if value.lower() in _FALSE:
+        return False
+    raise ValueError(f'Invalid boolean <{value}>.')
+
+
+def parse_duration(value: str) -> float:
+    """
+    Parses a duration like 300, 30s, 5m, 2h or 1d into seconds.
+
+    :param value: str
+    :return: float The duration in seconds.
+    """
+    match = _DURATION.match(value)
+    if match is None:
+        raise ValueError(f'Invalid duration <{value}>.')
+
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2) or 's']
+
+
+def parse_list(value: str) -> list:
+    parsed = json.loads(value)
+    if not isinstance(parsed, list):
+        raise ValueError(f'Invalid list <{value}>.')
+    return parsed
+
+
+class Configuration(Mapping[str, Any]):
+    """
+    Immutable configuration snapshot, holds the typed values of the keys
+    declared in the schema and the raw values of the remaining ones.
+    """
+
+    def __init__(self, values: Dict[str, Any], typed: Mapping[str, Any]):
+        self.__values = {**values, **typed}
+        self.__typed = frozenset(typed)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.__values[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.__values)
+
+    def __len__(self) -> int:
+        return len(self.__values)
+
+    def __repr__(self) -> str:
+        return f'Configuration({list(self.__values)})'
+
+    def is_typed(self, key: str) -> bool:
+        return key in self.__typed
+
+
+class ConfigurationSchema:
+    """
+    Typed configuration declarations.
+
+    Each parameter is parsed from its (stripped) raw value, the parameters
+    with a default value are optional, the default value is used as is.
+
+        > ConfigurationSchema()
+        >     .string('API_KEY')
+        >     .integer('PAGE_SIZE', default=100)
+        >     .boolean('DRY_RUN', default=False)
+        >     .list('ALLOWED_PRODUCTS', default=[])
+        >     .duration('TOKEN_TTL', default=300.0)
+
+    parse:
+        Parses and validates every parameter of the given configuration,
+        all the missing or invalid parameters are reported together.
+    """
+
+    def __init__(self):
+        self.parameters: Dict[str, Callable[[str], Any]] = {}
+        self.defaults: Dict[str, Any] = {}
+
+    def parameter(self, key: str, parser: Callable[[str], Any], default: Any = REQUIRED) -> ConfigurationSchema:
+        self.parameters[key] = parser
+        if default is REQUIRED:
+            self.defaults.pop(key, None)
+        else:
+            self.defaults[key] = default
+        return self
+
+    def string(self, key: str, default: Any = REQUIRED) -> ConfigurationSchema:
+        return self.parameter(key, str, default)
+
+    def integer(self, key: str, default: Any = REQUIRED) -> ConfigurationSchema:
+        return self.parameter(key, int, default)
+
+    def number(self, key: str, default: Any = REQUIRED) -> ConfigurationSchema:
+        return self.parameter(key, float, default)
+
+    def boolean(self, key: str, default: Any = REQUIRED) -> ConfigurationSchema:
+        return self.parameter(key, parse_boolean, default)
+
+    def json(self, key: str, default: Any = REQUIRED) -> ConfigurationSchema:
+        return self.parameter(key, json.loads, default)
+
+    def list(self, key: str, default: Any = REQUIRED) -> ConfigurationSchema:
+        return self.parameter(key, parse_list, default)
+
+    def duration(self, key: str, default: Any = REQUIRED) -> ConfigurationSchema:
+        return self.parameter(key, parse_duration, default)
+
+    def parse(self, config: Mapping[str, str]) -> Configuration:
+        """
+        Parses the given raw configuration into a typed snapshot.
+
+        :param config: Mapping[str, str] The raw configuration.
+        :return: Configuration
+        :raise InvalidConfigurationError: With every missing or invalid parameter.
+        """
+        typed = {}
+        errors = {}
+        for key, parser in self.parameters.items():
+            if key not in config:
+                if key in self.defaults:
+                    typed[key] = self.defaults[key]
+                else:
+                    errors[key] = MissingConfigurationParameterError(
+                        f'Missing configuration parameter with key {key}',
+                        key,
+                    )
+                continue
+
+            try:
+                typed[key] = parser(config[key].strip())
+            except (TypeError, ValueError) as e:
+                errors[key] = e
+
+        if errors:
+            raise InvalidConfigurationError(errors)
+
+        return Configuration(dict(config), typed)
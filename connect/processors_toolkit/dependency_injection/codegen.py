@@ -0,0 +1,220 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+"""
+Generates a plain-Python factory module for the dependencies and the routed
+controllers of an application, so the container builds them directly instead
+of building the pinject object graph on each process start:
+
+    python -m connect.processors_toolkit.dependency_injection.codegen \\
+        my_extension.extension:MyExtension -o my_extension/factories.py
+
+The module is used by returning its import path from Application.factories().
+Only the importable classes and provider functions (and the controllers that
+only depend on them) are generated, the rest are still resolved by pinject.
+The generated providers receive None instead of the binding spec as first
+argument. The module must be generated again on each change of the bindings
+or the constructors, a module generated for other bindings is ignored.
+"""
+from __future__ import annotations
+
+import argparse
+import importlib
+import inspect
+import sys
+from logging import getLogger, LoggerAdapter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from pinject import decorators, provider_indirections
+
+from connect.eaas.extension import Extension
+from connect.processors_toolkit.dependency_injection.container import (
+    BindType,
+    Dependencies,
+    fingerprint,
+)
+
+
+def _arguments(fn: Any) -> Optional[List[str]]:
+    try:
+        arg_binding_keys = decorators.get_injectable_arg_binding_keys(fn, [], {})
+    except (TypeError, ValueError):
+        return None
+
+    if any(key.provider_indirection is not provider_indirections.NO_INDIRECTION for key in arg_binding_keys):
+        return None
+
+    return [key._arg_name for key in arg_binding_keys]
+
+
+def _import_path(thing: Any) -> Optional[Tuple[str, str]]:
+    module = getattr(thing, '__module__', None)
+    qualname = getattr(thing, '__qualname__', None)
+    if module in [None, '__main__'] or qualname is None or '<' in qualname:
+        return None
+
+    try:
+        found = importlib.import_module(module)
+        for attribute in qualname.split('.'):
+            found = getattr(found, attribute)
+    except (ImportError, AttributeError):
+        return None
+
+    return (module, qualname) if found is thing else None
+
+
+class FactoryGenerator:
+    def __init__(self, dependencies: Dependencies, classes: Iterable[type]):
+        self.__binds: Dict[str, Tuple[BindType, Any]] = {}
+        for name, dependency in dependencies.binds.items():
+            if callable(dependency):
+                dependency = {BindType.TO_PROVIDER.value: dependency}
+            for to in [BindType.TO_CLASS, BindType.TO_PROVIDER]:
+                if to.value in dependency:
+                    self.__binds[name] = (to, dependency[to.value])
+
+        self.__fingerprint = fingerprint(dependencies)
+        self.__classes = list(dict.fromkeys(classes))
+        self.__generatable: Dict[str, Optional[List[str]]] = {}
+        self.__modules: Dict[str, str] = {}
+
+    def __binding_arguments(self, name: str, visiting: Set[str]) -> Optional[List[str]]:
+        if name in self.__generatable:
+            return self.__generatable[name]
+        if name in visiting:
+            return None
+
+        to, thing = self.__binds[name]
+        arguments = None
+        if _import_path(thing) is not None:
+            fn = thing.__init__ if to is BindType.TO_CLASS else thing
+            arguments = self.__resolvable(_arguments(fn), visiting | {name})
+
+        self.__generatable[name] = arguments
+        return arguments
+
+    def __resolvable(self, arguments: Optional[List[str]], visiting: Set[str]) -> Optional[List[str]]:
+        if arguments is None:
+            return None
+
+        for argument in arguments:
+            # the instances and per request values are bound on runtime.
+            if argument in self.__binds and self.__binding_arguments(argument, visiting) is None:
+                return None
+
+        return arguments
+
+    def __reference(self, thing: Any) -> str:
+        module, qualname = _import_path(thing)
+        alias = self.__modules.setdefault(module, f'_m{len(self.__modules)}')
+        return f'{alias}.{qualname}'
+
+    @staticmethod
+    def __function(function: str, call: str, arguments: List[str], pargs: List[str]) -> List[str]:
+        lines = ['', '', f'def {function}(resolve):', f'    return {call}(']
+        lines.extend(f'        {parg},' for parg in pargs)
+        lines.extend(f"        {argument}=resolve('{argument}')," for argument in arguments)
+        lines.append('    )')
+        return lines
+
+    def generate(self) -> str:
+        """
+        Renders the factory module source.
+
+        :return: str
+        """
+        body: List[str] = []
+        bindings: List[str] = []
+        for name in sorted(self.__binds):
+            arguments = self.__binding_arguments(name, set())
+            if arguments is None:
+                continue
+
+            to, thing = self.__binds[name]
+            pargs = [] if to is BindType.TO_CLASS else ['None']
+            body.extend(self.__function(f'_binding_{name}', self.__reference(thing), arguments, pargs))
+            bindings.append(f"    '{name}': _binding_{name},")
+
+        classes: List[str] = []
+        for cls in self.__classes:
+            arguments = self.__resolvable(_arguments(cls.__init__), set())
+            if arguments is None or _import_path(cls) is None:
+                continue
+
+            reference = self.__reference(cls)
+            body.extend(self.__function(f'_class_{len(classes)}', reference, arguments, []))
+            classes.append(f'    {reference}: _class_{len(classes)},')
+
+        lines = [
+            '#',
+            '# Generated by connect.processors_toolkit.dependency_injection.codegen, do not edit.',
+            '#',
+            *(f'import {module} as {alias}' for module, alias in self.__modules.items()),
+            '',
+            f"FINGERPRINT = '{self.__fingerprint}'",
+            *body,
+            '',
+            '',
+            'BINDINGS = {',
+            *bindings,
+            '}',
+            '',
+            'CLASSES = {',
+            *classes,
+            '}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def generate_factories(dependencies: Dependencies, classes: Iterable[type]) -> str:
+    """
+    Generates the factory module source for the given dependencies and classes.
+
+    :param dependencies: Dependencies The application dependencies.
+    :param classes: Iterable[type] The classes to build, usually the routed controllers.
+    :return: str The module source.
+    """
+    return FactoryGenerator(dependencies, classes).generate()
+
+
+def generate_application_factories(application: type) -> str:
+    """
+    Generates the factory module source for the dependencies() and the
+    controllers() (if it has a router) of the given application class.
+
+    :param application: type The Application class.
+    :return: str The module source.
+    """
+    # the hooks are called without running the application constructor,
+    # there is no configuration to validate on generation time.
+    instance = application.__new__(application)
+    Extension.__init__(instance, None, LoggerAdapter(getLogger(application.__name__), {}), {})
+    controllers = instance.controllers() if hasattr(instance, 'controllers') else []
+    return generate_factories(instance.dependencies(), controllers)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Generates the dependency factories of an application.')
+    parser.add_argument('application', help='The application class as <module>:<class>.')
+    parser.add_argument('-o', '--output', help='The output file, the standard output by default.')
+    args = parser.parse_args(argv)
+
+    module, _, name = args.application.partition(':')
+    application = getattr(importlib.import_module(module), name)
+    if not inspect.isclass(application):
+        parser.error(f'{args.application} is not a class.')
+
+    source = generate_application_factories(application)
+    if args.output is None:
+        sys.stdout.write(source)
+    else:
+        with open(args.output, 'w') as output:
+            output.write(source)
+
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
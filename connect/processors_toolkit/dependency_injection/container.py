@@ -5,17 +5,44 @@
 #
 from __future__ import annotations
 
+import copy
+import hashlib
+import inspect
+import threading
+
 import pinject
-from pinject.errors import NothingInjectableForArgError
+from pinject import binding_keys
+from pinject.errors import BadDependencyScopeError, NothingInjectableForArgError
+from pinject.object_graph import ObjectGraph
+from pinject.scoping import PrototypeScope, SingletonScope
 
 from enum import Enum, unique
-from typing import Any, Callable, Optional
+from types import ModuleType
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from connect.processors_toolkit.dependency_injection.lazy import LazyProxy
+from connect.processors_toolkit.dependency_injection.plans import ClassInjectionPlan, InjectionPlan
+from connect.processors_toolkit.dependency_injection.profiling import ProfiledScope, ResolutionProfiler
+from connect.processors_toolkit.dependency_injection.scopes import (
+    is_lifetime_usable_from_lifetime,
+    Lifetime,
+    MemoizedScope,
+    RequestContext,
+    RequestScope,
+)
 
 
 @unique
 class BindType(Enum):
     TO_CLASS = 'to_class'
     TO_INSTANCE = 'to_instance'
+    TO_PROVIDER = 'to_provider'
+    TO_REQUEST = 'to_request'
+
+
+LIFETIME = 'lifetime'
+TTL = 'ttl'
+LAZY = 'lazy'
 
 
 class Dependencies:
@@ -36,17 +63,45 @@ class Dependencies:
             where make_complex_value is a function that will return the
             complex value.
 
+    per_request:
+        Define a dependency binding whose value is supplied by each
+        request-scoped container.
+            > dependencies.per_request('request')
+
+    to_singleton, request_scoped, transient:
+        Define a dependency binding between a key and a class or a provider
+        function with an explicit lifetime: built once per process, once per
+        request or each time it is injected.
+            > dependencies.to_singleton('http_session', make_http_session)
+
+    memoized:
+        Define a dependency binding between a key and a class or a provider
+        function that is built once per process and built again once the ttl
+        (in seconds) expires.
+            > dependencies.memoized('access_token', fetch_access_token, ttl=300)
+
+    lazy:
+        Define a dependency binding between a key and a class or a provider
+        function that is injected as a transparent proxy, the real instance
+        is built on the first access to any of its attributes.
+            > dependencies.lazy('report_generator', ReportGenerator)
+
     bind:
         Raw dependency binding.
             dependencies.bind('service_api_key', BindType.TO_INSTANCE, 'something')
 
+    Classes and providers are request scoped by default, instances are singletons.
     """
 
     def __init__(self, dependencies: Optional[dict] = None):
         self.binds = {} if dependencies is None else dependencies
 
-    def bind(self, name: str, to: BindType, thing: Any) -> Dependencies:
-        self.binds.update({name: {to.value: thing}})
+    def bind(self, name: str, to: BindType, thing: Any, lifetime: Optional[Lifetime] = None) -> Dependencies:
+        bind = {to.value: thing}
+        if lifetime is not None:
+            bind[LIFETIME] = lifetime
+
+        self.binds.update({name: bind})
         return self
 
     def to_class(self, name: str, thing: Any) -> Dependencies:
@@ -55,37 +110,242 @@ class Dependencies:
     def to_instance(self, name: str, thing: Any) -> Dependencies:
         return self.bind(name, BindType.TO_INSTANCE, thing)
 
-    def provider(self, name: str, provider: Callable):  # pragma: no cover
-        self.binds.update({name: provider})
+    def provider(self, name: str, provider: Callable) -> Dependencies:
+        return self.bind(name, BindType.TO_PROVIDER, provider)
+
+    def per_request(self, name: str) -> Dependencies:
+        return self.bind(name, BindType.TO_REQUEST, None)
+
+    def to_singleton(self, name: str, thing: Any) -> Dependencies:
+        return self.__bind_with_lifetime(name, thing, Lifetime.SINGLETON)
+
+    def request_scoped(self, name: str, thing: Any) -> Dependencies:
+        return self.__bind_with_lifetime(name, thing, Lifetime.REQUEST)
+
+    def transient(self, name: str, thing: Any) -> Dependencies:
+        return self.__bind_with_lifetime(name, thing, Lifetime.TRANSIENT)
+
+    def memoized(self, name: str, thing: Any, ttl: float) -> Dependencies:
+        self.__bind_with_lifetime(name, thing, Lifetime.MEMOIZED)
+        self.binds[name][TTL] = ttl
+        return self
+
+    def lazy(self, name: str, thing: Any, lifetime: Optional[Lifetime] = None) -> Dependencies:
+        to = BindType.TO_CLASS if inspect.isclass(thing) else BindType.TO_PROVIDER
+        self.bind(name, to, thing, lifetime)
+        self.binds[name][LAZY] = True
         return self
 
+    def __bind_with_lifetime(self, name: str, thing: Any, lifetime: Lifetime) -> Dependencies:
+        to = BindType.TO_CLASS if inspect.isclass(thing) else BindType.TO_PROVIDER
+        return self.bind(name, to, thing, lifetime)
+
 
 class DependencyBuildingFailure(Exception):
     pass
 
 
+class WarmUpFailure(DependencyBuildingFailure):
+    def __init__(self, failures: Dict[type, Exception]):
+        self.failures = failures
+
+        super().__init__('Unable to warm up {count} classes: {failures}'.format(
+            count=len(failures),
+            failures=', '.join(f'{cls.__name__} ({e.__class__.__name__}: {e})' for cls, e in failures.items()),
+        ))
+
+
+def _missing_per_request_value(name: str) -> Callable:
+    def __provide(self):
+        raise DependencyBuildingFailure(f'There is no per request value for the binding "{name}".')
+
+    return __provide
+
+
+def _normalize(dependency: Any) -> dict:
+    if isinstance(dependency, Callable):
+        return {BindType.TO_PROVIDER.value: dependency}
+    return dependency
+
+
+def _lifetime(dependency: dict) -> Lifetime:
+    default = Lifetime.SINGLETON if BindType.TO_INSTANCE.value in dependency else Lifetime.REQUEST
+    return dependency.get(LIFETIME, default)
+
+
+def fingerprint(dependencies: Dependencies) -> str:
+    """
+    Identifies the classes and providers bound in the given dependencies,
+    the generated factories are only used with the same fingerprint.
+
+    :param dependencies: Dependencies
+    :return: str
+    """
+    entries = []
+    for name, dependency in sorted(_normalize_binds(dependencies).items()):
+        for to in [BindType.TO_CLASS, BindType.TO_PROVIDER]:
+            if to.value in dependency:
+                thing = dependency[to.value]
+                entries.append('{name}={to}:{module}:{qualname}'.format(
+                    name=name,
+                    to=to.value,
+                    module=getattr(thing, '__module__', None),
+                    qualname=getattr(thing, '__qualname__', type(thing).__qualname__),
+                ))
+
+    return hashlib.sha1('\n'.join(entries).encode()).hexdigest()
+
+
+def _normalize_binds(dependencies: Dependencies) -> Dict[str, dict]:
+    return {name: _normalize(dependency) for name, dependency in dependencies.binds.items()}
+
+
+def _configure_dependency(
+        spec: type,
+        bind: Callable,
+        name: str,
+        dependency: Any,
+        lazy: Callable[[Any, Lifetime], Callable],
+):
+    dependency = _normalize(dependency)
+
+    if dependency.get(LAZY, False):
+        lifetime = dependency.get(LIFETIME, Lifetime.REQUEST)
+        dependency = {
+            BindType.TO_PROVIDER.value: lazy(
+                dependency.get(BindType.TO_CLASS.value, dependency.get(BindType.TO_PROVIDER.value)),
+                lifetime,
+            ),
+            LIFETIME: lifetime,
+        }
+
+    if BindType.TO_INSTANCE.value in dependency:
+        bind(
+            name,
+            to_instance=dependency[BindType.TO_INSTANCE.value],
+            in_scope=dependency.get(LIFETIME, Lifetime.SINGLETON),
+        )
+    elif BindType.TO_CLASS.value in dependency:
+        bind(
+            name,
+            to_class=dependency[BindType.TO_CLASS.value],
+            in_scope=dependency.get(LIFETIME, Lifetime.REQUEST),
+        )
+    else:
+        if BindType.TO_REQUEST.value in dependency:
+            provider = _missing_per_request_value(name)
+        else:
+            provider = dependency[BindType.TO_PROVIDER.value]
+
+        setattr(spec, f'provide_{name}', pinject.provides(
+            name,
+            in_scope=dependency.get(LIFETIME, Lifetime.REQUEST),
+        )(provider))
+
+
+def _instance_factory(instance: Any) -> Callable[[Callable], Any]:
+    return lambda _: instance
+
+
+class _LazyObjectGraph:
+    """
+    Builds the pinject object graph on first use, the graph is shared by
+    the container and all its children.
+    """
+
+    def __init__(self, build: Callable[[], ObjectGraph]):
+        self.__build = build
+        self.__graph: Optional[ObjectGraph] = None
+        self.__lock = threading.Lock()
+
+    def __call__(self) -> ObjectGraph:
+        if self.__graph is None:
+            with self.__lock:
+                if self.__graph is None:
+                    self.__graph = self.__build()
+
+        return self.__graph
+
+
 class Container:
     """
     Dependency Container based in the PInject project.
+
+    The object graph is built once, the request-scoped children made with
+    `child()` share it and only add the per request values, the classes and
+    providers are built once per child.
+
+    The injection of each requested class is compiled once into an injection
+    plan that is shared by the container and all its children.
+
+    The memoized bindings are cached up to memoized_maxsize instances.
+
+    If a profiler is given, the build count and durations of each binding
+    and requested class are recorded in it.
+
+    The lazy bindings inject a LazyProxy, the real instance is built within
+    the request context that injected the proxy, its dependencies are checked
+    against the lifetime of the lazy binding. The singleton and memoized lazy
+    bindings are built in a fresh request context, so they never capture the
+    request that first injected them.
+
+    If a module generated by the codegen tool for the same dependencies is
+    given, the generated factories build the bindings and classes directly
+    through the same scopes, the pinject object graph is only built for the
+    classes that are not generated.
     """
 
-    def __init__(self, dependencies: Dependencies):
+    def __init__(
+            self,
+            dependencies: Dependencies,
+            memoized_maxsize: int = 128,
+            profiler: Optional[ResolutionProfiler] = None,
+            factories: Optional[ModuleType] = None,
+    ):
         class __DISpec(pinject.BindingSpec):
-            def __init__(self, _dependencies: Dependencies):
+            def __init__(self, _dependencies: Dependencies, _lazy: Callable[[Any, Lifetime], Callable]):
                 self.__dependencies = _dependencies
+                self.__lazy = _lazy
 
             def configure(self, bind):
                 for name, dependency in self.__dependencies.binds.items():
-                    if isinstance(dependency, Callable):
-                        setattr(self.__class__, f'provide_{name}', dependency)
-                    else:
-                        bind(name, **dependency)
+                    _configure_dependency(self.__class__, bind, name, dependency, self.__lazy)
+
+        self.__scope = RequestScope()
+        self.__memoized = MemoizedScope(memoized_maxsize)
+        for name, dependency in dependencies.binds.items():
+            if isinstance(dependency, dict) and TTL in dependency:
+                self.__memoized.memoize(name, dependency[TTL])
+
+        self.__context = RequestContext()
+        self.__plans: Dict[Any, InjectionPlan] = {}
+        self.__profiler = profiler
 
-        self.__container = pinject.new_object_graph(
-            binding_specs=[__DISpec(dependencies)],
+        id_to_scope = {
+            Lifetime.SINGLETON: SingletonScope(),
+            Lifetime.REQUEST: self.__scope,
+            Lifetime.TRANSIENT: PrototypeScope(),
+            Lifetime.MEMOIZED: self.__memoized,
+        }
+        if profiler is not None:
+            names = {binding_keys.new(name): name for name in dependencies.binds}
+            id_to_scope = {
+                lifetime: ProfiledScope(scope, profiler, names) for lifetime, scope in id_to_scope.items()
+            }
+
+        self.__scopes = id_to_scope
+        self.__graph = _LazyObjectGraph(lambda: pinject.new_object_graph(
+            binding_specs=[__DISpec(dependencies, self.__lazy_provider)],
             # disable the auto-search for implicit bindings.
             modules=None,
-        )
+            id_to_scope=id_to_scope,
+            is_scope_usable_from_scope=is_lifetime_usable_from_lifetime,
+        ))
+
+        self.__bindings: Dict[str, Tuple[Any, Lifetime, Callable]] = {}
+        self.__classes: Dict[type, Callable] = {}
+        if factories is not None and getattr(factories, 'FINGERPRINT', None) == fingerprint(dependencies):
+            self.__load_factories(dependencies, factories)
 
     @staticmethod
     def deferred() -> Callable[[Dependencies], Container]:
@@ -94,8 +354,139 @@ class Container:
 
         return __make_container
 
+    def child(self, values: Optional[Dict[str, Any]] = None) -> Container:
+        """
+        Makes a request-scoped container that shares the object graph of this
+        one, the given values are used for the per request bindings.
+
+        :param values: Optional[Dict[str, Any]] The per request values by binding name.
+        :return: Container
+        """
+        child = copy.copy(self)
+        child.__context = RequestContext(values)
+        return child
+
+    def extend(self, values: Dict[str, Any]) -> Container:
+        """
+        Makes a request-scoped container with the per request values of this
+        one updated with the given values, the instances built by this one
+        are not shared.
+
+        :param values: Dict[str, Any] The per request values by binding name.
+        :return: Container
+        """
+        return self.child({**self.__context.values(), **values})
+
+    def compile(self, classes: Iterable[type]) -> Container:
+        """
+        Compiles the injection plan of the given classes ahead of time.
+
+        :param classes: Iterable[type] The classes to compile.
+        :return: Container
+        """
+        for cls in classes:
+            if cls not in self.__classes:
+                self.__plan(cls)
+        return self
+
+    @property
+    def profiler(self) -> Optional[ResolutionProfiler]:
+        return self.__profiler
+
+    @property
+    def generated(self) -> bool:
+        return bool(self.__classes)
+
     def get(self, cls) -> Any:
+        with self.__scope.activate(self.__context):
+            try:
+                build = self.__builder(cls)
+                if self.__profiler is not None:
+                    return self.__profiler.profile(cls.__name__, build)
+                return build()
+            except (NothingInjectableForArgError, BadDependencyScopeError) as e:
+                raise DependencyBuildingFailure(str(e))
+
+    def __builder(self, cls) -> Callable[[], Any]:
+        factory = self.__classes.get(cls)
+        if factory is None:
+            return self.__plan(cls)
+
+        return lambda: factory(lambda name: self.__resolve(name, Lifetime.TRANSIENT))
+
+    def __plan(self, thing) -> InjectionPlan:
+        plan = self.__plans.get(thing)
+        if plan is None:
+            try:
+                if inspect.isclass(thing):
+                    plan = ClassInjectionPlan(self.__graph(), thing)
+                else:
+                    plan = InjectionPlan(self.__graph(), thing)
+            except NothingInjectableForArgError as e:
+                raise DependencyBuildingFailure(str(e))
+            self.__plans[thing] = plan
+
+        return plan
+
+    def __lazy_provider(self, thing: Any, lifetime: Lifetime) -> Callable:
+        container = self
+
+        # pinject only skips the injection of the argument named self,
+        # the binding spec instance in this case.
+        def __provide(self):
+            pargs = () if inspect.isclass(thing) else (self,)
+            return container.__lazy(lambda: container.__plan(thing)(*pargs, scope=lifetime), lifetime)
+
+        return __provide
+
+    def __lazy(self, build: Callable[[], Any], lifetime: Lifetime) -> LazyProxy:
+        # the proxy may be resolved once the container that injected it is
+        # not active anymore, the injecting request context is activated again
+        # unless the proxy outlives the request.
+        if is_lifetime_usable_from_lifetime(Lifetime.REQUEST, lifetime):
+            context = self.__scope.context
+        else:
+            context = RequestContext()
+
+        def __build() -> Any:
+            with self.__scope.activate(context):
+                try:
+                    return build()
+                except (NothingInjectableForArgError, BadDependencyScopeError) as e:
+                    raise DependencyBuildingFailure(str(e))
+
+        return LazyProxy(__build)
+
+    def __load_factories(self, dependencies: Dependencies, factories: ModuleType):
+        for name, dependency in _normalize_binds(dependencies).items():
+            if BindType.TO_INSTANCE.value in dependency:
+                build = _instance_factory(dependency[BindType.TO_INSTANCE.value])
+            elif BindType.TO_REQUEST.value in dependency:
+                build = _missing_per_request_value(name)
+            elif name in factories.BINDINGS:
+                build = factories.BINDINGS[name]
+            else:
+                continue
+
+            if dependency.get(LAZY, False):
+                build = self.__lazy_factory(build, _lifetime(dependency))
+
+            self.__bindings[name] = (binding_keys.new(name), _lifetime(dependency), build)
+
+        self.__classes.update(factories.CLASSES)
+
+    def __lazy_factory(self, build: Callable[[Callable], Any], lifetime: Lifetime) -> Callable[[Callable], Any]:
+        return lambda resolve: self.__lazy(lambda: build(resolve), lifetime)
+
+    def __resolve(self, name: str, outer: Lifetime) -> Any:
         try:
-            return self.__container.provide(cls)
-        except NothingInjectableForArgError as e:
-            raise DependencyBuildingFailure(str(e))
+            key, lifetime, build = self.__bindings[name]
+        except KeyError:
+            raise DependencyBuildingFailure(f'There is no binding for "{name}".')
+
+        if not is_lifetime_usable_from_lifetime(lifetime, outer):
+            raise DependencyBuildingFailure(
+                f'The {lifetime.value} binding "{name}" can not be injected into a {outer.value} binding.',
+            )
+
+        return self.__scopes[lifetime].provide(key, lambda: build(lambda arg: self.__resolve(arg, lifetime)))
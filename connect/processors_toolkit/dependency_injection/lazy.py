@@ -0,0 +1,90 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+import threading
+from typing import Any, Callable
+
+_NOT_BUILT = object()
+
+
+class LazyProxy:
+    """
+    Transparent proxy that builds the proxied object using the given
+    factory on the first access to any of its attributes.
+    """
+
+    __slots__ = ('_LazyProxy__factory', '_LazyProxy__instance', '_LazyProxy__lock')
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, '_LazyProxy__factory', factory)
+        object.__setattr__(self, '_LazyProxy__instance', _NOT_BUILT)
+        object.__setattr__(self, '_LazyProxy__lock', threading.Lock())
+
+    def lazy_proxy_resolve(self) -> Any:
+        if self.__instance is _NOT_BUILT:
+            with self.__lock:
+                if self.__instance is _NOT_BUILT:
+                    object.__setattr__(self, '_LazyProxy__instance', self.__factory())
+        return self.__instance
+
+    def lazy_proxy_is_built(self) -> bool:
+        return self.__instance is not _NOT_BUILT
+
+    @property
+    def __class__(self):
+        return self.lazy_proxy_resolve().__class__
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.lazy_proxy_resolve(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self.lazy_proxy_resolve(), name, value)
+
+    def __delattr__(self, name: str):
+        delattr(self.lazy_proxy_resolve(), name)
+
+    def __call__(self, *args, **kwargs) -> Any:
+        return self.lazy_proxy_resolve()(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        if not self.lazy_proxy_is_built():
+            return f'<LazyProxy of {self.__factory!r}>'
+        return repr(self.__instance)
+
+    def __str__(self) -> str:
+        return str(self.lazy_proxy_resolve())
+
+    def __bool__(self) -> bool:
+        return bool(self.lazy_proxy_resolve())
+
+    def __len__(self) -> int:
+        return len(self.lazy_proxy_resolve())
+
+    def __iter__(self):
+        return iter(self.lazy_proxy_resolve())
+
+    def __contains__(self, item: Any) -> bool:
+        return item in self.lazy_proxy_resolve()
+
+    def __getitem__(self, key: Any) -> Any:
+        return self.lazy_proxy_resolve()[key]
+
+    def __setitem__(self, key: Any, value: Any):
+        self.lazy_proxy_resolve()[key] = value
+
+    def __delitem__(self, key: Any):
+        del self.lazy_proxy_resolve()[key]
+
+    def __eq__(self, other: Any) -> bool:
+        return self.lazy_proxy_resolve() == other
+
+    def __hash__(self) -> int:
+        return hash(self.lazy_proxy_resolve())
+
+    def __enter__(self) -> Any:
+        return self.lazy_proxy_resolve().__enter__()
+
+    def __exit__(self, *args) -> Any:
+        return self.lazy_proxy_resolve().__exit__(*args)
@@ -0,0 +1,81 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List, Tuple
+
+from pinject import decorators, injection_contexts, provider_indirections, scoping
+from pinject.object_graph import ObjectGraph
+
+
+class InjectionPlan:
+    """
+    Precomputed injection of a callable.
+
+    The argument binding keys, bindings and scopes of the callable are looked
+    up in the object graph once, running the plan only asks each scope for
+    the bound value. Missing bindings are reported on compile time.
+
+    Note: the plan relies on the pinject object provider internals (pinject
+    does not expose a public API to provide a single binding).
+    """
+
+    def __init__(self, graph: ObjectGraph, fn: Callable):
+        self.__fn = fn
+        self.__provider = graph._obj_provider
+        self.__contexts = graph._injection_context_factory
+        self.__steps: List[Tuple[str, Callable]] = [
+            (arg_binding_key._arg_name, self.__compile_step(arg_binding_key))
+            for arg_binding_key in decorators.get_injectable_arg_binding_keys(fn, [], {})
+        ]
+
+    def __compile_step(self, arg_binding_key) -> Callable:
+        if arg_binding_key.provider_indirection is not provider_indirections.NO_INDIRECTION:
+            return lambda context: self.__provider.provide_from_arg_binding_key(self.__fn, arg_binding_key, context)
+
+        binding_key = arg_binding_key.binding_key
+        binding = self.__provider._binding_mapping.get(
+            binding_key,
+            self.__contexts.new(self.__fn).get_injection_site_desc(),
+        )
+        scope = self.__provider._bindable_scopes.get_sub_scope(binding)
+
+        def __step(context) -> Any:
+            child = context.get_child(self.__fn, binding)
+            return scope.provide(binding_key, lambda: binding.proviser_fn(child, self.__provider, [], {}))
+
+        return __step
+
+    def arguments(self) -> List[str]:
+        return [name for name, _ in self.__steps]
+
+    def kwargs(self, scope: Any = scoping.UNSCOPED) -> Dict[str, Any]:
+        """
+        Provides the bound arguments, checking their scopes are usable from
+        the given outer scope (unscoped by default).
+
+        :param scope: Any The outer scope id.
+        :return: Dict[str, Any]
+        """
+        context = injection_contexts._InjectionContext(
+            self.__fn,
+            binding_stack=[],
+            scope_id=scope,
+            is_scope_usable_from_scope_fn=self.__contexts._is_scope_usable_from_scope_fn,
+        )
+        return {name: step(context) for name, step in self.__steps}
+
+    def __call__(self, *pargs, scope: Any = scoping.UNSCOPED) -> Any:
+        return self.__fn(*pargs, **self.kwargs(scope))
+
+
+class ClassInjectionPlan(InjectionPlan):
+    def __init__(self, graph: ObjectGraph, cls: type):
+        super().__init__(graph, cls.__init__)
+        self.__cls = cls
+
+    def __call__(self, *pargs, scope: Any = scoping.UNSCOPED) -> Any:
+        return self.__cls(*pargs, **self.kwargs(scope))
@@ -0,0 +1,150 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from pinject.scoping import Scope
+
+
+class BindingStats:
+    """
+    Build statistics of a single binding, durations in seconds. The
+    durations include the time spent building the binding dependencies.
+    """
+
+    def __init__(self, name: str, samples: int):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.durations: Deque[float] = deque(maxlen=samples)
+
+    def record(self, duration: float):
+        self.count += 1
+        self.total += duration
+        self.durations.append(duration)
+
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percentile: float) -> float:
+        if not self.durations:
+            return 0.0
+
+        durations = sorted(self.durations)
+        return durations[max(0, math.ceil(percentile / 100 * len(durations)) - 1)]
+
+    def p99(self) -> float:
+        return self.percentile(99)
+
+
+class ResolutionProfiler:
+    """
+    Records the build count and durations of each binding resolved by the
+    container along with the dependencies between them, the last `samples`
+    durations of each binding are kept to compute the percentiles.
+    """
+
+    def __init__(self, samples: int = 1024, clock: Callable[[], float] = time.perf_counter):
+        self.__samples = samples
+        self.__clock = clock
+        self.__stats: Dict[str, BindingStats] = {}
+        self.__dependencies: Dict[str, Dict[str, None]] = {}
+        self.__building: ContextVar[Tuple[str, ...]] = ContextVar(f'resolution_profiler_{id(self)}', default=())
+        self.__lock = threading.Lock()
+
+    def profile(self, name: str, build: Callable[[], Any]) -> Any:
+        """
+        Builds the given binding recording the build duration.
+
+        :param name: str The binding name.
+        :param build: Callable[[], Any] The binding build function.
+        :return: Any The built instance.
+        """
+        building = self.__building.get()
+        token = self.__building.set(building + (name,))
+        start = self.__clock()
+        try:
+            return build()
+        finally:
+            duration = self.__clock() - start
+            self.__building.reset(token)
+            self.__record(building[-1] if building else None, name, duration)
+
+    def __record(self, parent: Optional[str], name: str, duration: float):
+        with self.__lock:
+            if name not in self.__stats:
+                self.__stats[name] = BindingStats(name, self.__samples)
+            self.__stats[name].record(duration)
+
+            if parent is not None:
+                self.__dependencies.setdefault(parent, {})[name] = None
+
+    def stats(self) -> Dict[str, BindingStats]:
+        with self.__lock:
+            return dict(self.__stats)
+
+    def dependencies(self, name: str) -> List[str]:
+        with self.__lock:
+            return list(self.__dependencies.get(name, {}))
+
+    def report(self) -> str:
+        """
+        Renders the resolved graph annotated with the build costs, the
+        most expensive roots first.
+
+        :return: str
+        """
+        stats = self.stats()
+        children = {dependency for name in stats for dependency in self.dependencies(name)}
+        roots = sorted((name for name in stats if name not in children), key=lambda n: -stats[n].total)
+
+        lines = ['{:<48} {:>8} {:>12} {:>10} {:>10}'.format('binding', 'builds', 'total ms', 'mean ms', 'p99 ms')]
+        for root in roots:
+            self.__render(root, stats, 0, lines, set())
+
+        return '\n'.join(lines)
+
+    def __render(self, name: str, stats: Dict[str, BindingStats], depth: int, lines: List[str], seen: set):
+        binding = stats[name]
+        lines.append('{:<48} {:>8} {:>12.3f} {:>10.3f} {:>10.3f}'.format(
+            f"{'  ' * depth}{name}",
+            binding.count,
+            binding.total * 1000,
+            binding.mean() * 1000,
+            binding.p99() * 1000,
+        ))
+
+        if name in seen:
+            return
+
+        for dependency in self.dependencies(name):
+            self.__render(dependency, stats, depth + 1, lines, seen | {name})
+
+
+class ProfiledScope(Scope):
+    """
+    Pinject scope decorator that records the builds of the named bindings
+    in the given profiler. The instances served from the decorated scope
+    cache are not recorded.
+    """
+
+    def __init__(self, scope: Scope, profiler: ResolutionProfiler, names: Dict[Any, str]):
+        self.__scope = scope
+        self.__profiler = profiler
+        self.__names = names
+
+    def provide(self, binding_key, default_provider_fn: Callable[[], Any]) -> Any:
+        name = self.__names.get(binding_key)
+        if name is None:
+            return self.__scope.provide(binding_key, default_provider_fn)
+
+        return self.__scope.provide(binding_key, lambda: self.__profiler.profile(name, default_provider_fn))
@@ -0,0 +1,163 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import Enum, unique
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+from pinject import binding_keys
+from pinject.scoping import Scope
+
+
+@unique
+class Lifetime(Enum):
+    """
+    Lifetime of the bound instances, used as pinject scope ids.
+
+    SINGLETON: built once per process and shared by every request (thread safe).
+    REQUEST: built once per request-scoped container.
+    TRANSIENT: built each time it is injected.
+    MEMOIZED: built once per process and built again once the ttl expires.
+    """
+    SINGLETON = 'singleton'
+    REQUEST = 'request'
+    TRANSIENT = 'transient'
+    MEMOIZED = 'memoized'
+
+
+def is_lifetime_usable_from_lifetime(inner: Lifetime, outer: Lifetime) -> bool:
+    """
+    A request-scoped instance must not be captured by a singleton (or a
+    memoized value), it would leak the first request into the following ones.
+    """
+    return not (inner is Lifetime.REQUEST and outer in [Lifetime.SINGLETON, Lifetime.MEMOIZED])
+
+
+class RequestContext:
+    """
+    Holds the instances built for a single request-scoped container,
+    seeded with the per-request values (request, client, logger...).
+    """
+
+    def __init__(self, values: Optional[Dict[str, Any]] = None):
+        self.__values = {} if values is None else dict(values)
+        self.__instances = {binding_keys.new(name): value for name, value in self.__values.items()}
+        self.__lock = threading.RLock()
+
+    def values(self) -> Dict[str, Any]:
+        return dict(self.__values)
+
+    def provide(self, binding_key, default_provider_fn: Callable[[], Any]) -> Any:
+        with self.__lock:
+            try:
+                return self.__instances[binding_key]
+            except KeyError:
+                instance = default_provider_fn()
+                self.__instances[binding_key] = instance
+                return instance
+
+
+class RequestScope(Scope):
+    """
+    Pinject scope that caches the instances in the active RequestContext.
+
+    The object graph is shared by every request, each request-scoped container
+    activates its own context while resolving, so the instances built for one
+    request are never seen by another one. The active context is a context
+    variable, so concurrent threads and asyncio tasks never see each other's
+    context.
+    """
+
+    def __init__(self, default: Optional[RequestContext] = None):
+        self.__default = RequestContext() if default is None else default
+        self.__active: ContextVar[Optional[RequestContext]] = ContextVar(f'request_scope_{id(self)}', default=None)
+
+    @property
+    def context(self) -> RequestContext:
+        context = self.__active.get()
+        return self.__default if context is None else context
+
+    @contextmanager
+    def activate(self, context: RequestContext) -> Iterator[RequestContext]:
+        token = self.__active.set(context)
+        try:
+            yield context
+        finally:
+            self.__active.reset(token)
+
+    def provide(self, binding_key, default_provider_fn: Callable[[], Any]) -> Any:
+        return self.context.provide(binding_key, default_provider_fn)
+
+
+class MemoizedScope(Scope):
+    """
+    Pinject scope that caches the instances of the memoized bindings during
+    their ttl (in seconds), evicting the least recently used ones above
+    maxsize.
+
+    Only one thread builds an expired or missing instance, the concurrent
+    ones wait for it and reuse the new instance (single-flight refresh).
+    """
+
+    def __init__(self, maxsize: int = 128, clock: Callable[[], float] = time.monotonic):
+        self.__maxsize = maxsize
+        self.__clock = clock
+        self.__ttls: Dict[Any, float] = {}
+        self.__entries: OrderedDict[Any, Tuple[float, Any]] = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__refreshing: Dict[Any, threading.Lock] = {}
+
+    def memoize(self, name: str, ttl: float) -> MemoizedScope:
+        self.__ttls[binding_keys.new(name)] = ttl
+        return self
+
+    def provide(self, binding_key, default_provider_fn: Callable[[], Any]) -> Any:
+        if binding_key not in self.__ttls:
+            # the inner bindings (like the class of a memoized class
+            # binding) are built again on each refresh.
+            return default_provider_fn()
+
+        entry = self.__lookup(binding_key)
+        if entry is not None:
+            return entry[1]
+
+        with self.__refresh_lock(binding_key):
+            entry = self.__lookup(binding_key)
+            if entry is not None:
+                return entry[1]
+
+            instance = default_provider_fn()
+            self.__store(binding_key, instance)
+            return instance
+
+    def __refresh_lock(self, binding_key) -> threading.Lock:
+        with self.__lock:
+            return self.__refreshing.setdefault(binding_key, threading.Lock())
+
+    def __lookup(self, binding_key) -> Optional[Tuple[float, Any]]:
+        with self.__lock:
+            entry = self.__entries.get(binding_key)
+            if entry is None:
+                return None
+
+            if entry[0] <= self.__clock():
+                del self.__entries[binding_key]
+                return None
+
+            self.__entries.move_to_end(binding_key)
+            return entry
+
+    def __store(self, binding_key, instance: Any):
+        with self.__lock:
+            self.__entries[binding_key] = (self.__clock() + self.__ttls[binding_key], instance)
+            self.__entries.move_to_end(binding_key)
+            while len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
@@ -6,5 +6,6 @@
 from .adapter import (  # noqa: F401
     bind_logger,
     ExtensionLoggerAdapter,
+    LazyRepr,
     mask,
 )
@@ -3,12 +3,23 @@
 #
 # Copyright (c) 2022 Ingram Micro. All Rights Reserved.
 #
+import reprlib
 from copy import deepcopy
 from logging import LoggerAdapter
 from typing import Any, Dict, List, Tuple, Union
 
 from connect.processors_toolkit.requests import RequestBuilder
 
+DEFAULT_REPR_LIMIT = 512
+
+# bounded repr, the nested containers and strings are abbreviated while
+# rendering instead of rendering the whole value and truncating it later.
+_repr = reprlib.Repr()
+_repr.maxlevel = 4
+_repr.maxdict = 8
+_repr.maxlist = _repr.maxtuple = _repr.maxset = 4
+_repr.maxstring = _repr.maxother = 64
+
 
 class ExtensionLoggerAdapter(LoggerAdapter):
     def process(self, msg, kwargs):
@@ -22,6 +33,31 @@ class ExtensionLoggerAdapter(LoggerAdapter):
         return msg, kwargs
 
 
+class LazyRepr:
+    """
+    Deferred and truncated repr of a log message argument, the value is only
+    rendered if the record is emitted, with the nested containers and strings
+    abbreviated:
+
+        logger.debug("Processing %s", LazyRepr(request))
+    """
+
+    __slots__ = ('value', 'limit')
+
+    def __init__(self, value: Any, limit: int = DEFAULT_REPR_LIMIT):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        rendered = _repr.repr(self.value)
+        if len(rendered) <= self.limit:
+            return rendered
+
+        return f'{rendered[:self.limit]}...({len(rendered) - self.limit} more chars)'
+
+    __repr__ = __str__
+
+
 def bind_logger(logger: LoggerAdapter, request: Union[RequestBuilder, dict]) -> LoggerAdapter:
     """
     Binds the logger to the given request by attaching the id and some
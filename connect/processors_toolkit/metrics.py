@@ -0,0 +1,233 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Counter:
+    def __init__(self):
+        self.__value = 0.0
+        self.__lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self.__lock:
+            self.__value += amount
+
+    @property
+    def value(self) -> float:
+        return self.__value
+
+
+class Gauge:
+    def __init__(self):
+        self.__value = 0.0
+        self.__lock = threading.Lock()
+
+    def set(self, value: float):
+        with self.__lock:
+            self.__value = value
+
+    def inc(self, amount: float = 1.0):
+        with self.__lock:
+            self.__value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.inc(-amount)
+
+    @property
+    def value(self) -> float:
+        return self.__value
+
+
+class Histogram:
+    """
+    Cumulative histogram of the observed values, the counts are kept per
+    upper bound (the last one is +Inf).
+    """
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.__counts = [0] * len(self.buckets)
+        self.__sum = 0.0
+        self.__lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.__lock:
+            self.__counts[index] += 1
+            self.__sum += value
+
+    @property
+    def value(self) -> Dict[str, Any]:
+        with self.__lock:
+            counts = list(self.__counts)
+            total = self.__sum
+
+        cumulative = []
+        for count in counts:
+            cumulative.append(count + (cumulative[-1] if cumulative else 0))
+
+        return {
+            'count': cumulative[-1],
+            'sum': total,
+            'buckets': {_format_bound(bound): count for bound, count in zip(self.buckets, cumulative)},
+        }
+
+
+class MetricFamily:
+    """
+    A named metric along with one child metric per combination of label values.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            kind: str,
+            documentation: str,
+            label_names: Tuple[str, ...],
+            factory: Callable[[], Any],
+    ):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.label_names = label_names
+        self.__factory = factory
+        self.__children: Dict[Tuple[str, ...], Any] = {}
+        self.__lock = threading.Lock()
+
+    def labels(self, *values: str) -> Any:
+        """
+        Provides the child metric of the given label values (in label_names order).
+
+        :param values: str The label values.
+        :return: Union[Counter, Gauge, Histogram]
+        """
+        child = self.__children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f'The metric {self.name} expects the labels {self.label_names}.')
+
+            with self.__lock:
+                child = self.__children.setdefault(values, self.__factory())
+
+        return child
+
+    def samples(self) -> List[Tuple[Dict[str, str], Any]]:
+        with self.__lock:
+            children = list(self.__children.items())
+
+        return [(dict(zip(self.label_names, values)), child.value) for values, child in children]
+
+
+class MetricsRegistry:
+    """
+    In-process registry of counters, gauges and histograms, exported as
+    Prometheus text or as a JSON-serializable snapshot. As the container,
+    the registry should be process-wide.
+    """
+
+    def __init__(self):
+        self.__families: Dict[str, MetricFamily] = {}
+        self.__lock = threading.Lock()
+
+    def __family(
+            self,
+            name: str,
+            kind: str,
+            documentation: str,
+            label_names: Iterable[str],
+            factory: Callable[[], Any],
+    ) -> MetricFamily:
+        with self.__lock:
+            family = self.__families.get(name)
+            if family is None:
+                family = MetricFamily(name, kind, documentation, tuple(label_names), factory)
+                self.__families[name] = family
+            elif family.kind != kind:
+                raise ValueError(f'The metric {name} is already registered as {family.kind}.')
+
+        return family
+
+    def counter(self, name: str, documentation: str, label_names: Iterable[str] = ()) -> MetricFamily:
+        return self.__family(name, 'counter', documentation, label_names, Counter)
+
+    def gauge(self, name: str, documentation: str, label_names: Iterable[str] = ()) -> MetricFamily:
+        return self.__family(name, 'gauge', documentation, label_names, Gauge)
+
+    def histogram(
+            self,
+            name: str,
+            documentation: str,
+            label_names: Iterable[str] = (),
+            buckets: Iterable[float] = DEFAULT_BUCKETS,
+    ) -> MetricFamily:
+        buckets = tuple(buckets)
+        return self.__family(name, 'histogram', documentation, label_names, lambda: Histogram(buckets))
+
+    def families(self) -> List[MetricFamily]:
+        with self.__lock:
+            return list(self.__families.values())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Provides a JSON-serializable snapshot of every metric.
+
+        :return: Dict[str, Any]
+        """
+        return {
+            family.name: {
+                'type': family.kind,
+                'help': family.documentation,
+                'samples': [{'labels': labels, 'value': value} for labels, value in family.samples()],
+            } for family in self.families()
+        }
+
+    def prometheus(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+
+        :return: str
+        """
+        lines = []
+        for family in self.families():
+            lines.append(f'# HELP {family.name} {_escape(family.documentation, help_text=True)}')
+            lines.append(f'# TYPE {family.name} {family.kind}')
+            for labels, value in family.samples():
+                if family.kind != 'histogram':
+                    lines.append(f'{family.name}{_labels(labels)} {_format_value(value)}')
+                    continue
+
+                for bound, count in value['buckets'].items():
+                    lines.append(f'{family.name}_bucket{_labels({**labels, "le": bound})} {count}')
+                lines.append(f'{family.name}_sum{_labels(labels)} {_format_value(value["sum"])}')
+                lines.append(f'{family.name}_count{_labels(labels)} {value["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str, help_text: bool = False) -> str:
+    value = value.replace('\\', '\\\\').replace('\n', '\\n')
+    return value if help_text else value.replace('"', '\\"')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels.items()) + '}'
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+def _format_value(value: float) -> str:
+    return repr(int(value)) if float(value).is_integer() else repr(value)
@@ -3,7 +3,7 @@
 #
 # Copyright (c) 2022 Ingram Micro. All Rights Reserved.
 #
-from logging import LoggerAdapter
+from logging import INFO, LoggerAdapter
 from typing import Callable, List, Optional, Union
 
 from connect.client import AsyncConnectClient, ConnectClient
@@ -94,9 +94,8 @@ class DefaultOnMatchTransaction(WithAssetHelper):
 
     def __call__(self, request: dict) -> ProcessingResponse:
         request = RequestBuilder(request)
-        self.logger.info("The subscription {id} is in offline mode.".format(
-            id=request.asset().asset_id(),
-        ))
+        if self.logger.isEnabledFor(INFO):
+            self.logger.info("The subscription %s is in offline mode.", request.asset().asset_id())
         self.approve_asset_request(request, self.activation_tpl)
 
         return ProcessingResponse.done()
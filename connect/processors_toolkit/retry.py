@@ -0,0 +1,171 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from connect.client import ClientError
+from connect.eaas.core.responses import ProcessingResponse
+
+RETRYABLE_STATUS_CODES = frozenset({429, 502, 503})
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    True if the given error is a transient Connect error (429, 502 or 503)
+    worth retrying, false if it is permanent.
+
+    :param error: BaseException The raised error.
+    :return: bool
+    """
+    return isinstance(error, ClientError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+@dataclass
+class BudgetStats:
+    requests: int = 0
+    retries: int = 0
+    denied: int = 0
+
+
+class RetryBudget:
+    """
+    Token bucket bounding the retries to a ratio of the calls, so the
+    retries can not amplify an outage. Each call deposits `ratio` tokens
+    (up to max_tokens), each retry withdraws one and the bucket refills at
+    min_per_second tokens per second to allow a few retries on low traffic.
+    """
+
+    def __init__(
+            self,
+            ratio: float = 0.1,
+            min_per_second: float = 1.0,
+            max_tokens: float = 10.0,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self.__ratio = ratio
+        self.__min_per_second = min_per_second
+        self.__max_tokens = max_tokens
+        self.__clock = clock
+        self.__tokens = max_tokens
+        self.__updated = clock()
+        self.__stats = BudgetStats()
+        self.__lock = threading.Lock()
+
+    def __refill(self, tokens: float):
+        now = self.__clock()
+        elapsed, self.__updated = now - self.__updated, now
+        self.__tokens = min(self.__max_tokens, self.__tokens + tokens + elapsed * self.__min_per_second)
+
+    def deposit(self):
+        with self.__lock:
+            self.__stats.requests += 1
+            self.__refill(self.__ratio)
+
+    def withdraw(self) -> bool:
+        """
+        Takes the token of a retry.
+
+        :return: bool True if the retry is allowed.
+        """
+        with self.__lock:
+            self.__refill(0.0)
+            if self.__tokens < 1:
+                self.__stats.denied += 1
+                return False
+
+            self.__tokens -= 1
+            self.__stats.retries += 1
+            return True
+
+    def stats(self) -> BudgetStats:
+        with self.__lock:
+            return BudgetStats(self.__stats.requests, self.__stats.retries, self.__stats.denied)
+
+
+PROCESS_RETRY_BUDGET = RetryBudget()
+
+
+class RetryPolicy:
+    """
+    Retries the transient errors with exponential backoff and full jitter:
+    the n-th retry waits a random delay between 0 and
+    min(max_delay, base_delay * multiplier ** (n - 1)) seconds. The retries
+    are bounded by max_attempts (including the first one) and by the retry
+    budget, the process-wide one by default.
+    """
+
+    def __init__(
+            self,
+            max_attempts: int = 3,
+            base_delay: float = 0.1,
+            max_delay: float = 5.0,
+            multiplier: float = 2.0,
+            retryable: Callable[[BaseException], bool] = is_transient_error,
+            budget: Optional[RetryBudget] = None,
+            sleep: Callable[[float], None] = time.sleep,
+            jitter: Callable[[], float] = random.random,
+    ):
+        if max_attempts < 1:
+            raise ValueError('The max_attempts of a retry policy must be greater than 0.')
+
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.retryable = retryable
+        self.budget = PROCESS_RETRY_BUDGET if budget is None else budget
+        self.__sleep = sleep
+        self.__jitter = jitter
+
+    def delay(self, retry: int) -> float:
+        """
+        Provides the delay of the given retry (starting at 1).
+
+        :param retry: int The retry number.
+        :return: float The delay in seconds.
+        """
+        return self.__jitter() * min(self.max_delay, self.base_delay * self.multiplier ** (retry - 1))
+
+    def call(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Calls the given function retrying the transient errors.
+
+        :param fn: Callable[..., Any] The function to call.
+        :return: Any The function result.
+        """
+        self.budget.deposit()
+        attempt = 1
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not self.retryable(e) or not self.budget.withdraw():
+                    raise
+
+            self.__sleep(self.delay(attempt))
+            attempt += 1
+
+
+class RetryMiddleware:
+    """
+    Middleware retrying the transient errors raised by the next middlewares,
+    so it must not be the last one of the callstack. The next middlewares
+    run again on each retry, they must be idempotent.
+    """
+
+    def __init__(self, policy: Optional[RetryPolicy] = None):
+        self.policy = RetryPolicy() if policy is None else policy
+
+    def __call__(self, request: dict, nxt: Optional[Callable[[dict], ProcessingResponse]] = None) -> ProcessingResponse:
+        if nxt is None:
+            raise ValueError('The RetryMiddleware can not be the last middleware, it retries the next ones.')
+
+        return self.policy.call(nxt, request)
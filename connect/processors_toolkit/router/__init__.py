@@ -5,7 +5,23 @@
 #
 from .router import (  # noqa: F401
     CustomEventNotFound,
+    PatternMatcher,
     ProductActionNotFound,
     Route,
     Router,
+    RoutingTable,
+)
+from .pool import (  # noqa: F401
+    ControllerPool,
+    PoolStats,
+    Reusable,
+)
+from .bulkhead import (  # noqa: F401
+    Bulkhead,
+    RouteLimit,
+)
+from .cache import (  # noqa: F401
+    CacheStats,
+    ResponseCache,
+    RouteCache,
 )
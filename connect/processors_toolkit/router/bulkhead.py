@@ -0,0 +1,103 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+REJECTED_FULL = 'full'
+REJECTED_TIMEOUT = 'timeout'
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    """
+    Concurrency limit of a route: up to max_concurrency events are handled
+    at once, up to max_queue events wait at most queue_timeout seconds for
+    a free slot and the rest are rejected right away.
+    """
+    max_concurrency: int
+    max_queue: int = 0
+    queue_timeout: float = 0.0
+
+    def __post_init__(self):
+        if self.max_concurrency < 1:
+            raise ValueError('The max_concurrency of a route limit must be greater than 0.')
+        if self.max_queue < 0 or self.queue_timeout < 0:
+            raise ValueError('The max_queue and queue_timeout of a route limit must not be negative.')
+
+
+class Bulkhead:
+    """
+    Bounds the concurrent events of a single route, so a heavy route can
+    not take every worker of the process.
+    """
+
+    def __init__(self, limit: RouteLimit):
+        self.limit = limit
+        self.__active = 0
+        self.__waiting = 0
+        self.__condition = threading.Condition()
+
+    @property
+    def active(self) -> int:
+        return self.__active
+
+    @property
+    def waiting(self) -> int:
+        return self.__waiting
+
+    def try_enter(self) -> bool:
+        """
+        Takes a free slot without waiting.
+
+        :return: bool True if the slot has been taken.
+        """
+        with self.__condition:
+            if self.__active < self.limit.max_concurrency:
+                self.__active += 1
+                return True
+
+        return False
+
+    def enter(self, on_queue: Optional[Callable[[int], None]] = None) -> Optional[str]:
+        """
+        Takes a free slot, waiting in the queue up to the queue timeout if
+        there is room in it.
+
+        :param on_queue: Optional[Callable[[int], None]] Called with the queue depth on each change.
+        :return: Optional[str] None if the slot has been taken, the rejection reason otherwise.
+        """
+        with self.__condition:
+            if self.__active < self.limit.max_concurrency:
+                self.__active += 1
+                return None
+            if self.__waiting >= self.limit.max_queue:
+                return REJECTED_FULL
+
+            self.__queued(1, on_queue)
+            try:
+                if not self.__condition.wait_for(
+                        lambda: self.__active < self.limit.max_concurrency,
+                        self.limit.queue_timeout,
+                ):
+                    return REJECTED_TIMEOUT
+
+                self.__active += 1
+                return None
+            finally:
+                self.__queued(-1, on_queue)
+
+    def __queued(self, delta: int, on_queue: Optional[Callable[[int], None]]):
+        self.__waiting += delta
+        if on_queue is not None:
+            on_queue(self.__waiting)
+
+    def leave(self):
+        with self.__condition:
+            self.__active -= 1
+            self.__condition.notify()
@@ -0,0 +1,125 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Mapping, Optional, Tuple
+
+from connect.eaas.core.enums import ResultType
+
+_MISSING = object()
+
+
+@dataclass(frozen=True)
+class RouteCache:
+    """
+    Response cache policy of an idempotent route: the successful (non 4xx
+    or 5xx) responses are kept for ttl seconds, up to maxsize per route,
+    keyed by the given request fields (dotted paths, e.g. body.data.id).
+    """
+    ttl: float
+    maxsize: int = 128
+    fields: Tuple[str, ...] = ('body', 'jwt_payload')
+
+    def __post_init__(self):
+        if self.ttl <= 0 or self.maxsize < 1:
+            raise ValueError('The ttl and maxsize of a route cache must be greater than 0.')
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    size: int = 0
+
+
+def _field(request: Mapping[str, Any], path: str) -> Any:
+    value = request
+    for key in path.split('.'):
+        if not isinstance(value, Mapping):
+            return None
+        value = value.get(key)
+
+    return value
+
+
+class ResponseCache:
+    """
+    Per-route TTL and LRU bounded cache of the successful (non 4xx or 5xx)
+    controller responses, the cached responses are deep copied on each hit so the
+    callers never share their body.
+    """
+
+    def __init__(self, policies: Mapping[str, RouteCache], clock: Callable[[], float] = time.monotonic):
+        self.__policies = dict(policies)
+        self.__clock = clock
+        self.__entries: Dict[str, OrderedDict] = {route: OrderedDict() for route in self.__policies}
+        self.__stats: Dict[str, CacheStats] = {route: CacheStats() for route in self.__policies}
+        self.__lock = threading.Lock()
+
+    def key(self, route: str, name: Optional[str], request: Mapping[str, Any]) -> Optional[str]:
+        """
+        Provides the stable cache key of the request, or None if the route
+        is not cached.
+
+        :param route: str The route key (or pattern).
+        :param name: Optional[str] The dispatched process name.
+        :param request: Mapping[str, Any] The request.
+        :return: Optional[str]
+        """
+        policy = self.__policies.get(route)
+        if policy is None:
+            return None
+
+        fields = {field: _field(request, field) for field in policy.fields}
+        payload = json.dumps([name, fields], sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, route: str, key: str) -> Optional[Any]:
+        with self.__lock:
+            entries = self.__entries[route]
+            stats = self.__stats[route]
+            expires, response = entries.get(key, (0.0, _MISSING))
+            if response is _MISSING or expires <= self.__clock():
+                entries.pop(key, None)
+                stats.misses += 1
+                return None
+
+            entries.move_to_end(key)
+            stats.hits += 1
+
+        return copy.deepcopy(response)
+
+    def put(self, route: str, key: str, response: Any):
+        if getattr(response, 'status', None) != ResultType.SUCCESS or getattr(response, 'http_status', 200) >= 400:
+            return
+
+        with self.__lock:
+            entries = self.__entries[route]
+            entries[key] = (self.__clock() + self.__policies[route].ttl, response)
+            entries.move_to_end(key)
+            while len(entries) > self.__policies[route].maxsize:
+                entries.popitem(last=False)
+                self.__stats[route].evictions += 1
+
+    def clear(self):
+        with self.__lock:
+            for entries in self.__entries.values():
+                entries.clear()
+
+    def stats(self) -> Dict[str, CacheStats]:
+        with self.__lock:
+            return {
+                route: CacheStats(stats.hits, stats.misses, stats.evictions, len(self.__entries[route]))
+                for route, stats in self.__stats.items()
+            }
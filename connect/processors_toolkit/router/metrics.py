@@ -0,0 +1,138 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+import time
+from typing import Any, Optional
+
+from connect.processors_toolkit.metrics import MetricsRegistry
+
+OUTCOME_OK = 'ok'
+OUTCOME_ERROR = 'error'
+OUTCOME_BOOTSTRAP_ERROR = 'bootstrap_error'
+OUTCOME_REJECTED = 'rejected'
+OUTCOME_CACHED = 'cached'
+
+CACHE_HIT = 'hit'
+CACHE_MISS = 'miss'
+
+STAGE_RESOLVE = 'resolve'
+STAGE_BOOTSTRAP = 'bootstrap'
+STAGE_HANDLE = 'handle'
+
+
+class RouteMetrics:
+    """
+    Records the dispatch of each route in the given registry:
+        - connect_route_dispatches_total{route, outcome}: The dispatched events by
+          outcome, ok, error (exception or 5xx response), bootstrap_error, rejected
+          or cached.
+        - connect_route_bootstrap_errors_total{route, error}: The controller
+          bootstrap failures by error class.
+        - connect_route_duration_seconds{route, stage}: The latency of the route
+          resolution, the controller bootstrap and the controller handle().
+        - connect_route_queue_depth{route}: The events waiting for a free slot
+          of the route concurrency limit.
+        - connect_route_rejections_total{route, reason}: The events rejected by
+          the route concurrency limit, full queue or queue timeout.
+        - connect_route_cache_lookups_total{route, result}: The response cache
+          lookups of the cached routes, hit or miss.
+
+    The routes are labeled by route key (or pattern), <scope>.<process> for
+    the not found controllers.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.__dispatches = registry.counter(
+            'connect_route_dispatches_total',
+            'Dispatched events by route and outcome.',
+            ['route', 'outcome'],
+        )
+        self.__bootstrap_errors = registry.counter(
+            'connect_route_bootstrap_errors_total',
+            'Controller bootstrap failures by route and error.',
+            ['route', 'error'],
+        )
+        self.__durations = registry.histogram(
+            'connect_route_duration_seconds',
+            'Route resolution, controller bootstrap and handle latency.',
+            ['route', 'stage'],
+        )
+        self.__queue_depth = registry.gauge(
+            'connect_route_queue_depth',
+            'Events waiting for a free slot of the route concurrency limit.',
+            ['route'],
+        )
+        self.__rejections = registry.counter(
+            'connect_route_rejections_total',
+            'Events rejected by the route concurrency limit by reason.',
+            ['route', 'reason'],
+        )
+        self.__cache_lookups = registry.counter(
+            'connect_route_cache_lookups_total',
+            'Response cache lookups by route and result.',
+            ['route', 'result'],
+        )
+
+    @staticmethod
+    def clock() -> float:
+        return time.perf_counter()
+
+    def resolved(self, route: str, duration: float):
+        self.__durations.labels(route, STAGE_RESOLVE).observe(duration)
+
+    def bootstrapped(self, route: str, duration: float):
+        self.__durations.labels(route, STAGE_BOOTSTRAP).observe(duration)
+
+    def bootstrap_failed(self, route: str, error: Exception):
+        self.__bootstrap_errors.labels(route, error.__class__.__name__).inc()
+        self.__dispatches.labels(route, OUTCOME_BOOTSTRAP_ERROR).inc()
+
+    def handled(self, route: str, duration: float, response: Optional[Any]):
+        failed = response is None or getattr(response, 'http_status', 200) >= 500
+        self.__durations.labels(route, STAGE_HANDLE).observe(duration)
+        self.__dispatches.labels(route, OUTCOME_ERROR if failed else OUTCOME_OK).inc()
+
+    def queued(self, route: str, depth: int):
+        self.__queue_depth.labels(route).set(depth)
+
+    def rejected(self, route: str, reason: str):
+        self.__rejections.labels(route, reason).inc()
+        self.__dispatches.labels(route, OUTCOME_REJECTED).inc()
+
+    def looked_up(self, route: str, hit: bool):
+        self.__cache_lookups.labels(route, CACHE_HIT if hit else CACHE_MISS).inc()
+        if hit:
+            self.__dispatches.labels(route, OUTCOME_CACHED).inc()
+
+
+class DisabledRouteMetrics:
+    """
+    Drop-in RouteMetrics that records nothing, used if there is no registry.
+    """
+
+    @staticmethod
+    def clock() -> float:
+        return 0.0
+
+    def resolved(self, route: str, duration: float):
+        pass
+
+    def bootstrapped(self, route: str, duration: float):
+        pass
+
+    def bootstrap_failed(self, route: str, error: Exception):
+        pass
+
+    def handled(self, route: str, duration: float, response: Optional[Any]):
+        pass
+
+    def queued(self, route: str, depth: int):
+        pass
+
+    def rejected(self, route: str, reason: str):
+        pass
+
+    def looked_up(self, route: str, hit: bool):
+        pass
@@ -5,15 +5,27 @@
 #
 from __future__ import annotations
 
-from logging import LoggerAdapter
-from typing import Callable, Dict, Type, Union
+import asyncio
+import contextvars
+import functools
+import inspect
+from concurrent.futures import Executor, ThreadPoolExecutor
+from logging import DEBUG, LoggerAdapter
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, MutableMapping, Optional, Type, Union
+from weakref import WeakKeyDictionary
 
 from connect.eaas.extension import CustomEventResponse, ProductActionResponse
 from connect.processors_toolkit.dependency_injection.container import DependencyBuildingFailure
-from connect.processors_toolkit.router import Route, Router
+from connect.processors_toolkit.router import ControllerPool, Reusable, Route, Router, RoutingTable
 from connect.processors_toolkit.configuration.exceptions import MissingConfigurationParameterError
 from connect.processors_toolkit.requests.exceptions import MissingParameterError
+from connect.processors_toolkit.logger import LazyRepr
 from connect.processors_toolkit.logger.mixins import WithBoundedLogger
+from connect.processors_toolkit.metrics import MetricsRegistry
+from connect.processors_toolkit.router.bulkhead import Bulkhead, REJECTED_FULL, RouteLimit
+from connect.processors_toolkit.router.cache import ResponseCache, RouteCache
+from connect.processors_toolkit.router.metrics import DisabledRouteMetrics, RouteMetrics
 from connect.processors_toolkit.application import Container
 from connect.processors_toolkit.transactions.contracts import (
     CustomEventTransaction,
@@ -31,6 +43,24 @@ Response = Union[
 ]
 
 
+@dataclass
+class _Dispatch:
+    execution_type: str
+    route: str
+    controller: Type
+    params: Mapping[str, str]
+    metrics: Union[RouteMetrics, DisabledRouteMetrics]
+    bulkhead: Optional[Bulkhead]
+    debug: bool
+    cache_key: Optional[str] = None
+    instance: Any = None
+
+
+def _leave_if_entered(bulkhead: Bulkhead, entering: asyncio.Future):
+    if not entering.cancelled() and entering.exception() is None and entering.result() is None:
+        bulkhead.leave()
+
+
 class WithRouter:
     """
     Route the incoming request to the correct product action or custom event
@@ -39,10 +69,38 @@ class WithRouter:
     If the controller cannot be matched with any of the registered ones the router
     returns a default ProductActionNotFound or CustomEventNotFound controller that
     will respond with a 404 http error to the client.
+
+    The routes are compiled once per class into a frozen routing table, so
+    routes() and not_found() must not depend on the instance state.
+
+    The Reusable controllers are taken from a per-class pool instead of being
+    built on each event.
+
+    The async dispatch methods await the controllers whose handle() is a
+    coroutine function and run the sync ones in a bounded executor, so a
+    single worker can overlap many I/O-bound events.
+
+    If metrics() provides a registry, the route resolution, controller
+    bootstrap and handle latencies and outcomes are recorded per route.
+
+    The route_limits() bound the concurrent events of each route (shared by
+    every instance of the class), the events over the limit wait in the
+    route queue or are rejected with a 429 (full queue) or 503 (queue
+    timeout) response before building the controller.
+
+    The route_caches() enable the response cache of the idempotent routes,
+    the cached responses are served without building the controller.
     """
     logger: LoggerAdapter
     container: Container
 
+    __tables: MutableMapping[type, RoutingTable] = WeakKeyDictionary()
+    __pools: MutableMapping[type, ControllerPool] = WeakKeyDictionary()
+    __executors: MutableMapping[type, Executor] = WeakKeyDictionary()
+    __route_metrics: MutableMapping[MetricsRegistry, RouteMetrics] = WeakKeyDictionary()
+    __bulkheads_by_class: MutableMapping[type, Dict[str, Bulkhead]] = WeakKeyDictionary()
+    __caches: MutableMapping[type, ResponseCache] = WeakKeyDictionary()
+
     def routes(self) -> Dict[str, Type]:
         """
         Maps the product flow controllers by:
@@ -83,52 +141,373 @@ class WithRouter:
         """
         return {}
 
+    def controllers(self) -> List[Type]:
+        """
+        Provides every controller class declared in routes() and not_found()
+        along with the default not found controllers.
+
+        :return: The list of controller classes.
+        """
+        controllers = [
+            *self.routes().values(),
+            *Router.DEFAULT_NOT_FOUND.values(),
+            *self.not_found().values(),
+        ]
+        return list(dict.fromkeys(controllers))
+
+    def routing_table(self) -> RoutingTable:
+        """
+        Provides the routing table compiled from routes() and not_found(),
+        the table is compiled once per class.
+
+        :return: RoutingTable
+        """
+        table = WithRouter.__tables.get(self.__class__)
+        if table is None:
+            table = Router(self.routes(), self.not_found()).table
+            WithRouter.__tables[self.__class__] = table
+
+        return table
+
+    def controller_pool(self) -> ControllerPool:
+        """
+        Provides the pool of the Reusable controllers, shared by every
+        instance of the class.
+
+        :return: ControllerPool
+        """
+        pool = WithRouter.__pools.get(self.__class__)
+        if pool is None:
+            pool = WithRouter.__pools.setdefault(self.__class__, ControllerPool())
+
+        return pool
+
+    def dispatch_workers(self) -> int:
+        """
+        Provides the max amount of sync controllers run at once by the
+        async dispatch methods.
+
+        :return: int
+        """
+        return 8
+
+    def dispatch_executor(self) -> Executor:
+        """
+        Provides the executor of the sync controllers dispatched by the async
+        dispatch methods, shared by every instance of the class.
+
+        :return: Executor
+        """
+        executor = WithRouter.__executors.get(self.__class__)
+        if executor is None:
+            executor = WithRouter.__executors.setdefault(self.__class__, ThreadPoolExecutor(
+                max_workers=self.dispatch_workers(),
+                thread_name_prefix=f'{self.__class__.__name__}-dispatch',
+            ))
+
+        return executor
+
+    def metrics(self) -> Optional[MetricsRegistry]:
+        """
+        Provides the optional registry of the per-route metrics, as the
+        container it should be process-wide.
+
+        :return: Optional[MetricsRegistry]
+        """
+        return None
+
+    def route_limits(self) -> Dict[str, RouteLimit]:
+        """
+        Maps the concurrency limits by route key, route pattern or
+        <scope>.<process> for the not found controllers, the routes
+        without limit are not bounded.
+
+        Example:
+        {
+            'product.custom-event.export-report': RouteLimit(max_concurrency=2, max_queue=4, queue_timeout=5),
+        }
+
+        :return: Dict[str, RouteLimit]
+        """
+        return {}
+
+    def __bulkheads(self) -> Dict[str, Bulkhead]:
+        bulkheads = WithRouter.__bulkheads_by_class.get(self.__class__)
+        if bulkheads is None:
+            bulkheads = WithRouter.__bulkheads_by_class.setdefault(self.__class__, {
+                route: Bulkhead(limit) for route, limit in self.route_limits().items()
+            })
+
+        return bulkheads
+
+    def route_caches(self) -> Dict[str, RouteCache]:
+        """
+        Maps the response cache policies by route key or route pattern, only
+        the read-only (idempotent) routes should be cached.
+
+        Example:
+        {
+            'product.custom-event.lookup-<entity>': RouteCache(ttl=30, fields=('body.data',)),
+        }
+
+        :return: Dict[str, RouteCache]
+        """
+        return {}
+
+    def response_cache(self) -> ResponseCache:
+        """
+        Provides the response cache of the route_caches(), shared by every
+        instance of the class.
+
+        :return: ResponseCache
+        """
+        cache = WithRouter.__caches.get(self.__class__)
+        if cache is None:
+            cache = WithRouter.__caches.setdefault(self.__class__, ResponseCache(self.route_caches()))
+
+        return cache
+
+    def __metrics(self) -> Union[RouteMetrics, DisabledRouteMetrics]:
+        registry = self.metrics()
+        if registry is None:
+            return DisabledRouteMetrics()
+
+        metrics = WithRouter.__route_metrics.get(registry)
+        if metrics is None:
+            metrics = WithRouter.__route_metrics.setdefault(registry, RouteMetrics(registry))
+
+        return metrics
+
+    def __build(self, controller: Type, params: Mapping[str, str], request: dict) -> Any:
+        if issubclass(controller, Reusable):
+            # built without the request-specific values, so it can not capture them.
+            instance = self.controller_pool().acquire(
+                controller,
+                lambda: self.container.child({'client': self.client, 'logger': self.logger}).get(controller),
+            )
+            if hasattr(instance, 'client'):
+                instance.client = self.client
+            if issubclass(controller, WithBoundedLogger):
+                instance.logger = self.logger
+        elif params:
+            # only the pattern routes need a new request context for their params.
+            instance = self.container.extend({'route_params': params}).get(controller)
+        else:
+            instance = self.container.get(controller)
+
+        if issubclass(controller, WithBoundedLogger):
+            instance.bind_logger(request)
+
+        return instance
+
+    def __route(self, request: dict, execution_type: str, process: str, name: Optional[str]) -> _Dispatch:
+        metrics = self.__metrics()
+        started = metrics.clock()
+
+        debug = self.logger.isEnabledFor(DEBUG)
+        if debug:
+            self.logger.debug("Processing %s: %s", execution_type, LazyRepr(request))
+
+        route, controller, params = self.routing_table().resolve(process, name)
+        metrics.resolved(route, metrics.clock() - started)
+
+        return _Dispatch(
+            execution_type,
+            route,
+            controller,
+            params,
+            metrics,
+            self.__bulkheads().get(route),
+            debug,
+            self.response_cache().key(route, name, request),
+        )
+
+    def __cached(self, dispatch: _Dispatch) -> Optional[Response]:
+        if dispatch.cache_key is None:
+            return None
+
+        response = self.response_cache().get(dispatch.route, dispatch.cache_key)
+        dispatch.metrics.looked_up(dispatch.route, response is not None)
+        if response is not None and dispatch.debug:
+            self.logger.debug("Serving %s from the %s response cache.", dispatch.execution_type, dispatch.route)
+
+        return response
+
+    def __reject(self, dispatch: _Dispatch, reason: str, response: Type) -> Response:
+        self.logger.warning(
+            "Rejecting %s on route %s, the concurrency limit is reached (%s).",
+            dispatch.execution_type,
+            dispatch.route,
+            reason,
+        )
+        dispatch.metrics.rejected(dispatch.route, reason)
+        return response.done(http_status=429 if reason == REJECTED_FULL else 503)
+
+    def __bootstrap(self, dispatch: _Dispatch, request: dict, response: Type) -> Optional[Response]:
+        started = dispatch.metrics.clock()
+        try:
+            if dispatch.debug:
+                self.logger.debug("Loading %s %s controller.", dispatch.controller, dispatch.execution_type)
+
+            dispatch.instance = self.__build(dispatch.controller, dispatch.params, request)
+
+        except (MissingParameterError, MissingConfigurationParameterError, DependencyBuildingFailure) as e:
+            self.logger.error(
+                "%s on bootstrapping controller %s due to %s",
+                e.__class__.__name__,
+                dispatch.controller,
+                e,
+            )
+            dispatch.metrics.bootstrap_failed(dispatch.route, e)
+            if dispatch.bulkhead is not None:
+                dispatch.bulkhead.leave()
+            # Return a 500 status code on controller instantiation.
+            return response.done(http_status=500)
+
+        except BaseException:
+            # any other constructor error is raised, the route slot must be released anyway.
+            if dispatch.bulkhead is not None:
+                dispatch.bulkhead.leave()
+            raise
+
+        dispatch.metrics.bootstrapped(dispatch.route, dispatch.metrics.clock() - started)
+
+        if dispatch.debug:
+            self.logger.debug("Dispatching %s using %s controller.", dispatch.execution_type, dispatch.controller)
+        return None
+
+    def __finish(self, dispatch: _Dispatch, started: float, response: Optional[Response]):
+        dispatch.metrics.handled(dispatch.route, dispatch.metrics.clock() - started, response)
+        if issubclass(dispatch.controller, Reusable):
+            self.controller_pool().release(dispatch.controller, dispatch.instance)
+        if dispatch.bulkhead is not None:
+            dispatch.bulkhead.leave()
+        if dispatch.cache_key is not None and response is not None:
+            self.response_cache().put(dispatch.route, dispatch.cache_key, response)
+
+    def __dispatch(self, dispatch: _Dispatch, request: dict, response: Type) -> Response:
+        failure = self.__bootstrap(dispatch, request, response)
+        if failure is not None:
+            return failure
+
+        started = dispatch.metrics.clock()
+        result = None
+        try:
+            result = dispatch.instance.handle(request)
+            return result
+        finally:
+            self.__finish(dispatch, started, result)
+
     def __route_and_dispatch(
             self,
             request: dict,
             execution_type: str,
-            route: Route,
-            on_bootstrap_error: Callable[[Exception, dict], Response],
-            execute: Callable[[Controller, dict], Response],
+            process: str,
+            name: Optional[str],
+            response: Type,
     ) -> Response:
-        self.logger.debug(f"Processing {execution_type}: {request}")
+        dispatch = self.__route(request, execution_type, process, name)
+        cached = self.__cached(dispatch)
+        if cached is not None:
+            return cached
+
+        if dispatch.bulkhead is not None:
+            reason = dispatch.bulkhead.enter(functools.partial(dispatch.metrics.queued, dispatch.route))
+            if reason is not None:
+                return self.__reject(dispatch, reason, response)
 
-        controller = Router(self.routes(), self.not_found()).route(route)
+        return self.__dispatch(dispatch, request, response)
 
+    @staticmethod
+    async def __enter_async(dispatch: _Dispatch) -> Optional[str]:
+        # the queued events wait out of the event loop.
+        entering = asyncio.get_running_loop().run_in_executor(
+            None,
+            dispatch.bulkhead.enter,
+            functools.partial(dispatch.metrics.queued, dispatch.route),
+        )
         try:
-            self.logger.debug(f"Loading {controller} {execution_type} controller.")
+            return await asyncio.shield(entering)
+        except asyncio.CancelledError:
+            # the waiting thread can not be interrupted, the slot it may
+            # still take is released right away.
+            entering.add_done_callback(functools.partial(_leave_if_entered, dispatch.bulkhead))
+            raise
 
-            instance = self.container.get(controller)
-            if issubclass(controller, WithBoundedLogger):
-                instance.bind_logger(request)
+    async def __route_and_dispatch_async(
+            self,
+            request: dict,
+            execution_type: str,
+            process: str,
+            name: Optional[str],
+            response: Type,
+    ) -> Response:
+        dispatch = self.__route(request, execution_type, process, name)
+        cached = self.__cached(dispatch)
+        if cached is not None:
+            return cached
 
-        except (MissingParameterError, MissingConfigurationParameterError, DependencyBuildingFailure) as e:
-            self.logger.error("{error} on bootstrapping controller {controller} due to {msg}".format(
-                error=e.__class__.__name__,
-                controller=controller,
-                msg=str(e),
+        if dispatch.bulkhead is not None and not dispatch.bulkhead.try_enter():
+            reason = REJECTED_FULL
+            if dispatch.bulkhead.limit.max_queue > 0:
+                reason = await self.__enter_async(dispatch)
+            if reason is not None:
+                return self.__reject(dispatch, reason, response)
+
+        if not inspect.iscoroutinefunction(dispatch.controller.handle):
+            # the sync controllers are built and run out of the event loop, once
+            # started (the route slot is taken) they run to completion even if
+            # the awaiting task is cancelled, so the slot is always released.
+            context = contextvars.copy_context()
+            return await asyncio.shield(asyncio.get_running_loop().run_in_executor(
+                self.dispatch_executor(),
+                functools.partial(context.run, self.__dispatch, dispatch, request, response),
             ))
-            return on_bootstrap_error(e, request)
 
-        self.logger.debug(f"Dispatching {execution_type} using {controller} controller.")
-        return execute(instance, request)
+        failure = self.__bootstrap(dispatch, request, response)
+        if failure is not None:
+            return failure
+
+        started = dispatch.metrics.clock()
+        result = None
+        try:
+            result = await dispatch.instance.handle(request)
+            return result
+        finally:
+            self.__finish(dispatch, started, result)
 
     def route_and_dispatch_product_action(self, request: dict) -> ProductActionResponse:
         return self.__route_and_dispatch(
             request,
             'product action',
-            Route.for_action(request.get('jwt_payload', {}).get('action_id')),
-            # Return a 500 status code on controller instantiation.
-            lambda _, __: ProductActionResponse.done(http_status=500),
-            lambda ctrl, req: ctrl.handle(req),
+            Route.PROCESS_ACTION,
+            request.get('jwt_payload', {}).get('action_id'),
+            ProductActionResponse,
+        )
+
+    async def route_and_dispatch_product_action_async(self, request: dict) -> ProductActionResponse:
+        return await self.__route_and_dispatch_async(
+            request,
+            'product action',
+            Route.PROCESS_ACTION,
+            request.get('jwt_payload', {}).get('action_id'),
+            ProductActionResponse,
         )
 
     def route_and_dispatch_custom_event(self, request: dict) -> CustomEventResponse:
         return self.__route_and_dispatch(
             request,
             'custom event',
-            Route.for_custom_event(request.get('body', {}).get('controller')),
-            # Return a 500 status code on controller instantiation.
-            lambda _, __: CustomEventResponse.done(http_status=500),
-            lambda ctrl, req: ctrl.handle(req),
+            Route.PROCESS_CUSTOM_EVENT,
+            request.get('body', {}).get('controller'),
+            CustomEventResponse,
+        )
+
+    async def route_and_dispatch_custom_event_async(self, request: dict) -> CustomEventResponse:
+        return await self.__route_and_dispatch_async(
+            request,
+            'custom event',
+            Route.PROCESS_CUSTOM_EVENT,
+            request.get('body', {}).get('controller'),
+            CustomEventResponse,
         )
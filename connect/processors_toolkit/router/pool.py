@@ -0,0 +1,77 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Type
+
+
+class Reusable:
+    """
+    Marks a stateless controller whose instances are reused across events.
+
+    The pooled instances are built without the request-specific values
+    (request and route params), only the process-wide bindings, the client
+    and the logger can be injected. The client kept as the client attribute
+    is rebound to the application client on each event, and if the
+    controller uses the WithBoundedLogger mixin its logger is rebound from
+    the application logger as well.
+    """
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    idle: int = 0
+
+
+class ControllerPool:
+    """
+    Per-class pool of reusable controller instances, each instance is used
+    by a single event at a time and up to maxsize idle instances are kept
+    per class.
+    """
+
+    def __init__(self, maxsize: int = 8):
+        self.__maxsize = maxsize
+        self.__idle: Dict[Type, Deque[Any]] = {}
+        self.__stats: Dict[Type, PoolStats] = {}
+        self.__lock = threading.Lock()
+
+    def acquire(self, controller: Type, build: Callable[[], Any]) -> Any:
+        """
+        Provides an idle instance of the given controller, or a new one.
+
+        :param controller: Type The controller class.
+        :param build: Callable[[], Any] The builder of new instances.
+        :return: Any The controller instance.
+        """
+        with self.__lock:
+            stats = self.__stats.setdefault(controller, PoolStats())
+            idle = self.__idle.get(controller)
+            if idle:
+                stats.hits += 1
+                return idle.pop()
+
+            stats.misses += 1
+
+        return build()
+
+    def release(self, controller: Type, instance: Any):
+        with self.__lock:
+            idle = self.__idle.setdefault(controller, deque())
+            if len(idle) < self.__maxsize:
+                idle.append(instance)
+
+    def stats(self) -> Dict[Type, PoolStats]:
+        with self.__lock:
+            return {
+                controller: PoolStats(stats.hits, stats.misses, len(self.__idle.get(controller, ())))
+                for controller, stats in self.__stats.items()
+            }
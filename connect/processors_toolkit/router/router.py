@@ -5,8 +5,10 @@
 #
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
-from typing import Dict, List, Type
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Optional, Set, Tuple, Type
 
 from connect.eaas.core.responses import CustomEventResponse, ProductActionResponse
 from connect.processors_toolkit.transactions.contracts import CustomEventTransaction, ProductActionTransaction
@@ -34,6 +36,15 @@ class ProductActionNotFound(ProductActionTransaction):
         return ProductActionResponse.done(http_status=404)
 
 
+SCOPES = frozenset(['product'])
+PROCESSES = frozenset(['custom-event', 'action'])
+
+_PATTERN_TOKEN = re.compile(r'<([A-Za-z_][A-Za-z0-9_]*)>|(\*)|([^<>*]+)')
+_SEGMENT_SEPARATORS = frozenset('-.')
+
+NO_PARAMS: Mapping[str, str] = MappingProxyType({})
+
+
 @dataclass
 class Route:
     scope: str
@@ -46,10 +57,10 @@ class Route:
     PROCESS_ACTION = 'action'
 
     def __post_init__(self):
-        if self.scope not in self.scopes():
+        if self.scope not in SCOPES:
             raise ValueError(f'Invalid route scope value <{self.scope}>.')
 
-        if self.process not in self.processes():
+        if self.process not in PROCESSES:
             raise ValueError(f'Invalid route process value <{self.process}>.')
 
         if ' ' in self.name:
@@ -81,19 +92,260 @@ class Route:
         return f"{self.scope}.{self.process}.{self.name}"
 
 
+def is_route_pattern(name: str) -> bool:
+    return '*' in name or '<' in name
+
+
+class _PatternNode:
+    __slots__ = ('literals', 'params', 'wildcard', 'controller', 'pattern')
+
+    def __init__(self):
+        self.literals: Dict[str, _PatternNode] = {}
+        self.params: Dict[str, _PatternNode] = {}
+        self.wildcard: Optional[_PatternNode] = None
+        self.controller: Optional[Type] = None
+        self.pattern: Optional[str] = None
+
+
+_NODE, _PARAM, _WILDCARD = 'node', 'param', 'wildcard'
+
+
+class _Candidate(NamedTuple):
+    kind: str
+    node: _PatternNode
+    captured: Tuple[Tuple[str, str], ...] = ()
+    param: Optional[str] = None
+    start: int = 0
+
+
+class PatternMatcher:
+    """
+    Prefix trie of route name patterns:
+        - The * wildcard matches any (even empty) run of characters.
+        - The <param> placeholders match a non-empty segment of the name (a
+          run of characters other than - and .) captured by the param name.
+
+    The literal characters take precedence over the params and the params
+    over the wildcards, the params match the whole segment and the wildcards
+    the shortest run that completes a pattern. The name is read once, all
+    the candidate trie states being followed at the same time (without
+    backtracking), so matching a name costs at most the length of the name
+    times the amount of trie states.
+    """
+
+    def __init__(self):
+        self.__root = _PatternNode()
+
+    def add(self, pattern: str, controller: Type) -> PatternMatcher:
+        node = self.__root
+        position = 0
+        for token in _PATTERN_TOKEN.finditer(pattern):
+            if token.start() != position:
+                break
+            position = token.end()
+
+            param, wildcard, literal = token.groups()
+            if param is not None:
+                node = node.params.setdefault(param, _PatternNode())
+            elif wildcard is not None:
+                node.wildcard = _PatternNode() if node.wildcard is None else node.wildcard
+                node = node.wildcard
+            else:
+                for character in literal:
+                    node = node.literals.setdefault(character, _PatternNode())
+
+        if position != len(pattern):
+            raise ValueError(f'Invalid route pattern <{pattern}>.')
+
+        node.controller = controller
+        node.pattern = pattern
+        return self
+
+    def match(self, name: str) -> Optional[Tuple[Type, Dict[str, str]]]:
+        """
+        Matches the given route name.
+
+        :param name: str The route name.
+        :return: Optional[Tuple[Type, Dict[str, str]]] The controller and the captured params.
+        """
+        matched = self.match_pattern(name)
+        return None if matched is None else matched[1:]
+
+    def match_pattern(self, name: str) -> Optional[Tuple[str, Type, Dict[str, str]]]:
+        """
+        Matches the given route name.
+
+        :param name: str The route name.
+        :return: Optional[Tuple[str, Type, Dict[str, str]]] The pattern, the controller and the captured params.
+        """
+        # the candidates are kept in precedence order, a state of the trie
+        # is only followed by the first candidate reaching it.
+        candidates = [_Candidate(_NODE, self.__root)]
+        for position in range(len(name) + 1):
+            visited: Set[Tuple[str, _PatternNode, Optional[str]]] = set()
+            following: List[_Candidate] = []
+            for candidate in candidates:
+                matched = self.__follow(candidate, name, position, visited, following)
+                if matched is not None:
+                    return matched.node.pattern, matched.node.controller, dict(matched.captured)
+            candidates = following
+
+        return None
+
+    def __follow(
+            self,
+            candidate: _Candidate,
+            name: str,
+            position: int,
+            visited: Set[Tuple[str, _PatternNode, Optional[str]]],
+            following: List[_Candidate],
+    ) -> Optional[_Candidate]:
+        key = (candidate.kind, candidate.node, candidate.param)
+        if key in visited:
+            return None
+        visited.add(key)
+
+        if candidate.kind == _PARAM:
+            # the params are greedy, they only end with the segment.
+            if position < len(name) and name[position] not in _SEGMENT_SEPARATORS:
+                following.append(candidate)
+                return None
+            captured = candidate.captured + ((candidate.param, name[candidate.start:position]),)
+            return self.__follow(_Candidate(_NODE, candidate.node, captured), name, position, visited, following)
+
+        if candidate.kind == _WILDCARD:
+            # the wildcards are lazy, they try to end before taking one more character.
+            ended = _Candidate(_NODE, candidate.node, candidate.captured)
+            matched = self.__follow(ended, name, position, visited, following)
+            if matched is None and position < len(name):
+                following.append(candidate)
+            return matched
+
+        return self.__follow_node(candidate, name, position, visited, following)
+
+    def __follow_node(
+            self,
+            candidate: _Candidate,
+            name: str,
+            position: int,
+            visited: Set[Tuple[str, _PatternNode, Optional[str]]],
+            following: List[_Candidate],
+    ) -> Optional[_Candidate]:
+        node, captured = candidate.node, candidate.captured
+        if position == len(name):
+            if node.controller is not None:
+                return candidate
+        else:
+            literal = node.literals.get(name[position])
+            if literal is not None:
+                following.append(_Candidate(_NODE, literal, captured))
+            if name[position] not in _SEGMENT_SEPARATORS:
+                for param, child in node.params.items():
+                    following.append(_Candidate(_PARAM, child, captured, param, position))
+
+        if node.wildcard is None:
+            return None
+        return self.__follow(_Candidate(_WILDCARD, node.wildcard, captured), name, position, visited, following)
+
+
+class RoutingTable:
+    """
+    Frozen routing table compiled from the routes and not found maps, the
+    keys are validated once and the controllers are looked up by process
+    type and name.
+
+    The route names with * wildcards or <param> placeholders are compiled
+    into a PatternMatcher per process type, the exact routes are matched
+    first.
+    """
+
+    def __init__(self, routes: Dict[str, Type], not_found: Dict[str, Type]):
+        exact = {}
+        self.__patterns: Dict[str, PatternMatcher] = {}
+        for key, controller in routes.items():
+            process, name = self.__compile_key(key, 3)
+            if is_route_pattern(name):
+                self.__patterns.setdefault(process, PatternMatcher()).add(name, controller)
+            else:
+                exact[(process, name)] = controller
+
+        self.__controllers = list(dict.fromkeys(routes.values()))
+        self.__routes: Mapping[Tuple[str, str], Type] = MappingProxyType(exact)
+        self.__not_found: Mapping[str, Type] = MappingProxyType({
+            self.__compile_key(key, 2)[0]: controller for key, controller in not_found.items()
+        })
+
+    @staticmethod
+    def __compile_key(key: str, parts: int) -> Tuple[str, ...]:
+        values = key.split('.', parts - 1)
+        if len(values) != parts:
+            raise ValueError(f'Invalid route key <{key}>.')
+
+        route = Route(*values) if parts == 3 else Route(*values, '')
+        return (route.process, route.name) if parts == 3 else (route.process,)
+
+    def lookup(self, process: str, name: Optional[str]) -> Optional[Type]:
+        """
+        Provides the controller of the given process type and name, or the
+        not found controller of the process type.
+
+        :param process: str The process type (custom-event, action).
+        :param name: Optional[str] The process name.
+        :return: Optional[Type] The controller class.
+        """
+        return self.match(process, name)[0]
+
+    def match(self, process: str, name: Optional[str]) -> Tuple[Optional[Type], Mapping[str, str]]:
+        """
+        Provides the controller of the given process type and name along with
+        the params captured by its route pattern, or the not found controller
+        of the process type.
+
+        :param process: str The process type (custom-event, action).
+        :param name: Optional[str] The process name.
+        :return: Tuple[Optional[Type], Mapping[str, str]] The controller class and the captured params.
+        """
+        return self.resolve(process, name)[1:]
+
+    def resolve(self, process: str, name: Optional[str]) -> Tuple[str, Optional[Type], Mapping[str, str]]:
+        """
+        Same as match() along with the key of the matched route, the route
+        pattern for the pattern routes or <scope>.<process> if not found.
+
+        :param process: str The process type (custom-event, action).
+        :param name: Optional[str] The process name.
+        :return: Tuple[str, Optional[Type], Mapping[str, str]] The route key, controller class and params.
+        """
+        controller = self.__routes.get((process, name))
+        if controller is not None:
+            return f'{Route.SCOPE_PRODUCT}.{process}.{name}', controller, NO_PARAMS
+
+        patterns = self.__patterns.get(process)
+        matched = None if patterns is None or name is None else patterns.match_pattern(name)
+        if matched is not None:
+            return f'{Route.SCOPE_PRODUCT}.{process}.{matched[0]}', matched[1], matched[2]
+
+        return f'{Route.SCOPE_PRODUCT}.{process}', self.__not_found.get(process), NO_PARAMS
+
+    def controllers(self) -> List[Type]:
+        return list(dict.fromkeys([*self.__controllers, *self.__not_found.values()]))
+
+
 class Router:
+    DEFAULT_NOT_FOUND: Dict[str, Type] = {
+        'product.custom-event': CustomEventNotFound,
+        'product.action': ProductActionNotFound,
+    }
+
     def __init__(self, routes: Dict[str, Type], not_found: Dict[str, Type]):
-        self.__routes: Dict[str, Type] = routes
-        self.__not_found: Dict[str, Type] = {
-            'product.custom-event': CustomEventNotFound,
-            'product.action': ProductActionNotFound,
-        }
+        self.__table = RoutingTable(routes, {**self.DEFAULT_NOT_FOUND, **not_found})
 
-        self.__not_found.update(not_found)
+    @property
+    def table(self) -> RoutingTable:
+        return self.__table
 
     def route(self, route: Route) -> Type:
-        controller = self.__routes.get(route.main())
-        if controller is None:
-            controller = self.__not_found.get(route.not_found())
+        return self.__table.lookup(route.process, route.name)
 
-        return controller
+    def match(self, route: Route) -> Tuple[Type, Mapping[str, str]]:
+        return self.__table.match(route.process, route.name)
@@ -3,19 +3,36 @@
 #
 # Copyright (c) 2022 Ingram Micro. All Rights Reserved.
 #
-from typing import List, Optional, Tuple
+import asyncio
+import contextvars
+import functools
+import inspect
+import queue
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
 
 from connect.eaas.core.responses import ProcessingResponse
+from connect.processors_toolkit.requests.helpers import request_model
+from connect.processors_toolkit.retry import RetryPolicy
 from connect.processors_toolkit.transactions.contracts import (
+    AnyMiddleware,
     AnyProcessingTransactionStatement,
+    AsyncProcessingTransactionStatement,
+    FnAsyncProcessingTransaction,
     FnProcessingCompensation,
     FnProcessingPredicate,
     FnProcessingTransaction,
+    Idempotent,
     Middleware,
     ProcessingTransactionStatement,
 )
 from connect.processors_toolkit.transactions.exceptions import TransactionStatementException
 
+RequestKeys = Tuple[Optional[str], Optional[str], str]
+
+_SYNC_CALLER: contextvars.ContextVar[Optional[queue.SimpleQueue]] = contextvars.ContextVar('sync_caller', default=None)
+
 
 class TupleProcessTransactionStatement(ProcessingTransactionStatement):
     def __init__(
@@ -45,6 +62,88 @@ class TupleProcessTransactionStatement(ProcessingTransactionStatement):
         return self._compensation(request, e)
 
 
+@dataclass(frozen=True)
+class SelectionKeys:
+    """
+    Declarative keys of a transaction statement, its predicate is only
+    evaluated for the requests of the given types, statuses and models
+    (asset or tier-config). An empty key matches any request.
+    """
+    types: FrozenSet[str] = frozenset()
+    statuses: FrozenSet[str] = frozenset()
+    models: FrozenSet[str] = frozenset()
+
+    def matches(self, request_keys: RequestKeys) -> bool:
+        request_type, status, model = request_keys
+        return (
+            (not self.types or request_type in self.types)
+            and (not self.statuses or status in self.statuses)
+            and (not self.models or model in self.models)
+        )
+
+
+ANY_REQUEST = SelectionKeys()
+
+
+class KeyedTransactionStatement(ProcessingTransactionStatement):
+    def __init__(self, statement: ProcessingTransactionStatement, keys: SelectionKeys):
+        self.statement = statement
+        self.keys = keys
+
+    def name(self) -> str:
+        return self.statement.name()
+
+    def should_execute(self, request: dict) -> bool:
+        return self.statement.should_execute(request)
+
+    def execute(self, request: dict) -> ProcessingResponse:
+        return self.statement.execute(request)
+
+    def compensate(self, request: dict, e: Exception) -> ProcessingResponse:
+        return self.statement.compensate(request, e)
+
+
+def keyed(
+        statement: AnyProcessingTransactionStatement,
+        types: Iterable[str] = (),
+        statuses: Iterable[str] = (),
+        models: Iterable[str] = (),
+) -> KeyedTransactionStatement:
+    """
+    Declares the selection keys of the given statement.
+
+    :param statement: AnyProcessingTransactionStatement The transaction statement.
+    :param types: Iterable[str] The request types (purchase, change, setup...).
+    :param statuses: Iterable[str] The request statuses (pending, inquiring...).
+    :param models: Iterable[str] The request models (asset or tier-config).
+    :return: KeyedTransactionStatement
+    """
+    return KeyedTransactionStatement(
+        compile_statement(statement),
+        SelectionKeys(frozenset(types), frozenset(statuses), frozenset(models)),
+    )
+
+
+def compile_statement(statement: AnyProcessingTransactionStatement) -> ProcessingTransactionStatement:
+    """
+    Compiles the given statement (or tuple statement) into a transaction statement.
+
+    :param statement: AnyProcessingTransactionStatement The transaction statement.
+    :return: ProcessingTransactionStatement
+    :raises InvalidTransactionStatement: If the statement is neither a statement nor a tuple.
+    """
+    if isinstance(statement, ProcessingTransactionStatement):
+        return statement
+    elif isinstance(statement, Tuple):
+        return TupleProcessTransactionStatement(*statement)
+    else:
+        raise TransactionStatementException.invalid('Invalid transaction statement.')
+
+
+def _request_keys(request: dict) -> RequestKeys:
+    return request.get('type'), request.get('status'), request_model(request)
+
+
 def select(transactions: List[AnyProcessingTransactionStatement], request: dict) -> ProcessingTransactionStatement:
     """
     Select the correct transaction for the given request (context).
@@ -53,35 +152,86 @@ def select(transactions: List[AnyProcessingTransactionStatement], request: dict)
     :param request: dict The Connect Request dictionary.
     :return: ProcessTransactionStatement
     """
+    return TransactionSelector(transactions).select(request)
 
-    def __prepare_transaction_statement(statement: AnyProcessingTransactionStatement) -> ProcessingTransactionStatement:
-        if isinstance(statement, ProcessingTransactionStatement):
-            return statement
-        elif isinstance(statement, Tuple):
-            return TupleProcessTransactionStatement(*statement)
-        else:
-            raise TransactionStatementException.invalid('Invalid transaction statement.')
 
-    for statement in [__prepare_transaction_statement(t) for t in transactions if t]:
-        if statement.should_execute(request):
-            return statement
-    raise TransactionStatementException.not_selected('Unable to select a transaction.')
+class TransactionSelector:
+    """
+    Selects the first transaction statement that should be executed for
+    the request.
 
+    The statements are compiled once (an invalid statement is rejected on
+    construction), the keyed() statements are indexed
+    by their selection keys so only the candidates of the request type,
+    status and model have their predicates evaluated. The candidates are
+    cached per request keys.
+    """
 
-class TransactionSelector:
     def __init__(self, transactions: List[AnyProcessingTransactionStatement]):
-        self.__transactions = transactions
+        self.__statements: List[ProcessingTransactionStatement] = [compile_statement(t) for t in transactions if t]
+        self.__keys: List[SelectionKeys] = [
+            statement.keys if isinstance(statement, KeyedTransactionStatement) else ANY_REQUEST
+            for statement in self.__statements
+        ]
+        self.__candidates: Dict[RequestKeys, Tuple[ProcessingTransactionStatement, ...]] = {}
+
+    def candidates(self, request: dict) -> Tuple[ProcessingTransactionStatement, ...]:
+        """
+        Provides the statements whose selection keys match the request, in
+        declaration order.
+
+        :param request: dict The Connect Request dictionary.
+        :return: Tuple[ProcessingTransactionStatement, ...]
+        """
+        request_keys = _request_keys(request)
+        candidates = self.__candidates.get(request_keys)
+        if candidates is None:
+            candidates = tuple(
+                statement for statement, keys in zip(self.__statements, self.__keys) if keys.matches(request_keys)
+            )
+            self.__candidates[request_keys] = candidates
+
+        return candidates
 
     def select(self, request: dict) -> ProcessingTransactionStatement:
-        return select(self.__transactions, request)
+        for statement in self.candidates(request):
+            if statement.should_execute(request):
+                return statement
+        raise TransactionStatementException.not_selected('Unable to select a transaction.')
+
+
+def is_idempotent(statement: ProcessingTransactionStatement) -> bool:
+    """
+    True if the given statement (or the keyed statement it wraps) is marked
+    as Idempotent.
+
+    :param statement: ProcessingTransactionStatement The transaction statement.
+    :return: bool
+    """
+    if isinstance(statement, KeyedTransactionStatement):
+        statement = statement.statement
+    return isinstance(statement, Idempotent)
 
 
 class TransactionExecutorMiddleware:
-    def __init__(self, transaction: ProcessingTransactionStatement):
+    """
+    Executes the transaction compensating it on failure, the transient
+    errors are retried first if a retry policy is given. The retries run
+    the whole statement again, so only the Idempotent statements accept a
+    retry policy.
+    """
+
+    def __init__(self, transaction: ProcessingTransactionStatement, retry_policy: Optional[RetryPolicy] = None):
+        if retry_policy is not None and not is_idempotent(transaction):
+            raise ValueError(f'The statement {transaction.name()} is not Idempotent, it can not be retried.')
+
         self.transaction = transaction
+        self.retry_policy = retry_policy
 
     def __call__(self, request: dict, _: Optional[FnProcessingTransaction] = None) -> ProcessingResponse:
         try:
+            if self.retry_policy is not None:
+                return self.retry_policy.call(self.transaction.execute, request)
             return self.transaction.execute(request)
         except Exception as e:
             return self.transaction.compensate(request, e)
@@ -109,3 +259,122 @@ def make_middleware_callstack(middlewares: List[Middleware]) -> FnProcessingTran
         callstack = current
 
     return callstack
+
+
+def _is_coroutine_callable(fn: Any) -> bool:
+    if inspect.isroutine(fn):
+        return inspect.iscoroutinefunction(fn)
+    return inspect.iscoroutinefunction(type(fn).__call__)
+
+
+async def _call_async(executor: Optional[Executor], fn: Any, *args) -> Any:
+    if _is_coroutine_callable(fn):
+        return await fn(*args)
+
+    # the sync callables may block, they are run out of the event loop.
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, fn, *args)
+    caller = _SYNC_CALLER.get()
+    if caller is None:
+        return await asyncio.get_running_loop().run_in_executor(executor, call)
+
+    # a sync middleware thread is already waiting on this callstack, it
+    # runs the call instead of taking another thread of the executor.
+    future = Future()
+    caller.put((call, future))
+    return await asyncio.wrap_future(future)
+
+
+def _wait_on_loop(
+        loop: asyncio.AbstractEventLoop,
+        next_: FnAsyncProcessingTransaction,
+        request: dict,
+) -> ProcessingResponse:
+    calls = queue.SimpleQueue()
+
+    async def __next_with_caller() -> ProcessingResponse:
+        _SYNC_CALLER.set(calls)
+        return await next_(request)
+
+    future = asyncio.run_coroutine_threadsafe(__next_with_caller(), loop)
+    future.add_done_callback(lambda _: calls.put(None))
+    while True:
+        item = calls.get()
+        if item is None:
+            return future.result()
+
+        call, result = item
+        if result.set_running_or_notify_cancel():
+            try:
+                result.set_result(call())
+            except BaseException as e:
+                result.set_exception(e)
+
+
+class AsyncTransactionExecutorMiddleware:
+    """
+    Async counterpart of the TransactionExecutorMiddleware, the sync
+    statements are executed (and compensated) in the given executor (the
+    event loop default executor by default).
+    """
+
+    def __init__(
+            self,
+            transaction: Union[ProcessingTransactionStatement, AsyncProcessingTransactionStatement],
+            executor: Optional[Executor] = None,
+    ):
+        self.transaction = transaction
+        self.executor = executor
+
+    async def __call__(
+            self,
+            request: dict,
+            _: Optional[FnAsyncProcessingTransaction] = None,
+    ) -> ProcessingResponse:
+        try:
+            return await _call_async(self.executor, self.transaction.execute, request)
+        except Exception as e:
+            return await _call_async(self.executor, self.transaction.compensate, request, e)
+
+
+def make_async_middleware_callstack(
+        middlewares: List[AnyMiddleware],
+        executor: Optional[Executor] = None,
+) -> FnAsyncProcessingTransaction:
+    """
+    Makes the async middleware callstack, mixing sync and async middlewares.
+
+    The async middlewares are awaited on the event loop. The first sync
+    middleware of the callstack is run in the given executor (the event
+    loop default executor by default) and its next middleware awaits the
+    rest of the callstack on the event loop. The sync middlewares and
+    statements further down are run back in that same thread, so a request
+    never takes more than one thread of the executor.
+
+    :param middlewares: List[AnyMiddleware] The list of middlewares to prepare.
+    :param executor: Optional[Executor] The executor of the sync middlewares.
+    :return: FnAsyncProcessingTransaction
+    """
+
+    def __make_async_middleware(
+            current_: AnyMiddleware,
+            next_: Optional[FnAsyncProcessingTransaction] = None,
+    ) -> FnAsyncProcessingTransaction:
+        if _is_coroutine_callable(current_):
+            async def __async_middleware_callstack(request: dict):
+                return await current_(request, next_)
+
+            return __async_middleware_callstack
+
+        async def __sync_middleware_callstack(request: dict):
+            loop = asyncio.get_running_loop()
+            nxt = None if next_ is None else functools.partial(_wait_on_loop, loop, next_)
+            return await _call_async(executor, current_, request, nxt)
+
+        return __sync_middleware_callstack
+
+    callstack = None
+    for middleware in reversed(middlewares):
+        callstack = __make_async_middleware(middleware, callstack)
+
+    return callstack
@@ -0,0 +1,184 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from connect.eaas.core.responses import ProcessingResponse
+from connect.processors_toolkit.transactions import TransactionSelector
+from connect.processors_toolkit.transactions.contracts import ProcessingTransactionStatement
+
+
+def ordering_key(request: dict) -> Optional[str]:
+    """
+    Provides the asset (or tier configuration) id of the request, the
+    requests with the same key are executed in input order.
+
+    :param request: dict The Connect Request dictionary.
+    :return: Optional[str]
+    """
+    for model in ['asset', 'configuration']:
+        model_id = (request.get(model) or {}).get('id')
+        if model_id is not None:
+            return model_id
+
+    return None
+
+
+@dataclass
+class BatchResult:
+    index: int
+    request: dict
+    statement: Optional[str] = None
+    response: Optional[ProcessingResponse] = None
+    error: Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class StatementStats:
+    count: int = 0
+    errors: int = 0
+    total: float = 0.0
+
+
+@dataclass
+class BatchStats:
+    """
+    Statistics of a batch run, the durations in seconds. The statements
+    are keyed by name, the requests without statement are not included.
+    """
+    requests: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    selection: float = 0.0
+    elapsed: float = 0.0
+    statements: Dict[str, StatementStats] = field(default_factory=dict)
+
+    def throughput(self) -> float:
+        """
+        Provides the processed requests per second.
+
+        :return: float
+        """
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+
+_Lane = List[Tuple[BatchResult, ProcessingTransactionStatement]]
+
+
+class BatchExecutor:
+    """
+    Selects and executes the transaction statements of many requests.
+
+    The statements are selected for every request first and the requests
+    are grouped by statement. The requests are executed in a bounded
+    thread pool, the ones with the same ordering key (the asset or tier
+    configuration id by default) one after the other in input order. The
+    failed statements are compensated as in the TransactionExecutorMiddleware.
+    """
+
+    def __init__(
+            self,
+            selector: TransactionSelector,
+            max_workers: int = 8,
+            key: Callable[[dict], Optional[str]] = ordering_key,
+            clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.__selector = selector
+        self.__max_workers = max_workers
+        self.__key = key
+        self.__clock = clock
+
+    def select(self, requests: Iterable[dict]) -> Tuple[List[BatchResult], Dict[str, _Lane]]:
+        """
+        Selects the statement of each request, grouping the requests by
+        statement name. The requests without statement (or whose selection
+        raised any error) are reported with the selection error.
+
+        :param requests: Iterable[dict] The Connect Request dictionaries.
+        :return: Tuple[List[BatchResult], Dict[str, List[Tuple[BatchResult, ProcessingTransactionStatement]]]]
+        """
+        results: List[BatchResult] = []
+        groups: Dict[str, _Lane] = {}
+        for index, request in enumerate(requests):
+            result = BatchResult(index, request)
+            results.append(result)
+            try:
+                statement = self.__selector.select(request)
+            except Exception as e:
+                result.error = e
+                continue
+
+            result.statement = statement.name()
+            groups.setdefault(result.statement, []).append((result, statement))
+
+        return results, groups
+
+    def __lanes(self, groups: Dict[str, _Lane]) -> List[_Lane]:
+        lanes: Dict[object, _Lane] = {}
+        for group in groups.values():
+            for result, statement in group:
+                key = self.__key(result.request)
+                lanes.setdefault(result.index if key is None else key, []).append((result, statement))
+
+        # each lane keeps the input order of its requests.
+        return [sorted(lane, key=lambda item: item[0].index) for lane in lanes.values()]
+
+    def __execute(self, lane: _Lane) -> List[Tuple[BatchResult, float]]:
+        durations = []
+        for result, statement in lane:
+            started = self.__clock()
+            try:
+                result.response = statement.execute(result.request)
+            except Exception as e:
+                try:
+                    result.response = statement.compensate(result.request, e)
+                except Exception as compensation_error:
+                    result.error = compensation_error
+            durations.append((result, self.__clock() - started))
+
+        return durations
+
+    def run(
+            self,
+            requests: Iterable[dict],
+            executor: Optional[Executor] = None,
+    ) -> Tuple[List[BatchResult], BatchStats]:
+        """
+        Selects and executes the statements of the given requests.
+
+        :param requests: Iterable[dict] The Connect Request dictionaries.
+        :param executor: Optional[Executor] The executor, a pool of max_workers threads by default.
+        :return: Tuple[List[BatchResult], BatchStats] The results in input order and the batch stats.
+        """
+        started = self.__clock()
+        results, groups = self.select(requests)
+        stats = BatchStats(requests=len(results), selection=self.__clock() - started)
+
+        lanes = self.__lanes(groups)
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix='batch') as pool:
+                executed = list(pool.map(self.__execute, lanes))
+        else:
+            executed = list(executor.map(self.__execute, lanes))
+
+        for result, duration in (item for lane in executed for item in lane):
+            statement = stats.statements.setdefault(result.statement, StatementStats())
+            statement.count += 1
+            statement.errors += 0 if result.ok else 1
+            statement.total += duration
+
+        stats.succeeded = sum(1 for result in results if result.ok)
+        stats.failed = stats.requests - stats.succeeded
+        stats.elapsed = self.__clock() - started
+        return results, stats
@@ -4,7 +4,7 @@
 # Copyright (c) 2022 Ingram Micro. All Rights Reserved.
 #
 from abc import ABC, abstractmethod
-from typing import Callable, Optional, Tuple, Union
+from typing import Awaitable, Callable, Optional, Tuple, Union
 
 from connect.eaas.core.responses import (
     CustomEventResponse,
@@ -55,6 +55,14 @@ class ProcessingTransactionStatement(ProcessingTransaction, ABC):  # pragma: no
         """
 
 
+class Idempotent:
+    """
+    Marks a transaction statement whose execute() can be safely repeated
+    (it does not post status transitions nor create resources twice), only
+    the idempotent statements are retried by the TransactionExecutorMiddleware.
+    """
+
+
 FnProcessingPredicate = Callable[[dict], bool]
 FnProcessingTransaction = Callable[[dict], ProcessingResponse]
 FnProcessingCompensation = Optional[Callable[[dict, Exception], ProcessingResponse]]
@@ -65,6 +73,52 @@ AnyProcessingTransactionStatement = Union[ProcessingTransactionStatement, FnProc
 Middleware = Callable[[dict, Optional[FnProcessingTransaction]], ProcessingResponse]
 
 
+class AsyncProcessingTransaction(ABC):
+    @abstractmethod
+    async def execute(self, request: dict) -> ProcessingResponse:
+        """
+        Async transaction main code, contains the domain logic.
+
+        :param request: dict The Connect Request dictionary.
+        :return: ProcessingResponse
+        """
+
+
+class AsyncProcessingTransactionStatement(AsyncProcessingTransaction, ABC):  # pragma: no cover
+    @abstractmethod
+    def name(self) -> str:
+        """
+        Provides the transaction name.
+
+        :return: str
+        """
+
+    @abstractmethod
+    def should_execute(self, request: dict) -> bool:
+        """
+        True if the transaction needs to be executed, false otherwise.
+
+        :param request: dict The Connect Request dictionary.
+        :return: bool
+        """
+
+    @abstractmethod
+    async def compensate(self, request: dict, e: Exception) -> ProcessingResponse:
+        """
+        Compensate the transaction execution on fail.
+
+        :param request: dict The Connect Request dictionary.
+        :param e: Exception The occurred error/exception.
+        :return: ProcessingResponse
+        """
+
+
+FnAsyncProcessingTransaction = Callable[[dict], Awaitable[ProcessingResponse]]
+
+AsyncMiddleware = Callable[[dict, Optional[FnAsyncProcessingTransaction]], Awaitable[ProcessingResponse]]
+AnyMiddleware = Union[Middleware, AsyncMiddleware]
+
+
 class ValidationTransaction(ABC):  # pragma: no cover
     @abstractmethod
     def validate(self, request: dict) -> ValidationResponse:
@@ -0,0 +1,253 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+from concurrent.futures import Executor, FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from connect.eaas.core.enums import ResultType
+from connect.eaas.core.responses import ProcessingResponse
+from connect.processors_toolkit.transactions import compile_statement
+from connect.processors_toolkit.transactions.contracts import (
+    AnyProcessingTransactionStatement,
+    ProcessingTransactionStatement,
+)
+from connect.processors_toolkit.transactions.journal import SagaJournal
+
+
+@dataclass
+class GraphResult:
+    """
+    Outcome of a transaction graph execution, the statement names are
+    listed in topological order.
+
+    On failure, the response is the compensation response of the (first)
+    failed statement. If a statement is halted (it returned a reschedule,
+    fail or skip response) the response is the one of the (first) halted
+    statement, otherwise the response of the last executed one.
+    """
+    completed: List[str] = field(default_factory=list)
+    resumed: List[str] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+    failed: Dict[str, Exception] = field(default_factory=dict)
+    halted: Dict[str, ProcessingResponse] = field(default_factory=dict)
+    compensated: List[str] = field(default_factory=list)
+    compensation_errors: Dict[str, Exception] = field(default_factory=dict)
+    responses: Dict[str, ProcessingResponse] = field(default_factory=dict)
+    compensations: Dict[str, ProcessingResponse] = field(default_factory=dict)
+    response: Optional[ProcessingResponse] = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed and not self.halted
+
+
+class TransactionGraph:
+    """
+    Executes named transaction statements along their dependencies.
+
+    The statements whose dependencies are completed (or skipped, if their
+    should_execute() is false) run concurrently in a bounded thread pool.
+    Once a statement fails no more statements are started, the in-flight
+    ones are completed and the failed and completed statements are
+    compensated in reverse topological order.
+
+    A statement returning a non successful response (reschedule, fail or
+    skip) halts the graph the same way, but it has no error to compensate:
+    nothing is compensated and its response is the graph response. The
+    completed statements are kept in the journal, so a re-delivered request
+    resumes from the halted statement.
+
+    If a journal is given, the successful statements are recorded by
+    request id, so a re-delivered request resumes from the first incomplete
+    statement (the recorded ones are completed with the recorded response).
+    The compensated statements are removed from the journal.
+    """
+
+    def __init__(self, max_workers: int = 4, journal: Optional[SagaJournal] = None):
+        self.__max_workers = max_workers
+        self.__journal = journal
+        self.__statements: Dict[str, ProcessingTransactionStatement] = {}
+        self.__dependencies: Dict[str, Tuple[str, ...]] = {}
+        self.__order: Optional[List[str]] = None
+
+    def add(self, statement: AnyProcessingTransactionStatement, after: Iterable[str] = ()) -> TransactionGraph:
+        """
+        Adds a statement executed after the given statements.
+
+        :param statement: AnyProcessingTransactionStatement The transaction statement.
+        :param after: Iterable[str] The names of the statements it depends on.
+        :return: TransactionGraph
+        """
+        statement = compile_statement(statement)
+        name = statement.name()
+        if name in self.__statements:
+            raise ValueError(f'The statement {name} is already in the transaction graph.')
+
+        self.__statements[name] = statement
+        self.__dependencies[name] = tuple(after)
+        self.__order = None
+        return self
+
+    def statement(self, name: str) -> ProcessingTransactionStatement:
+        return self.__statements[name]
+
+    def dependencies(self, name: str) -> Tuple[str, ...]:
+        return self.__dependencies[name]
+
+    def order(self) -> List[str]:
+        """
+        Provides the statement names in topological order (declaration
+        order between independent statements).
+
+        :return: List[str]
+        """
+        if self.__order is not None:
+            return self.__order
+
+        for name, dependencies in self.__dependencies.items():
+            unknown = [dependency for dependency in dependencies if dependency not in self.__statements]
+            if unknown:
+                raise ValueError(f'The statement {name} depends on unknown statements: {", ".join(unknown)}.')
+
+        order: List[str] = []
+        remaining = dict(self.__dependencies)
+        while remaining:
+            ready = [name for name, dependencies in remaining.items() if all(d not in remaining for d in dependencies)]
+            if not ready:
+                raise ValueError(f'The transaction graph has a cycle between: {", ".join(remaining)}.')
+            order.extend(ready)
+            for name in ready:
+                del remaining[name]
+
+        self.__order = order
+        return order
+
+    def execute(self, request: dict, executor: Optional[Executor] = None) -> GraphResult:
+        """
+        Executes the transaction graph for the given request.
+
+        :param request: dict The Connect Request dictionary.
+        :param executor: Optional[Executor] The executor, a pool of max_workers threads by default.
+        :return: GraphResult
+        """
+        order = self.order()
+        request_id = request.get('id') if self.__journal is not None else None
+        journaled = {} if request_id is None else self.__journal.completed(request_id)
+
+        if executor is None:
+            with ThreadPoolExecutor(max_workers=self.__max_workers, thread_name_prefix='graph') as pool:
+                result = self.__run(request, pool, journaled)
+        else:
+            result = self.__run(request, executor, journaled)
+
+        position = {name: index for index, name in enumerate(order)}
+        result.completed.sort(key=position.get)
+        result.resumed.sort(key=position.get)
+        result.skipped.sort(key=position.get)
+
+        if result.failed:
+            self.__compensate(request, result, order)
+            if request_id is not None and result.compensated:
+                self.__journal.forget(request_id, result.compensated)
+        elif result.halted:
+            result.response = result.halted[next(name for name in order if name in result.halted)]
+        else:
+            result.response = result.responses[result.completed[-1]] if result.completed else None
+
+        return result
+
+    def __step(self, name: str, request: dict) -> Tuple[bool, Optional[ProcessingResponse]]:
+        statement = self.__statements[name]
+        if not statement.should_execute(request):
+            return False, None
+
+        response = statement.execute(request)
+        if self.__journal is not None and request.get('id') is not None:
+            self.__journal.record(request['id'], name, response)
+
+        return True, response
+
+    def __run(self, request: dict, executor: Executor, journaled: Dict[str, ProcessingResponse]) -> GraphResult:
+        result = GraphResult()
+        waiting: Dict[str, Set[str]] = {name: set(dependencies) for name, dependencies in self.__dependencies.items()}
+        running: Dict[Future, str] = {}
+
+        def __submit_ready():
+            ready = [name for name in self.order() if name in waiting and not waiting[name]]
+            while ready:
+                name = ready.pop(0)
+                del waiting[name]
+                if name not in journaled:
+                    running[executor.submit(self.__step, name, request)] = name
+                    continue
+
+                # the journaled statements are completed right away, unlocking their dependents.
+                result.resumed.append(name)
+                self.__completed(name, journaled[name], result, waiting)
+                ready = [name for name in self.order() if name in waiting and not waiting[name]]
+
+        __submit_ready()
+        while running:
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                self.__collect(running.pop(future), future, result, waiting)
+
+            if result.ok:
+                __submit_ready()
+
+        return result
+
+    @staticmethod
+    def __collect(name: str, future: Future, result: GraphResult, waiting: Dict[str, Set[str]]):
+        try:
+            executed, response = future.result()
+        except Exception as e:
+            result.failed[name] = e
+            return
+
+        if not executed:
+            result.skipped.append(name)
+            TransactionGraph.__unlock(name, waiting)
+        elif response is not None and response.status != ResultType.SUCCESS:
+            result.halted[name] = response
+        else:
+            TransactionGraph.__completed(name, response, result, waiting)
+
+    @staticmethod
+    def __completed(name: str, response: ProcessingResponse, result: GraphResult, waiting: Dict[str, Set[str]]):
+        result.completed.append(name)
+        result.responses[name] = response
+        TransactionGraph.__unlock(name, waiting)
+
+    @staticmethod
+    def __unlock(name: str, waiting: Dict[str, Set[str]]):
+        for dependencies in waiting.values():
+            dependencies.discard(name)
+
+    def __compensate(self, request: dict, result: GraphResult, order: List[str]):
+        for name in reversed(order):
+            if name in result.failed:
+                error = result.failed[name]
+            elif name in result.completed:
+                error = next(iter(result.failed.values()))
+            else:
+                continue
+
+            try:
+                response = self.__statements[name].compensate(request, error)
+            except Exception as e:
+                # the statements without compensation raise the given error back.
+                if e is not error:
+                    result.compensation_errors[name] = e
+                continue
+
+            result.compensated.append(name)
+            result.compensations[name] = response
+
+        first_failed = next(name for name in order if name in result.failed)
+        result.response = result.compensations.get(first_failed)
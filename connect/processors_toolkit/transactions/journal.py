@@ -0,0 +1,118 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, Optional
+
+from connect.eaas.core.enums import ResultType
+from connect.eaas.core.responses import ProcessingResponse
+
+
+class SagaJournal(ABC):
+    @abstractmethod
+    def completed(self, request_id: str) -> Dict[str, ProcessingResponse]:
+        """
+        Provides the completed statements of the given request along with
+        their responses.
+
+        :param request_id: str The Connect Request id.
+        :return: Dict[str, ProcessingResponse]
+        """
+
+    @abstractmethod
+    def record(self, request_id: str, name: str, response: ProcessingResponse):
+        """
+        Records the given statement as completed for the given request.
+
+        :param request_id: str The Connect Request id.
+        :param name: str The statement name.
+        :param response: ProcessingResponse The statement response.
+        """
+
+    @abstractmethod
+    def forget(self, request_id: str, names: Optional[Iterable[str]] = None):
+        """
+        Removes the given statements (all by default) of the given request.
+
+        :param request_id: str The Connect Request id.
+        :param names: Optional[Iterable[str]] The statement names.
+        """
+
+
+class SQLiteSagaJournal(SagaJournal):
+    """
+    Durable saga journal on a local SQLite database, each record is
+    committed on its own so it survives a process crash. Only the
+    successful responses are recorded, the outputs must be JSON
+    serializable (the rest is stored as string).
+    """
+
+    def __init__(self, path: str = ':memory:', clock: Callable[[], float] = time.time):
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ':memory:':
+            self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute(
+            'CREATE TABLE IF NOT EXISTS saga_steps ('
+            ' request_id TEXT NOT NULL,'
+            ' statement TEXT NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' output TEXT,'
+            ' recorded_at REAL NOT NULL,'
+            ' PRIMARY KEY (request_id, statement))',
+        )
+
+    def completed(self, request_id: str) -> Dict[str, ProcessingResponse]:
+        with self.__lock:
+            rows = self.__connection.execute(
+                'SELECT statement, status, output FROM saga_steps WHERE request_id = ? ORDER BY recorded_at',
+                (request_id,),
+            ).fetchall()
+
+        return {name: ProcessingResponse(status, output=json.loads(output)) for name, status, output in rows}
+
+    def record(self, request_id: str, name: str, response: ProcessingResponse):
+        if response is None or response.status != ResultType.SUCCESS:
+            return
+
+        with self.__lock:
+            self.__connection.execute(
+                'INSERT OR REPLACE INTO saga_steps VALUES (?, ?, ?, ?, ?)',
+                (request_id, name, response.status, json.dumps(response.output, default=str), self.__clock()),
+            )
+
+    def forget(self, request_id: str, names: Optional[Iterable[str]] = None):
+        with self.__lock:
+            if names is None:
+                self.__connection.execute('DELETE FROM saga_steps WHERE request_id = ?', (request_id,))
+            else:
+                self.__connection.executemany(
+                    'DELETE FROM saga_steps WHERE request_id = ? AND statement = ?',
+                    [(request_id, name) for name in names],
+                )
+
+    def prune(self, older_than: float) -> int:
+        """
+        Removes the records older than the given amount of seconds.
+
+        :param older_than: float The max age in seconds.
+        :return: int The amount of removed records.
+        """
+        with self.__lock:
+            return self.__connection.execute(
+                'DELETE FROM saga_steps WHERE recorded_at < ?',
+                (self.__clock() - older_than,),
+            ).rowcount
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
@@ -0,0 +1,185 @@
+#
+# This file is part of the Ingram Micro CloudBlue Connect Processors Toolkit.
+#
+# Copyright (c) 2022 Ingram Micro. All Rights Reserved.
+#
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from connect.eaas.core.responses import ProcessingResponse
+from connect.processors_toolkit.metrics import MetricsRegistry
+from connect.processors_toolkit.transactions import TransactionSelector
+from connect.processors_toolkit.transactions.contracts import FnProcessingTransaction, Middleware
+
+STAGE_SELECT = 'select'
+
+
+@dataclass
+class StageStats:
+    """
+    Call statistics of a pipeline stage, the durations (in seconds) only
+    include the time spent in the stage itself, not in the next stages.
+    """
+    calls: int = 0
+    errors: int = 0
+    total: float = 0.0
+
+    def mean(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+def _stage_name(middleware: Any) -> str:
+    name = getattr(middleware, '__name__', None)
+    return f'middleware.{name or middleware.__class__.__name__}'
+
+
+class _Recorder:
+    def __init__(self, name: str, registry: Optional[MetricsRegistry]):
+        self.__name = name
+        self.__stats: Dict[str, StageStats] = {}
+        self.__lock = threading.Lock()
+        self.__families = None
+        if registry is not None:
+            self.__families = (
+                registry.counter(
+                    'connect_pipeline_stage_calls_total',
+                    'Pipeline stage calls by pipeline and stage.',
+                    ['pipeline', 'stage'],
+                ),
+                registry.counter(
+                    'connect_pipeline_stage_errors_total',
+                    'Pipeline stage exceptions by pipeline, stage and error.',
+                    ['pipeline', 'stage', 'error'],
+                ),
+                registry.histogram(
+                    'connect_pipeline_stage_duration_seconds',
+                    'Pipeline stage latency, excluding the next stages.',
+                    ['pipeline', 'stage'],
+                ),
+            )
+
+    def record(self, stage: str, duration: float, error: Optional[BaseException]):
+        with self.__lock:
+            stats = self.__stats.setdefault(stage, StageStats())
+            stats.calls += 1
+            stats.total += duration
+            stats.errors += 0 if error is None else 1
+
+        if self.__families is not None:
+            calls, errors, durations = self.__families
+            calls.labels(self.__name, stage).inc()
+            durations.labels(self.__name, stage).observe(duration)
+            if error is not None:
+                errors.labels(self.__name, stage, error.__class__.__name__).inc()
+
+    def stats(self) -> Dict[str, StageStats]:
+        with self.__lock:
+            return {stage: StageStats(stats.calls, stats.errors, stats.total) for stage, stats in self.__stats.items()}
+
+
+class _Stage:
+    def __init__(
+            self,
+            name: str,
+            middleware: Middleware,
+            nxt: Optional[FnProcessingTransaction],
+            recorder: _Recorder,
+            clock: Callable[[], float],
+    ):
+        self.name = name
+        self.__middleware = middleware
+        self.__next = nxt
+        self.__recorder = recorder
+        self.__clock = clock
+
+    def __call__(self, request: dict) -> ProcessingResponse:
+        downstream = [0.0]
+
+        def __next(next_request: dict) -> ProcessingResponse:
+            started = self.__clock()
+            try:
+                return self.__next(next_request)
+            finally:
+                downstream[0] += self.__clock() - started
+
+        started = self.__clock()
+        error = None
+        try:
+            return self.__middleware(request, None if self.__next is None else __next)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.__recorder.record(self.name, self.__clock() - started - downstream[0], error)
+
+
+class Pipeline:
+    """
+    Reusable middleware pipeline, built once and called on each request.
+
+    If a selector is given, the pipeline ends selecting and executing the
+    transaction statement of the request (compensating it on failure) and
+    each statement is recorded as a "statement.<name>" stage. The call
+    counts, the exceptions and the latency of each stage (excluding the
+    next stages) are kept in stats() and recorded in the optional registry.
+    """
+
+    def __init__(
+            self,
+            middlewares: List[Middleware],
+            selector: Optional[TransactionSelector] = None,
+            registry: Optional[MetricsRegistry] = None,
+            name: str = 'pipeline',
+            clock: Callable[[], float] = time.perf_counter,
+    ):
+        if not middlewares and selector is None:
+            raise ValueError('The pipeline requires at least one middleware or a transaction selector.')
+
+        self.__selector = selector
+        self.__recorder = _Recorder(name, registry)
+        self.__clock = clock
+
+        names: Dict[str, int] = {}
+        callstack = None if selector is None else self.__execute
+        for middleware in reversed(middlewares):
+            stage_name = _stage_name(middleware)
+            names[stage_name] = names.get(stage_name, 0) + 1
+            unique = stage_name if names[stage_name] == 1 else f'{stage_name}#{names[stage_name]}'
+            callstack = _Stage(unique, middleware, callstack, self.__recorder, clock)
+
+        self.__callstack: FnProcessingTransaction = callstack
+
+    def __execute(self, request: dict) -> ProcessingResponse:
+        started = self.__clock()
+        try:
+            statement = self.__selector.select(request)
+        except Exception as e:
+            self.__recorder.record(STAGE_SELECT, self.__clock() - started, e)
+            raise
+        self.__recorder.record(STAGE_SELECT, self.__clock() - started, None)
+
+        stage = f'statement.{statement.name()}'
+        started = self.__clock()
+        error = None
+        try:
+            return statement.execute(request)
+        except Exception as e:
+            error = e
+            return statement.compensate(request, e)
+        finally:
+            self.__recorder.record(stage, self.__clock() - started, error)
+
+    def __call__(self, request: dict) -> ProcessingResponse:
+        return self.__callstack(request)
+
+    def stats(self) -> Dict[str, StageStats]:
+        """
+        Provides the statistics of each stage by stage name.
+
+        :return: Dict[str, StageStats]
+        """
+        return self.__recorder.stats()
@@ -0,0 +1,23 @@
+from connect.eaas.extension import CustomEventResponse
+from connect.processors_toolkit.transactions.contracts import CustomEventTransaction
+
+
+def provide_salutation(self, my_app_name):
+    return f'Hello from {my_app_name}'
+
+
+class Greeter:
+    def __init__(self, salutation, logger):
+        self.salutation = salutation
+        self.logger = logger
+
+    def greet(self) -> str:
+        return self.salutation
+
+
+class Greet(CustomEventTransaction):
+    def __init__(self, greeter):
+        self.greeter = greeter
+
+    def handle(self, request: dict) -> CustomEventResponse:
+        return CustomEventResponse.done(http_status=200, body=self.greeter.greet())
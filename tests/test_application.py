@@ -1,4 +1,8 @@
+import asyncio
+import threading
+
 import pytest
+import pinject
 from connect.eaas.extension import ProcessingResponse
 from connect.processors_toolkit.application import Application, Dependencies, DependencyBuildingFailure
 from connect.processors_toolkit.transactions.contracts import ProcessingTransaction
@@ -77,3 +81,227 @@ def test_application_should_raise_exception_on_building_dependencies(sync_client
 
     with pytest.raises(DependencyBuildingFailure):
         extension.container.get(SampleFlowWithService)
+
+
+def test_application_should_reuse_the_object_graph_across_requests(sync_client_factory, logger, mocker):
+    declared = []
+
+    class MyCachedExtension(Application):
+        def dependencies(self) -> Dependencies:
+            declared.append(self)
+            return Dependencies().to_class('api_client', SomeAPIClient)
+
+    class SomeAPIClient:
+        def __init__(self, api_key):
+            self.api_key = api_key
+
+    class SampleFlowWithRequest(ProcessingTransaction):
+        def __init__(self, request, api_client, client):
+            self.request = request
+            self.api_client = api_client
+            self.client = client
+
+        def execute(self, request: RequestBuilder) -> ProcessingResponse:
+            return ProcessingResponse.done()
+
+    new_object_graph = mocker.spy(pinject, 'new_object_graph')
+    config = {'API_KEY': 'my-secret-api-key'}
+
+    first_client = sync_client_factory([])
+    first = MyCachedExtension(first_client, logger, config).with_request({'id': 'PR-0001'})
+    first_flow = first.container.get(SampleFlowWithRequest)
+
+    second_client = sync_client_factory([])
+    second = MyCachedExtension(second_client, logger, config).with_request({'id': 'PR-0002'})
+    second_flow = second.container.get(SampleFlowWithRequest)
+
+    assert new_object_graph.call_count == 1
+    # the dependencies are only declared to build the shared container.
+    assert declared == [first]
+    assert first_flow.request.id() == 'PR-0001'
+    assert second_flow.request.id() == 'PR-0002'
+    assert first_flow.client is first_client
+    assert second_flow.client is second_client
+    assert first_flow.api_client is not second_flow.api_client
+    assert first_flow.api_client is first.container.get(SampleFlowWithRequest).api_client
+
+    first.with_request({'id': 'PR-0003'})
+
+    assert first.container.get(SampleFlowWithRequest).request.id() == 'PR-0003'
+    assert new_object_graph.call_count == 1
+
+
+def test_application_should_raise_exception_on_missing_per_request_value(sync_client_factory, logger):
+    class MyExtension(Application):
+        pass
+
+    class SampleFlowWithRequest(ProcessingTransaction):
+        def __init__(self, request):
+            self.request = request
+
+        def execute(self, request: RequestBuilder) -> ProcessingResponse:
+            return ProcessingResponse.done()
+
+    extension = MyExtension(sync_client_factory([]), logger, {})
+
+    with pytest.raises(DependencyBuildingFailure):
+        extension.container.get(SampleFlowWithRequest)
+
+
+def test_application_should_compile_injection_plans_once(sync_client_factory, logger, mocker):
+    class MyExtension(Application):
+        pass
+
+    class SampleFlow(ProcessingTransaction):
+        def __init__(self, logger, config):
+            self.logger = logger
+            self.config = config
+
+        def execute(self, request: RequestBuilder) -> ProcessingResponse:
+            return ProcessingResponse.done()
+
+    class SampleFlowWithService(ProcessingTransaction):
+        def __init__(self, non_registered_dependency):
+            self.non_registered_dependency = non_registered_dependency
+
+        def execute(self, request: RequestBuilder) -> ProcessingResponse:
+            return ProcessingResponse.done()
+
+    provide = mocker.spy(pinject.object_graph.ObjectGraph, 'provide')
+
+    extension = MyExtension(sync_client_factory([]), logger, {})
+    extension.container.compile([SampleFlow])
+
+    for request_id in ['PR-0001', 'PR-0002']:
+        flow = extension.with_request({'id': request_id}).container.get(SampleFlow)
+        assert flow.logger is logger
+
+    assert provide.call_count == 0
+
+    with pytest.raises(DependencyBuildingFailure):
+        extension.container.compile([SampleFlowWithService])
+
+
+def test_application_should_build_dependencies_with_the_declared_lifetimes(sync_client_factory, logger):
+    def provide_session(self):
+        return object()
+
+    class MyExtensionWithLifetimes(Application):
+        def dependencies(self) -> Dependencies:
+            return Dependencies() \
+                .to_singleton('session', provide_session) \
+                .request_scoped('api_client', SomeAPIClient) \
+                .transient('parser', SomeParser)
+
+    class SomeAPIClient:
+        def __init__(self, session):
+            self.session = session
+
+    class SomeParser:
+        pass
+
+    class SampleFlow(ProcessingTransaction):
+        def __init__(self, api_client, parser, session):
+            self.api_client = api_client
+            self.parser = parser
+            self.session = session
+
+        def execute(self, request: RequestBuilder) -> ProcessingResponse:
+            return ProcessingResponse.done()
+
+    class SampleFlowWithParsers(ProcessingTransaction):
+        def __init__(self, api_client, parser):
+            self.api_client = api_client
+            self.parser = parser
+
+        def execute(self, request: RequestBuilder) -> ProcessingResponse:
+            return ProcessingResponse.done()
+
+    first = MyExtensionWithLifetimes(sync_client_factory([]), logger, {})
+    second = MyExtensionWithLifetimes(sync_client_factory([]), logger, {})
+
+    flow = first.container.get(SampleFlow)
+    same_request_flow = first.container.get(SampleFlowWithParsers)
+    other_request_flow = second.container.get(SampleFlow)
+
+    assert flow.session is other_request_flow.session
+    assert flow.api_client.session is flow.session
+    assert flow.api_client is same_request_flow.api_client
+    assert flow.api_client is not other_request_flow.api_client
+    assert flow.parser is not same_request_flow.parser
+
+
+def test_application_should_raise_exception_on_singleton_depending_on_request_values(sync_client_factory, logger):
+    class MyExtensionWithLifetimes(Application):
+        def dependencies(self) -> Dependencies:
+            return Dependencies().to_singleton('api_client', SomeAPIClient)
+
+    class SomeAPIClient:
+        def __init__(self, client):
+            self.client = client
+
+    class SampleFlow(ProcessingTransaction):
+        def __init__(self, api_client):
+            self.api_client = api_client
+
+        def execute(self, request: RequestBuilder) -> ProcessingResponse:
+            return ProcessingResponse.done()
+
+    extension = MyExtensionWithLifetimes(sync_client_factory([]), logger, {})
+
+    with pytest.raises(DependencyBuildingFailure):
+        extension.container.get(SampleFlow)
+
+
+def test_application_should_isolate_requests_of_concurrent_threads_and_tasks(sync_client_factory, logger):
+    class MyExtension(Application):
+        pass
+
+    class SampleFlowWithRequest(ProcessingTransaction):
+        def __init__(self, request):
+            self.request = request
+
+        def execute(self, request: RequestBuilder) -> ProcessingResponse:
+            return ProcessingResponse.done()
+
+    extension = MyExtension(sync_client_factory([]), logger, {})
+    barrier = threading.Barrier(4)
+    resolved = {}
+
+    def handle(request_id: str):
+        extension.with_request({'id': request_id})
+        barrier.wait()
+        resolved[request_id] = extension.container.get(SampleFlowWithRequest).request.id()
+
+    threads = [threading.Thread(target=handle, args=(f'PR-000{i}',)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert resolved == {f'PR-000{i}': f'PR-000{i}' for i in range(4)}
+
+    async def handle_async(request_id: str) -> str:
+        with extension.request_scope({'id': request_id}):
+            await asyncio.sleep(0)
+            return extension.container.get(SampleFlowWithRequest).request.id()
+
+    async def handle_all():
+        return await asyncio.gather(*[handle_async(f'PR-100{i}') for i in range(4)])
+
+    assert asyncio.run(handle_all()) == [f'PR-100{i}' for i in range(4)]
+
+
+def test_application_should_fall_back_to_pinject_without_generated_factories(sync_client_factory, logger):
+    class MyExtensionWithoutFactories(Application):
+        def factories(self):
+            return 'tests.dummy_extension.not_generated_factories'
+
+    class SampleFlow:
+        def __init__(self, logger):
+            self.logger = logger
+
+    extension = MyExtensionWithoutFactories(sync_client_factory([]), logger, {})
+
+    assert not extension.container.generated
+    assert extension.container.get(SampleFlow).logger is logger
@@ -2,8 +2,13 @@ from typing import Dict
 
 import pytest
 
-from connect.processors_toolkit.configuration.exceptions import MissingConfigurationParameterError
+from connect.processors_toolkit.application import Application
+from connect.processors_toolkit.configuration.exceptions import (
+    InvalidConfigurationError,
+    MissingConfigurationParameterError,
+)
 from connect.processors_toolkit.configuration.mixins import WithConfigurationHelper
+from connect.processors_toolkit.configuration.schema import ConfigurationSchema
 
 
 class Helper(WithConfigurationHelper):
@@ -20,3 +25,79 @@ def test_configuration_helper_should_retrieve_the_request_configuration():
 def test_configuration_helper_should_raise_exception_on_missing_configuration():
     with pytest.raises(MissingConfigurationParameterError):
         Helper({}).configuration('CFG_KEY_001')
+
+
+def test_configuration_schema_should_parse_typed_values():
+    configuration = ConfigurationSchema() \
+        .string('API_KEY') \
+        .integer('PAGE_SIZE') \
+        .number('RATIO', default=0.5) \
+        .boolean('DRY_RUN') \
+        .list('ALLOWED_PRODUCTS') \
+        .json('MAPPING', default={}) \
+        .duration('TOKEN_TTL') \
+        .parse({
+            'API_KEY': ' secret ',
+            'PAGE_SIZE': '100',
+            'DRY_RUN': 'yes',
+            'ALLOWED_PRODUCTS': '["PRD-000-000-001"]',
+            'TOKEN_TTL': '5m',
+            'OTHER': ' raw ',
+        })
+
+    assert configuration['API_KEY'] == 'secret'
+    assert configuration['PAGE_SIZE'] == 100
+    assert configuration['RATIO'] == 0.5
+    assert configuration['DRY_RUN'] is True
+    assert configuration['ALLOWED_PRODUCTS'] == ['PRD-000-000-001']
+    assert configuration['MAPPING'] == {}
+    assert configuration['TOKEN_TTL'] == 300.0
+    assert configuration['OTHER'] == ' raw '
+    assert configuration.is_typed('PAGE_SIZE')
+    assert not configuration.is_typed('OTHER')
+    assert Helper(configuration).configuration('PAGE_SIZE') == 100
+
+
+def test_configuration_schema_should_report_every_invalid_parameter_together():
+    schema = ConfigurationSchema() \
+        .string('API_KEY') \
+        .string('API_URL') \
+        .integer('PAGE_SIZE') \
+        .duration('TOKEN_TTL', default=300.0)
+
+    with pytest.raises(InvalidConfigurationError) as e:
+        schema.parse({'PAGE_SIZE': 'many', 'TOKEN_TTL': 'soon'})
+
+    assert isinstance(e.value, MissingConfigurationParameterError)
+    assert list(e.value.errors) == ['API_KEY', 'API_URL', 'PAGE_SIZE', 'TOKEN_TTL']
+    assert e.value.missing == ['API_KEY', 'API_URL']
+    assert e.value.parameter == 'API_KEY, API_URL, PAGE_SIZE, TOKEN_TTL'
+
+
+def test_application_should_bind_the_parsed_configuration_once(sync_client_factory, logger, mocker):
+    class SampleFlow(WithConfigurationHelper):
+        def __init__(self, config, page_size, dry_run):
+            self.config = config
+            self.page_size = page_size
+            self.dry_run = dry_run
+
+    class MyTypedExtension(Application):
+        def configuration_schema(self) -> ConfigurationSchema:
+            return ConfigurationSchema() \
+                .integer('PAGE_SIZE') \
+                .boolean('DRY_RUN', default=False)
+
+    parse = mocker.spy(ConfigurationSchema, 'parse')
+    config = {'PAGE_SIZE': '50', 'API_KEY': ' secret '}
+
+    MyTypedExtension(sync_client_factory([]), logger, config)
+    flow = MyTypedExtension(sync_client_factory([]), logger, config).container.get(SampleFlow)
+
+    assert parse.call_count == 1
+    assert flow.page_size == 50
+    assert flow.dry_run is False
+    assert flow.configuration('PAGE_SIZE') == 50
+    assert flow.configuration('API_KEY') == ' secret '
+
+    with pytest.raises(InvalidConfigurationError):
+        MyTypedExtension(sync_client_factory([]), logger, {})
@@ -0,0 +1,310 @@
+import threading
+import time
+from types import ModuleType
+
+import pinject
+import pytest
+from pinject import binding_keys
+
+from tests.dummy_extension.actions import SSO
+from tests.dummy_extension.services import Greet, Greeter, provide_salutation
+
+from connect.processors_toolkit.dependency_injection.codegen import generate_factories
+from connect.processors_toolkit.dependency_injection.container import (
+    Container,
+    Dependencies,
+    DependencyBuildingFailure,
+)
+from connect.processors_toolkit.dependency_injection.lazy import LazyProxy
+from connect.processors_toolkit.dependency_injection.profiling import BindingStats, ResolutionProfiler
+from connect.processors_toolkit.dependency_injection.scopes import Lifetime, MemoizedScope
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_memoized_scope_should_refresh_instances_after_ttl():
+    clock = FakeClock()
+    scope = MemoizedScope(clock=clock).memoize('token', 10)
+
+    builds = []
+
+    def build():
+        builds.append(clock.now)
+        return f'token-{len(builds)}'
+
+    key = binding_keys.new('token')
+
+    assert scope.provide(key, build) == 'token-1'
+    clock.now = 9.9
+    assert scope.provide(key, build) == 'token-1'
+    clock.now = 10.0
+    assert scope.provide(key, build) == 'token-2'
+    assert builds == [0.0, 10.0]
+
+
+def test_memoized_scope_should_evict_least_recently_used_instances():
+    scope = MemoizedScope(maxsize=2).memoize('a', 60).memoize('b', 60).memoize('c', 60)
+    keys = {name: binding_keys.new(name) for name in ['a', 'b', 'c']}
+
+    scope.provide(keys['a'], lambda: 'a-1')
+    scope.provide(keys['b'], lambda: 'b-1')
+    scope.provide(keys['a'], lambda: 'a-2')
+    scope.provide(keys['c'], lambda: 'c-1')
+
+    assert scope.provide(keys['a'], lambda: 'a-3') == 'a-1'
+    assert scope.provide(keys['b'], lambda: 'b-2') == 'b-2'
+
+
+def test_memoized_scope_should_refresh_only_once_on_concurrent_access():
+    scope = MemoizedScope().memoize('token', 60)
+    key = binding_keys.new('token')
+    builds = []
+
+    def build():
+        builds.append(1)
+        time.sleep(0.05)
+        return 'token'
+
+    threads = [threading.Thread(target=lambda: scope.provide(key, build)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+
+
+def test_container_should_memoize_providers_across_request_scoped_containers():
+    calls = []
+
+    def provide_access_token(self, api_key):
+        calls.append(api_key)
+        return f'token-for-{api_key}'
+
+    class SomeAPIClient:
+        def __init__(self, access_token):
+            self.access_token = access_token
+
+    container = Container(
+        Dependencies()
+            .to_instance('api_key', 'secret')
+            .memoized('access_token', provide_access_token, ttl=300),
+    )
+
+    first = container.child().get(SomeAPIClient)
+    second = container.child().get(SomeAPIClient)
+
+    assert first is not second
+    assert first.access_token == second.access_token == 'token-for-secret'
+    assert calls == ['secret']
+
+
+def test_container_should_record_the_resolution_costs_in_the_profiler():
+    class SomeAPIClient:
+        def __init__(self, api_key):
+            self.api_key = api_key
+
+    class SampleFlow:
+        def __init__(self, api_client, logger):
+            self.api_client = api_client
+            self.logger = logger
+
+    profiler = ResolutionProfiler()
+    container = Container(
+        Dependencies()
+            .to_instance('api_key', 'secret')
+            .to_class('api_client', SomeAPIClient)
+            .per_request('logger'),
+        profiler=profiler,
+    )
+
+    for _ in range(3):
+        container.child({'logger': 'logger'}).get(SampleFlow)
+
+    stats = profiler.stats()
+
+    assert container.profiler is profiler
+    assert stats['SampleFlow'].count == 3
+    assert stats['api_client'].count == 3
+    assert stats['api_key'].count == 1
+    assert 'logger' not in stats
+    assert profiler.dependencies('SampleFlow') == ['api_client']
+    assert profiler.dependencies('api_client') == ['api_key']
+
+    report = profiler.report().splitlines()
+
+    assert report[1].startswith('SampleFlow')
+    assert report[2].startswith('  api_client')
+    assert report[3].startswith('    api_key')
+
+
+def test_binding_stats_should_compute_percentiles_over_the_last_samples():
+    stats = BindingStats('api_client', samples=100)
+    for duration in range(1, 201):
+        stats.record(float(duration))
+
+    assert stats.count == 200
+    assert stats.mean() == 100.5
+    assert stats.p99() == 199.0
+    assert stats.percentile(50) == 150.0
+
+
+def test_container_should_build_lazy_dependencies_on_first_access():
+    builds = []
+
+    class ExpensiveClient:
+        def __init__(self, api_key, request):
+            builds.append(request)
+            self.api_key = api_key
+            self.request = request
+
+        def fetch(self) -> str:
+            return f'{self.api_key}:{self.request}'
+
+    def provide_report(self, api_key):
+        builds.append('report')
+        return {'key': api_key}
+
+    class SampleFlow:
+        def __init__(self, client, report):
+            self.client = client
+            self.report = report
+
+    container = Container(
+        Dependencies()
+            .to_instance('api_key', 'secret')
+            .per_request('request')
+            .lazy('client', ExpensiveClient)
+            .lazy('report', provide_report),
+    )
+
+    flow = container.child({'request': 'PR-0001'}).get(SampleFlow)
+
+    assert builds == []
+    assert type(flow.client) is LazyProxy
+    assert not flow.client.lazy_proxy_is_built()
+
+    # the proxy resolves in the context of the container that injected it.
+    container.child({'request': 'PR-0002'}).get(SampleFlow)
+    assert flow.client.fetch() == 'secret:PR-0001'
+    assert isinstance(flow.client, ExpensiveClient)
+    assert flow.report['key'] == 'secret'
+    assert builds == ['PR-0001', 'report']
+
+
+def test_container_should_check_the_lifetimes_of_lazy_dependencies():
+    class Report:
+        def __init__(self, request):
+            self.request = request
+
+    class SampleFlow:
+        def __init__(self, report):
+            self.report = report
+
+    container = Container(
+        Dependencies()
+            .per_request('request')
+            .lazy('report', Report, Lifetime.SINGLETON),
+    )
+
+    first = container.child({'request': 'PR-0001'}).get(SampleFlow)
+    second = container.child({'request': 'PR-0002'}).get(SampleFlow)
+
+    assert first.report is second.report
+    with pytest.raises(DependencyBuildingFailure):
+        second.report.request
+
+
+def test_lazy_proxy_should_build_once_across_threads():
+    builds = []
+
+    def build():
+        time.sleep(0.01)
+        builds.append(1)
+        return [1, 2, 3]
+
+    proxy = LazyProxy(build)
+    threads = [threading.Thread(target=lambda: len(proxy)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert builds == [1]
+    assert proxy == [1, 2, 3]
+    assert 2 in proxy
+    assert list(proxy) == [1, 2, 3]
+
+
+def _load_factories(source: str) -> ModuleType:
+    module = ModuleType('factories')
+    exec(compile(source, 'factories.py', 'exec'), module.__dict__)
+    return module
+
+
+def _greeting_dependencies() -> Dependencies:
+    return Dependencies() \
+        .to_instance('my_app_name', 'cool-app-name') \
+        .per_request('logger') \
+        .provider('salutation', provide_salutation) \
+        .to_class('greeter', Greeter)
+
+
+def test_container_should_build_classes_with_the_generated_factories(mocker):
+    factories = _load_factories(generate_factories(_greeting_dependencies(), [Greet, SSO]))
+    new_object_graph = mocker.spy(pinject, 'new_object_graph')
+
+    container = Container(_greeting_dependencies(), factories=factories)
+    first = container.child({'logger': 'first-logger'}).get(Greet)
+    second = container.child({'logger': 'second-logger'}).get(Greet)
+
+    assert container.generated
+    assert new_object_graph.call_count == 0
+    assert first.greeter.greet() == 'Hello from cool-app-name'
+    assert first.greeter.logger == 'first-logger'
+    assert second.greeter.logger == 'second-logger'
+    assert container.child({'logger': 'logger'}).get(SSO).logger == 'logger'
+
+    with pytest.raises(DependencyBuildingFailure):
+        container.get(Greet)
+
+
+def test_container_should_fall_back_to_pinject_for_other_dependencies(mocker):
+    factories = _load_factories(generate_factories(_greeting_dependencies(), [Greet]))
+    new_object_graph = mocker.spy(pinject, 'new_object_graph')
+
+    dependencies = _greeting_dependencies().provider('salutation', lambda self: 'Hi!')
+    container = Container(dependencies, factories=factories)
+
+    assert not container.generated
+    assert container.child({'logger': 'logger'}).get(Greet).greeter.greet() == 'Hi!'
+    assert new_object_graph.call_count == 1
+
+
+def test_container_should_check_the_lifetimes_of_the_generated_factories():
+    dependencies = _greeting_dependencies().to_singleton('greeter', Greeter)
+    factories = _load_factories(generate_factories(dependencies, [Greet]))
+
+    container = Container(dependencies, factories=factories)
+
+    with pytest.raises(DependencyBuildingFailure):
+        container.child({'logger': 'logger'}).get(Greet)
+
+
+def test_factory_generator_should_skip_not_importable_classes():
+    class LocalFlow:
+        def __init__(self, greeter):
+            self.greeter = greeter
+
+    source = generate_factories(_greeting_dependencies().to_class('local', LocalFlow), [Greet, LocalFlow])
+    factories = _load_factories(source)
+
+    assert 'LocalFlow' not in source
+    assert list(factories.CLASSES) == [Greet]
+    assert sorted(factories.BINDINGS) == ['greeter', 'salutation']
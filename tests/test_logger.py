@@ -2,7 +2,7 @@ from logging import LoggerAdapter
 from typing import Callable
 from unittest.mock import Mock
 
-from connect.processors_toolkit.logger import ExtensionLoggerAdapter, mask
+from connect.processors_toolkit.logger import ExtensionLoggerAdapter, LazyRepr, mask
 from connect.processors_toolkit.logger.mixins import WithBoundedLogger
 from connect.processors_toolkit.requests import RequestBuilder
 
@@ -91,3 +91,19 @@ def test_mask_function_should_mask_the_required_values():
     }
 
     assert mask(payload, ['key', 'password']) == expected
+
+
+def test_lazy_repr_should_render_the_truncated_value_on_demand():
+    class CountingRepr:
+        renders = 0
+
+        def __repr__(self):
+            CountingRepr.renders += 1
+            return 'x' * 20
+
+    value = LazyRepr(CountingRepr(), limit=8)
+
+    assert CountingRepr.renders == 0
+    assert str(value) == 'xxxxxxxx...(12 more chars)'
+    assert f'{LazyRepr([1, 2])}' == '[1, 2]'
+    assert CountingRepr.renders == 1
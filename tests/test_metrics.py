@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from connect.processors_toolkit.metrics import MetricsRegistry
+
+
+def test_metrics_registry_should_export_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter('events_total', 'Processed events.', ['route']).labels('product.action.sso').inc(2)
+    registry.gauge('queue_depth', 'Queued "events".').labels().set(3)
+    latency = registry.histogram('latency_seconds', 'Latency.', ['route'], buckets=[0.1, 1.0])
+    latency.labels('a"b').observe(0.05)
+    latency.labels('a"b').observe(0.5)
+
+    assert registry.prometheus().splitlines() == [
+        '# HELP events_total Processed events.',
+        '# TYPE events_total counter',
+        'events_total{route="product.action.sso"} 2',
+        '# HELP queue_depth Queued "events".',
+        '# TYPE queue_depth gauge',
+        'queue_depth 3',
+        '# HELP latency_seconds Latency.',
+        '# TYPE latency_seconds histogram',
+        'latency_seconds_bucket{route="a\\"b",le="0.1"} 1',
+        'latency_seconds_bucket{route="a\\"b",le="1.0"} 2',
+        'latency_seconds_bucket{route="a\\"b",le="+Inf"} 2',
+        'latency_seconds_sum{route="a\\"b"} 0.55',
+        'latency_seconds_count{route="a\\"b"} 2',
+    ]
+
+
+def test_metrics_registry_should_provide_a_json_snapshot():
+    registry = MetricsRegistry()
+    registry.counter('events_total', 'Processed events.', ['route']).labels('sso').inc()
+
+    snapshot = json.loads(json.dumps(registry.snapshot()))
+
+    assert snapshot == {
+        'events_total': {
+            'type': 'counter',
+            'help': 'Processed events.',
+            'samples': [{'labels': {'route': 'sso'}, 'value': 1.0}],
+        },
+    }
+
+
+def test_metrics_registry_should_validate_the_metric_kind_and_labels():
+    registry = MetricsRegistry()
+    events = registry.counter('events_total', 'Processed events.', ['route'])
+
+    assert registry.counter('events_total', 'Processed events.', ['route']) is events
+
+    with pytest.raises(ValueError):
+        registry.gauge('events_total', 'Processed events.')
+
+    with pytest.raises(ValueError):
+        events.labels('sso', 'extra')
@@ -228,8 +228,8 @@ def test_default_on_match_transaction_should_approve_given_request_successfully(
 
     activation_tpl = 'TL-662-440-096'
 
-    def __logger_info(message: str):
-        assert message == f"The subscription {subscription_id} is in offline mode."
+    def __logger_info(message: str, *args):
+        assert message % args == f"The subscription {subscription_id} is in offline mode."
 
     logger = Mock()
     logger.info = __logger_info
@@ -0,0 +1,175 @@
+import pytest
+from connect.client import ClientError
+from connect.eaas.core.responses import ProcessingResponse
+
+from connect.processors_toolkit.api.mixins import WithAssetHelper
+from connect.processors_toolkit.requests import RequestBuilder
+from connect.processors_toolkit.retry import RetryBudget, RetryMiddleware, RetryPolicy
+from connect.processors_toolkit.transactions import (
+    compile_statement,
+    is_idempotent,
+    keyed,
+    make_middleware_callstack,
+    TransactionExecutorMiddleware,
+)
+from connect.processors_toolkit.transactions.contracts import Idempotent, ProcessingTransactionStatement
+
+
+class Flaky:
+    def __init__(self, *errors: Exception):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return ProcessingResponse.done()
+
+
+def _policy(budget: RetryBudget = None, **kwargs) -> RetryPolicy:
+    return RetryPolicy(budget=budget or RetryBudget(), sleep=lambda _: None, jitter=lambda: 1.0, **kwargs)
+
+
+def test_retry_policy_should_retry_the_transient_errors_with_exponential_backoff():
+    delays = []
+    policy = RetryPolicy(
+        max_attempts=4,
+        base_delay=0.5,
+        max_delay=1.5,
+        budget=RetryBudget(),
+        sleep=delays.append,
+        jitter=lambda: 1.0,
+    )
+    flaky = Flaky(ClientError(status_code=429), ClientError(status_code=502), ClientError(status_code=503))
+
+    assert policy.call(flaky).status == 'success'
+    assert flaky.calls == 4
+    assert delays == [0.5, 1.0, 1.5]
+
+
+def test_retry_policy_should_not_retry_the_permanent_errors_nor_over_max_attempts():
+    permanent = Flaky(ClientError(status_code=400))
+    with pytest.raises(ClientError):
+        _policy().call(permanent)
+
+    exhausted = Flaky(*[ClientError(status_code=503)] * 3)
+    with pytest.raises(ClientError):
+        _policy(max_attempts=3).call(exhausted)
+
+    assert (permanent.calls, exhausted.calls) == (1, 3)
+
+
+def test_retry_budget_should_bound_the_retries_to_a_ratio_of_the_calls():
+    now = [0.0]
+    budget = RetryBudget(ratio=0.5, min_per_second=0.0, max_tokens=2, clock=lambda: now[0])
+    policy = _policy(budget, max_attempts=2)
+
+    for _ in range(4):
+        with pytest.raises(ClientError):
+            policy.call(Flaky(*[ClientError(status_code=503)] * 2))
+
+    stats = budget.stats()
+    # 2 initial tokens plus 0.5 per call.
+    assert (stats.requests, stats.retries, stats.denied) == (4, 3, 1)
+
+
+def test_transaction_executor_should_retry_the_idempotent_statements_before_compensating():
+    class Statement(Idempotent):
+        def __init__(self, execute):
+            self.execute = execute
+
+        def compensate(self, request: dict, e: Exception) -> ProcessingResponse:
+            return ProcessingResponse.fail(output=str(e))
+
+    recovering = Flaky(ClientError(status_code=503))
+    failing = Flaky(*[ClientError('unavailable', status_code=503)] * 3)
+
+    assert TransactionExecutorMiddleware(Statement(recovering), _policy())({}).status == 'success'
+    assert TransactionExecutorMiddleware(Statement(failing), _policy())({}).status == 'fail'
+    assert (recovering.calls, failing.calls) == (2, 3)
+
+
+def test_transaction_executor_should_only_accept_a_retry_policy_for_idempotent_statements():
+    class Lookup(ProcessingTransactionStatement, Idempotent):
+        def name(self) -> str:
+            return 'Lookup'
+
+        def should_execute(self, request: dict) -> bool:
+            return True
+
+        def execute(self, request: dict) -> ProcessingResponse:
+            return ProcessingResponse.done()
+
+        def compensate(self, request: dict, e: Exception) -> ProcessingResponse:
+            raise e
+
+    approve = compile_statement(('Approve', lambda _: True, Flaky()))
+
+    assert TransactionExecutorMiddleware(approve)({}).status == 'success'
+    with pytest.raises(ValueError):
+        TransactionExecutorMiddleware(approve, _policy())
+
+    lookup = keyed(Lookup(), types=['purchase'])
+
+    assert is_idempotent(lookup)
+    assert TransactionExecutorMiddleware(lookup, _policy())({}).status == 'success'
+
+
+def test_retry_middleware_should_retry_the_next_middlewares():
+    flaky = Flaky(ClientError(status_code=429))
+    callstack = make_middleware_callstack([RetryMiddleware(_policy()), flaky])
+
+    assert callstack({}).status == 'success'
+    assert flaky.calls == 2
+
+    with pytest.raises(ValueError):
+        make_middleware_callstack([RetryMiddleware(_policy())])({})
+
+
+def test_asset_helper_should_retry_the_transient_connect_errors():
+    get = Flaky(ClientError(status_code=502))
+
+    class Asset:
+        def get(self):
+            get()
+            return {'id': 'AS-0000-0000-0000'}
+
+    class Client:
+        assets = {'AS-0000-0000-0000': Asset()}
+
+    class Helper(WithAssetHelper):
+        client = Client()
+        retry_policy = _policy()
+
+    assert Helper().find_asset('AS-0000-0000-0000').asset_id() == 'AS-0000-0000-0000'
+    assert get.calls == 2
+
+    Helper.retry_policy = None
+    get.errors = [ClientError(status_code=502)]
+    with pytest.raises(ClientError):
+        Helper().find_asset('AS-0000-0000-0000')
+
+
+def test_asset_helper_should_not_retry_the_status_transitions():
+    post = Flaky(ClientError(status_code=503))
+
+    class Request:
+        def __call__(self, status):
+            return self
+
+        def post(self, payload):
+            post()
+
+    class Client:
+        requests = {'PR-0000-0000-0000-001': Request()}
+
+    class Helper(WithAssetHelper):
+        client = Client()
+        retry_policy = _policy()
+
+    request = RequestBuilder().with_id('PR-0000-0000-0000-001')
+    with pytest.raises(ClientError):
+        Helper().approve_asset_request(request, 'TL-000-000-000')
+
+    assert post.calls == 1
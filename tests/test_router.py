@@ -1,3 +1,7 @@
+import asyncio
+import logging
+import threading
+import time
 from typing import Dict, Type
 
 import pytest
@@ -7,7 +11,23 @@ from tests.dummy_extension.custom_events import HelloWorld
 from tests.dummy_extension.extension import AbstractExtension
 
 from connect.eaas.core.responses import CustomEventResponse, ProductActionResponse
-from connect.processors_toolkit.router import Router, Route, CustomEventNotFound
+from connect.processors_toolkit.application import Dependencies, WarmUpFailure
+from connect.processors_toolkit.configuration.mixins import WithConfigurationHelper
+from connect.processors_toolkit.logger.mixins import WithBoundedLogger
+from connect.processors_toolkit.metrics import MetricsRegistry
+from connect.processors_toolkit.router import (
+    CustomEventNotFound,
+    PatternMatcher,
+    PoolStats,
+    ProductActionNotFound,
+    Reusable,
+    ResponseCache,
+    Route,
+    RouteCache,
+    RouteLimit,
+    Router,
+    RoutingTable,
+)
 
 
 class SampleCustomEvent(CustomEventNotFound):
@@ -115,3 +135,593 @@ def test_dispatcher_should_dispatch_action_not_found_controller(sync_client_fact
 
     assert isinstance(response, ProductActionResponse)
     assert response.http_status == 404
+
+
+def test_dispatcher_should_list_and_compile_every_routed_controller(sync_client_factory, logger):
+    client = sync_client_factory([])
+    config = {'my_app_name': 'cool-app-name'}
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.custom-event.hello-world': HelloWorld,
+                'product.custom-event.hello-world-again': HelloWorld,
+                'product.action.sso': SSO,
+            }
+
+    extension = MyDummyExtension(client, logger, config)
+    controllers = extension.controllers()
+
+    assert controllers == [HelloWorld, SSO, CustomEventNotFound, ProductActionNotFound]
+    assert extension.container.compile(controllers) is extension.container
+
+
+def test_dispatcher_should_report_every_controller_failure_on_warm_up(sync_client_factory, logger):
+    class NeedsConfiguration(CustomEventNotFound, WithConfigurationHelper):
+        def __init__(self, config):
+            self.config = config
+            self.api_key = self.configuration('API_KEY')
+
+    class NeedsRequestData(CustomEventNotFound):
+        def __init__(self, request):
+            self.request_id = request.asset().asset_id()
+
+    class Broken(CustomEventNotFound):
+        def __init__(self, config):
+            if not config.get('BROKEN_ENABLED'):
+                raise RuntimeError('broken')
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.custom-event.hello-world': HelloWorld,
+                'product.custom-event.configured': NeedsConfiguration,
+                'product.custom-event.request': NeedsRequestData,
+                'product.custom-event.broken': Broken,
+                'product.action.sso': SSO,
+            }
+
+    extension = MyDummyExtension(sync_client_factory([]), logger, {})
+
+    with pytest.raises(WarmUpFailure) as e:
+        extension.warm_up(extension.controllers())
+
+    assert list(e.value.failures.keys()) == [HelloWorld, NeedsConfiguration, Broken]
+    assert isinstance(e.value.failures[Broken], RuntimeError)
+
+    configured = MyDummyExtension(sync_client_factory([]), logger, {
+        'my_app_name': 'app',
+        'API_KEY': 'secret',
+        'BROKEN_ENABLED': 'yes',
+    })
+
+    assert configured.warm_up(configured.controllers()) is configured
+
+
+def test_routing_table_should_validate_the_route_keys():
+    with pytest.raises(ValueError):
+        RoutingTable({'product.invalid.sso': SSO}, {})
+
+    with pytest.raises(ValueError):
+        RoutingTable({'product.action': SSO}, {})
+
+    with pytest.raises(ValueError):
+        RoutingTable({}, {'asset.action': SSO})
+
+
+def test_dispatcher_should_compile_the_routing_table_once_per_class(sync_client_factory, logger, mocker):
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.action.sso': SSO,
+            }
+
+    routes = mocker.spy(MyDummyExtension, 'routes')
+
+    for action_id in ['sso', 'unknown-action-id', None]:
+        extension = MyDummyExtension(sync_client_factory([]), logger, {})
+        extension.route_and_dispatch_product_action({'jwt_payload': {'action_id': action_id}})
+
+    table = extension.routing_table()
+
+    assert routes.call_count == 1
+    assert table.lookup(Route.PROCESS_ACTION, 'sso') == SSO
+    assert table.lookup(Route.PROCESS_ACTION, None) == ProductActionNotFound
+    assert table.lookup(Route.PROCESS_CUSTOM_EVENT, 'sso') == CustomEventNotFound
+
+
+def test_pattern_matcher_should_prefer_literals_then_params_then_wildcards():
+    matcher = PatternMatcher() \
+        .add('sso-*', 'sso') \
+        .add('sso-google', 'sso-google') \
+        .add('report-<report_id>', 'report') \
+        .add('report-<report_id>-<format>', 'report-format') \
+        .add('*', 'any')
+
+    assert matcher.match('sso-google') == ('sso-google', {})
+    assert matcher.match('sso-okta') == ('sso', {})
+    assert matcher.match('report-42') == ('report', {'report_id': '42'})
+    assert matcher.match('report-42-pdf') == ('report-format', {'report_id': '42', 'format': 'pdf'})
+    assert matcher.match('unknown') == ('any', {})
+    assert PatternMatcher().add('report-<id>', 'report').match('report-') is None
+
+    with pytest.raises(ValueError):
+        PatternMatcher().add('report-<id', 'report')
+
+
+def test_pattern_matcher_should_capture_single_segments_without_backtracking():
+    matcher = PatternMatcher() \
+        .add('<a>-<b>-<c>-<d>-x', 'params') \
+        .add('*-*-*-*-x', 'wildcards')
+
+    assert matcher.match('a-b-c-d-x') == ('params', {'a': 'a', 'b': 'b', 'c': 'c', 'd': 'd'})
+    assert matcher.match('a-b-c-d-e-x') == ('wildcards', {})
+    assert matcher.match('a.b-c-d-e') is None
+
+    started = time.perf_counter()
+    assert matcher.match('a-' * 1000 + 'y') is None
+    assert matcher.match('a' * 2000) is None
+    assert time.perf_counter() - started < 1
+
+
+def test_dispatcher_should_inject_the_captured_route_params(sync_client_factory, logger):
+    class DownloadReport(ProductActionNotFound):
+        def __init__(self, route_params):
+            self.route_params = route_params
+
+        def handle(self, request: dict) -> ProductActionResponse:
+            return ProductActionResponse.done(
+                http_status=302,
+                headers={'Location': f"https://reports/{self.route_params['report_id']}"},
+            )
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.action.sso': SSO,
+                'product.action.report-<report_id>': DownloadReport,
+            }
+
+    extension = MyDummyExtension(sync_client_factory([]), logger, {})
+    response = extension.route_and_dispatch_product_action({'jwt_payload': {'action_id': 'report-42'}})
+
+    assert response.http_status == 302
+    assert response.headers.get('Location') == 'https://reports/42'
+    assert extension.routing_table().match(Route.PROCESS_ACTION, 'sso') == (SSO, {})
+    assert extension.container.get(DownloadReport).route_params == {}
+
+
+def test_dispatcher_should_share_the_request_scoped_dependencies_of_the_exact_routes(sync_client_factory, logger):
+    class ApiClient:
+        pass
+
+    class Status(ProductActionNotFound):
+        def __init__(self, api_client, route_params):
+            self.api_client = api_client
+            self.route_params = route_params
+
+        def handle(self, request: dict) -> ProductActionResponse:
+            return ProductActionResponse.done(http_status=200, body=self.api_client)
+
+    class MyDummyExtension(AbstractExtension):
+        def dependencies(self) -> Dependencies:
+            return Dependencies().to_class('api_client', ApiClient)
+
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.action.status': Status,
+            }
+
+    extension = MyDummyExtension(sync_client_factory([]), logger, {})
+    request = {'jwt_payload': {'action_id': 'status'}}
+
+    with extension.request_scope(request) as container:
+        api_client = container.get(Status).api_client
+        # the request-scoped dependencies are built once per request, the controller shares them.
+        assert extension.route_and_dispatch_product_action(request).body is api_client
+
+
+def test_dispatcher_should_reuse_the_reusable_controllers(sync_client_factory, logger):
+    builds = []
+
+    class ReusableSSO(SSO, WithBoundedLogger, Reusable):
+        def __init__(self, logger):
+            super().__init__(logger)
+            builds.append(self)
+
+    class NeedsClient(ProductActionNotFound, Reusable):
+        def __init__(self, client):
+            self.client = client
+
+        def handle(self, request: dict) -> ProductActionResponse:
+            clients.append(self.client)
+            return ProductActionResponse.done(http_status=200)
+
+    clients = []
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.action.sso': ReusableSSO,
+                'product.action.client': NeedsClient,
+            }
+
+    for request_id in ['PR-0001', 'PR-0002', 'PR-0003']:
+        extension = MyDummyExtension(sync_client_factory([]), logger, {})
+        response = extension.route_and_dispatch_product_action({
+            'id': request_id,
+            'jwt_payload': {'action_id': 'sso'},
+        })
+
+        assert response.http_status == 302
+        assert builds[0].logger.extra['request_id'] == request_id
+
+        # the pooled controllers use the client of the dispatching application.
+        response = extension.route_and_dispatch_product_action({'jwt_payload': {'action_id': 'client'}})
+
+        assert response.http_status == 200
+        assert clients[-1] is extension.client
+
+    stats = extension.controller_pool().stats()
+
+    assert len(builds) == 1
+    assert stats[ReusableSSO] == PoolStats(hits=2, misses=1, idle=1)
+    assert stats[NeedsClient] == PoolStats(hits=2, misses=1, idle=1)
+    assert len(set(map(id, clients))) == 3
+
+
+def test_async_dispatcher_should_overlap_async_controllers_and_offload_sync_ones(sync_client_factory, logger):
+    class WaitForEachOther(CustomEventNotFound):
+        def __init__(self, route_params):
+            self.route_params = route_params
+
+        async def handle(self, request: dict) -> CustomEventResponse:
+            # both events must be in flight at once to complete.
+            arrived.append(self.route_params['name'])
+            while len(arrived) < 2:
+                await asyncio.sleep(0)
+            return CustomEventResponse.done(http_status=200, body=self.route_params['name'])
+
+    class Blocking(CustomEventNotFound):
+        def __init__(self):
+            # the sync controllers are built out of the event loop as well.
+            self.built_on = threading.current_thread().name
+
+        def handle(self, request: dict) -> CustomEventResponse:
+            return CustomEventResponse.done(http_status=200, body=(self.built_on, threading.current_thread().name))
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.custom-event.wait-<name>': WaitForEachOther,
+                'product.custom-event.blocking': Blocking,
+            }
+
+        def dispatch_workers(self) -> int:
+            return 2
+
+    arrived = []
+    extension = MyDummyExtension(sync_client_factory([]), logger, {})
+
+    async def dispatch_all():
+        return await asyncio.gather(*[
+            extension.route_and_dispatch_custom_event_async({'body': {'controller': controller}})
+            for controller in ['wait-first', 'wait-second', 'blocking', 'unknown']
+        ])
+
+    first, second, blocking, unknown = asyncio.run(dispatch_all())
+
+    assert (first.body, second.body) == ('first', 'second')
+    assert blocking.body[0] == blocking.body[1]
+    assert blocking.body[0].startswith('MyDummyExtension-dispatch')
+    assert unknown.http_status == 404
+    assert extension.dispatch_executor() is MyDummyExtension(sync_client_factory([]), logger, {}).dispatch_executor()
+
+
+def test_dispatcher_should_not_render_the_request_when_debug_is_disabled(sync_client_factory):
+    class Request(dict):
+        renders = 0
+
+        def __repr__(self):
+            Request.renders += 1
+            return super().__repr__()
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.action.sso': SSO,
+            }
+
+    logger = logging.getLogger('test_router_lazy_logging')
+    extension = MyDummyExtension(sync_client_factory([]), logging.LoggerAdapter(logger, {}), {})
+    request = Request({'jwt_payload': {'action_id': 'sso'}})
+
+    logger.setLevel(logging.INFO)
+    extension.route_and_dispatch_product_action(request)
+
+    assert Request.renders == 0
+
+    logger.setLevel(logging.DEBUG)
+    extension.route_and_dispatch_product_action(request)
+
+    assert Request.renders > 0
+
+
+def test_dispatcher_should_record_the_route_metrics(sync_client_factory, logger):
+    registry = MetricsRegistry()
+
+    class Failing(ProductActionNotFound):
+        def handle(self, request: dict) -> ProductActionResponse:
+            raise RuntimeError('boom')
+
+    class NeedsConfiguration(ProductActionNotFound, WithConfigurationHelper):
+        def __init__(self, config):
+            self.config = config
+            self.api_key = self.configuration('API_KEY')
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.action.sso-*': SSO,
+                'product.action.failing': Failing,
+                'product.action.configured': NeedsConfiguration,
+            }
+
+        def metrics(self):
+            return registry
+
+    extension = MyDummyExtension(sync_client_factory([]), logger, {})
+    for action_id in ['sso-google', 'sso-okta', 'unknown', 'configured']:
+        extension.route_and_dispatch_product_action({'jwt_payload': {'action_id': action_id}})
+
+    with pytest.raises(RuntimeError):
+        extension.route_and_dispatch_product_action({'jwt_payload': {'action_id': 'failing'}})
+
+    snapshot = registry.snapshot()
+    dispatches = {
+        (sample['labels']['route'], sample['labels']['outcome']): sample['value']
+        for sample in snapshot['connect_route_dispatches_total']['samples']
+    }
+    durations = {
+        (sample['labels']['route'], sample['labels']['stage']): sample['value']['count']
+        for sample in snapshot['connect_route_duration_seconds']['samples']
+    }
+
+    assert dispatches == {
+        ('product.action.sso-*', 'ok'): 2,
+        ('product.action', 'ok'): 1,
+        ('product.action.configured', 'bootstrap_error'): 1,
+        ('product.action.failing', 'error'): 1,
+    }
+    assert durations[('product.action.sso-*', 'resolve')] == 2
+    assert durations[('product.action.sso-*', 'handle')] == 2
+    assert ('product.action.configured', 'handle') not in durations
+    assert snapshot['connect_route_bootstrap_errors_total']['samples'] == [{
+        'labels': {'route': 'product.action.configured', 'error': 'MissingConfigurationParameterError'},
+        'value': 1.0,
+    }]
+
+
+def test_dispatcher_should_bound_the_concurrent_events_of_each_route(sync_client_factory, logger):
+    registry = MetricsRegistry()
+    started = threading.Event()
+    release = threading.Event()
+
+    class Export(CustomEventNotFound):
+        def handle(self, request: dict) -> CustomEventResponse:
+            started.set()
+            release.wait(5)
+            return CustomEventResponse.done(http_status=200)
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.custom-event.export': Export,
+                'product.action.sso': SSO,
+            }
+
+        def route_limits(self) -> Dict[str, RouteLimit]:
+            return {
+                'product.custom-event.export': RouteLimit(max_concurrency=1, max_queue=1, queue_timeout=0.2),
+            }
+
+        def metrics(self):
+            return registry
+
+    def queue_depth() -> float:
+        samples = registry.snapshot().get('connect_route_queue_depth', {'samples': []})['samples']
+        return samples[0]['value'] if samples else 0
+
+    extension = MyDummyExtension(sync_client_factory([]), logger, {})
+    responses = {}
+
+    def export(name: str):
+        responses[name] = extension.route_and_dispatch_custom_event({'body': {'controller': 'export'}})
+
+    running = threading.Thread(target=export, args=['running'])
+    running.start()
+    started.wait(5)
+    queued = threading.Thread(target=export, args=['queued'])
+    queued.start()
+    while queue_depth() < 1:
+        threading.Event().wait(0.001)
+
+    assert extension.route_and_dispatch_custom_event({'body': {'controller': 'export'}}).http_status == 429
+    # the other routes are not bounded by the export limit.
+    assert extension.route_and_dispatch_product_action({'jwt_payload': {'action_id': 'sso'}}).http_status == 302
+
+    queued.join()
+    release.set()
+    running.join()
+
+    assert responses['queued'].http_status == 503
+    assert responses['running'].http_status == 200
+    assert extension.route_and_dispatch_custom_event({'body': {'controller': 'export'}}).http_status == 200
+    assert queue_depth() == 0
+    assert {
+        sample['labels']['reason']: sample['value']
+        for sample in registry.snapshot()['connect_route_rejections_total']['samples']
+    } == {'full': 1, 'timeout': 1}
+
+
+def test_dispatcher_should_release_the_route_slot_on_any_bootstrap_error(sync_client_factory, logger):
+    class Broken(CustomEventNotFound):
+        def __init__(self):
+            raise RuntimeError('broken')
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.custom-event.broken': Broken,
+            }
+
+        def route_limits(self) -> Dict[str, RouteLimit]:
+            return {
+                'product.custom-event.broken': RouteLimit(max_concurrency=1),
+            }
+
+    extension = MyDummyExtension(sync_client_factory([]), logger, {})
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            extension.route_and_dispatch_custom_event({'body': {'controller': 'broken'}})
+
+
+def test_async_dispatcher_should_release_the_route_slot_of_the_cancelled_events(sync_client_factory, logger):
+    registry = MetricsRegistry()
+    started = threading.Event()
+    release = threading.Event()
+
+    class Export(CustomEventNotFound):
+        def handle(self, request: dict) -> CustomEventResponse:
+            started.set()
+            release.wait(5)
+            return CustomEventResponse.done(http_status=200)
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.custom-event.export': Export,
+            }
+
+        def route_limits(self) -> Dict[str, RouteLimit]:
+            return {
+                'product.custom-event.export': RouteLimit(max_concurrency=1, max_queue=1, queue_timeout=2),
+            }
+
+        def metrics(self):
+            return registry
+
+    def queue_depth() -> float:
+        samples = registry.snapshot().get('connect_route_queue_depth', {'samples': []})['samples']
+        return samples[0]['value'] if samples else 0
+
+    extension = MyDummyExtension(sync_client_factory([]), logger, {})
+
+    def export():
+        request = {'body': {'controller': 'export'}}
+        return asyncio.ensure_future(extension.route_and_dispatch_custom_event_async(request))
+
+    async def cancel_the_queued_event():
+        running = export()
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        queued = export()
+        while queue_depth() < 1:
+            await asyncio.sleep(0.001)
+
+        queued.cancel()
+        release.set()
+        assert (await running).http_status == 200
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+
+        # the slot taken by the cancelled event once the running one is done is released.
+        return await export()
+
+    assert asyncio.run(cancel_the_queued_event()).http_status == 200
+
+
+def test_route_limit_should_validate_the_limits():
+    with pytest.raises(ValueError):
+        RouteLimit(max_concurrency=0)
+
+    with pytest.raises(ValueError):
+        RouteLimit(max_concurrency=1, max_queue=-1)
+
+
+def test_dispatcher_should_serve_the_cached_responses_of_the_cached_routes(sync_client_factory, logger):
+    registry = MetricsRegistry()
+
+    class Lookup(CustomEventNotFound):
+        builds = 0
+
+        def __init__(self, route_params):
+            Lookup.builds += 1
+            self.route_params = route_params
+
+        def handle(self, request: dict) -> CustomEventResponse:
+            if request['body']['data'].get('fail'):
+                return CustomEventResponse.done(http_status=400)
+            return CustomEventResponse.done(http_status=200, body=request['body']['data'])
+
+    class MyDummyExtension(AbstractExtension):
+        def routes(self) -> Dict[str, Type]:
+            return {
+                'product.custom-event.lookup-<entity>': Lookup,
+            }
+
+        def route_caches(self) -> Dict[str, RouteCache]:
+            return {
+                'product.custom-event.lookup-<entity>': RouteCache(ttl=60, fields=('body.data',)),
+            }
+
+        def metrics(self):
+            return registry
+
+    extension = MyDummyExtension(sync_client_factory([]), logger, {})
+
+    def lookup(entity: str, data: dict) -> CustomEventResponse:
+        return extension.route_and_dispatch_custom_event({
+            'body': {'controller': f'lookup-{entity}', 'data': data, 'timestamp': Lookup.builds},
+        })
+
+    assert lookup('tier', {'id': 'TC-1', 'q': [1, 2]}).body == {'id': 'TC-1', 'q': [1, 2]}
+    assert lookup('tier', {'q': [1, 2], 'id': 'TC-1'}).body == {'id': 'TC-1', 'q': [1, 2]}
+    assert lookup('asset', {'id': 'TC-1', 'q': [1, 2]}).http_status == 200
+    assert lookup('tier', {'fail': True}).http_status == 400
+    assert lookup('tier', {'fail': True}).http_status == 400
+    assert Lookup.builds == 4
+
+    stats = extension.response_cache().stats()['product.custom-event.lookup-<entity>']
+    assert (stats.hits, stats.misses, stats.size) == (1, 4, 2)
+    assert {
+        sample['labels']['result']: sample['value']
+        for sample in registry.snapshot()['connect_route_cache_lookups_total']['samples']
+    } == {'hit': 1, 'miss': 4}
+
+
+def test_response_cache_should_expire_and_evict_the_responses():
+    now = [0.0]
+    cache = ResponseCache({'route': RouteCache(ttl=10, maxsize=2, fields=('body',))}, clock=lambda: now[0])
+    first, second, third = [cache.key('route', None, {'body': {'id': i}}) for i in range(3)]
+
+    assert cache.key('other', None, {'body': {}}) is None
+
+    cache.put('route', first, CustomEventResponse.done(body={'name': 'first'}))
+    cache.put('route', second, CustomEventResponse.done(body={'name': 'second'}))
+    cache.put('route', third, CustomEventResponse.fail(body={'name': 'third'}))
+    cache.put('route', third, CustomEventResponse.done(http_status=503, body={'name': 'third'}))
+    assert cache.stats()['route'].size == 2
+    assert cache.get('route', third) is None
+
+    # the hits do not share their body.
+    cache.get('route', first).body['name'] = 'changed'
+    assert cache.get('route', first).body == {'name': 'first'}
+
+    cache.put('route', third, CustomEventResponse.done(body={'name': 'third'}))
+    assert cache.get('route', second) is None
+    assert cache.get('route', first).body == {'name': 'first'}
+
+    now[0] = 10.0
+    assert cache.get('route', third) is None
+    assert cache.stats()['route'].evictions == 1
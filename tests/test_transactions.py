@@ -1,10 +1,28 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 import pytest
 from connect.eaas.core.responses import ProcessingResponse
 from connect.processors_toolkit.requests import RequestBuilder
-from connect.processors_toolkit.transactions import make_middleware_callstack, TransactionSelector, TransactionExecutorMiddleware
+from connect.processors_toolkit.offline import OfflineCriteria
+from connect.processors_toolkit.transactions import (
+    AsyncTransactionExecutorMiddleware,
+    keyed,
+    make_async_middleware_callstack,
+    make_middleware_callstack,
+    select,
+    TransactionExecutorMiddleware,
+    TransactionSelector,
+)
+from connect.processors_toolkit.metrics import MetricsRegistry
+from connect.processors_toolkit.transactions.batch import BatchExecutor
+from connect.processors_toolkit.transactions.graph import TransactionGraph
+from connect.processors_toolkit.transactions.journal import SQLiteSagaJournal
+from connect.processors_toolkit.transactions.pipeline import Pipeline
 from connect.processors_toolkit.transactions.contracts import (
+    AsyncProcessingTransactionStatement,
     FnProcessingTransaction,
     ProcessingTransactionStatement,
 )
@@ -99,12 +117,16 @@ def test_transaction_selector_should_raise_exception_on_invalid_statement():
         .with_param('PARAM_CUSTOMER_ID', 'eda1b4f1-a3a8-4a87-bd3f-ad71f6c2e93e') \
         .raw()
 
-    ts = TransactionSelector([
-        CreateCustomer,
-    ])
+    with pytest.raises(InvalidTransactionStatement):
+        TransactionSelector([
+            CreateCustomer,
+        ])
 
     with pytest.raises(InvalidTransactionStatement):
-        ts.select(request)
+        select([CreateCustomer(), 'garbage'], request)
+
+    with pytest.raises(InvalidTransactionStatement):
+        keyed('garbage', types=['purchase'])
 
 
 def test_transaction_selector_should_raise_exception_on_transaction_not_selected():
@@ -119,6 +141,33 @@ def test_transaction_selector_should_raise_exception_on_transaction_not_selected
         ts.select(request)
 
 
+def test_transaction_selector_should_only_evaluate_the_candidates_of_the_request_keys():
+    evaluated = []
+
+    def predicate(name: str):
+        def __predicate(_: dict) -> bool:
+            evaluated.append(name)
+            return True
+
+        return __predicate
+
+    ts = TransactionSelector([
+        keyed(('Setup', predicate('Setup'), approve_request), models=['tier-config']),
+        keyed(('Inquire', predicate('Inquire'), approve_request), types=['purchase'], statuses=['inquiring']),
+        keyed(('Purchase', predicate('Purchase'), approve_request), types=['purchase', 'change'], models=['asset']),
+        ('Fallback', predicate('Fallback'), approve_request),
+    ])
+
+    purchase = RequestBuilder().with_type('purchase').with_status('pending').raw()
+    setup = RequestBuilder().with_type('setup').with_status('pending').raw()
+
+    assert ts.select(purchase).name() == 'Purchase'
+    assert ts.select(setup).name() == 'Setup'
+    assert ts.select(RequestBuilder().with_type('cancel').raw()).name() == 'Fallback'
+    assert evaluated == ['Purchase', 'Setup', 'Fallback']
+    assert ts.candidates(purchase) is ts.candidates(RequestBuilder().with_type('purchase').with_status('pending').raw())
+
+
 def tests_transaction_preparer_should_build_a_transaction_callstack_successfully():
     executor = TransactionExecutorMiddleware(CreateCustomer())
     transaction = make_middleware_callstack([
@@ -135,3 +184,362 @@ def tests_transaction_preparer_should_build_a_transaction_callstack_successfully
     )
 
     assert response.status == 'success'
+
+
+def test_pipeline_should_record_the_self_time_of_each_stage_and_statement():
+    now = [0.0]
+    registry = MetricsRegistry()
+
+    def tick(seconds: float):
+        now[0] += seconds
+
+    def offline(request: dict, nxt: Optional[FnProcessingTransaction] = None) -> ProcessingResponse:
+        tick(1)
+        return nxt(request)
+
+    def slow_should_execute(request: dict) -> bool:
+        tick(2)
+        return True
+
+    def failing(request: dict) -> ProcessingResponse:
+        tick(4)
+        raise RuntimeError('boom')
+
+    def compensate(request: dict, e: Exception) -> ProcessingResponse:
+        return ProcessingResponse.fail(output=str(e))
+
+    pipeline = Pipeline(
+        [offline, mdl_one],
+        TransactionSelector([('Failing', slow_should_execute, failing, compensate)]),
+        registry,
+        name='purchase',
+        clock=lambda: now[0],
+    )
+
+    for _ in range(2):
+        assert pipeline(RequestBuilder().with_status('pending').raw()).status == 'fail'
+
+    stats = pipeline.stats()
+    assert {stage: (s.calls, s.errors, s.total) for stage, s in stats.items()} == {
+        'middleware.offline': (2, 0, 2.0),
+        'middleware.mdl_one': (2, 0, 0.0),
+        'select': (2, 0, 4.0),
+        'statement.Failing': (2, 2, 8.0),
+    }
+    assert registry.snapshot()['connect_pipeline_stage_errors_total']['samples'] == [{
+        'labels': {'pipeline': 'purchase', 'stage': 'statement.Failing', 'error': 'RuntimeError'},
+        'value': 2.0,
+    }]
+
+
+def test_pipeline_should_record_the_middleware_exceptions():
+    def broken(request: dict, nxt: Optional[FnProcessingTransaction] = None) -> ProcessingResponse:
+        raise ValueError('broken')
+
+    pipeline = Pipeline([mdl_one, broken])
+
+    with pytest.raises(ValueError):
+        pipeline({})
+
+    assert pipeline.stats()['middleware.broken'].errors == 1
+    assert pipeline.stats()['middleware.mdl_one'].errors == 1
+
+    with pytest.raises(ValueError):
+        Pipeline([])
+
+
+class ProvisionSubscription(AsyncProcessingTransactionStatement):
+    def name(self) -> str:
+        return 'Provision Subscription'
+
+    def should_execute(self, request: dict) -> bool:
+        return True
+
+    async def execute(self, request: dict) -> ProcessingResponse:
+        # waiting on the vendor api.
+        await asyncio.sleep(0.01)
+        raise RuntimeError('vendor unavailable')
+
+    async def compensate(self, request: dict, e: Exception) -> ProcessingResponse:
+        return ProcessingResponse.fail(output=str(e))
+
+
+def test_async_callstack_should_mix_sync_and_async_middlewares():
+    calls = []
+
+    async def async_mdl(request: dict, nxt=None) -> ProcessingResponse:
+        calls.append(('async before', threading.current_thread() is threading.main_thread()))
+        response = await nxt(request)
+        calls.append(('async after', threading.current_thread() is threading.main_thread()))
+        return response
+
+    def sync_mdl(request: dict, nxt=None) -> ProcessingResponse:
+        calls.append(('sync before', threading.current_thread() is threading.main_thread()))
+        response = nxt(request)
+        calls.append(('sync after', threading.current_thread() is threading.main_thread()))
+        return response
+
+    request = RequestBuilder().with_status('pending').raw()
+    callstack = make_async_middleware_callstack([
+        async_mdl,
+        sync_mdl,
+        OfflineCriteria([]),
+        AsyncTransactionExecutorMiddleware(CreateCustomer()),
+    ], ThreadPoolExecutor(max_workers=1))
+
+    assert asyncio.run(callstack(request)).status == 'success'
+    assert calls == [
+        ('async before', True),
+        ('sync before', False),
+        ('sync after', False),
+        ('async after', True),
+    ]
+
+
+def test_async_callstack_should_not_deadlock_with_more_requests_than_workers():
+    async def async_mdl(request: dict, nxt=None) -> ProcessingResponse:
+        await asyncio.sleep(0.001)
+        return await nxt(request)
+
+    def sync_statement(request: dict, nxt=None) -> ProcessingResponse:
+        return ProcessingResponse.done()
+
+    callstack = make_async_middleware_callstack([
+        mdl_one,
+        async_mdl,
+        mdl_two,
+        sync_statement,
+    ], ThreadPoolExecutor(max_workers=2))
+
+    async def process_all():
+        return await asyncio.wait_for(asyncio.gather(*[callstack({'id': f'PR-{i}'}) for i in range(16)]), 5)
+
+    assert {response.status for response in asyncio.run(process_all())} == {'success'}
+
+
+def test_async_callstack_should_overlap_the_in_flight_requests():
+    callstack = make_async_middleware_callstack([
+        mdl_one,
+        AsyncTransactionExecutorMiddleware(ProvisionSubscription()),
+    ])
+
+    async def process_all():
+        return await asyncio.gather(*[callstack({'id': f'PR-{i}'}) for i in range(100)])
+
+    loop = asyncio.new_event_loop()
+    try:
+        started = loop.time()
+        responses = loop.run_until_complete(process_all())
+        elapsed = loop.time() - started
+    finally:
+        loop.close()
+
+    assert {response.status for response in responses} == {'fail'}
+    # the 100 requests wait on the vendor at once, not one after the other.
+    assert elapsed < 100 * 0.01
+
+
+def test_batch_executor_should_keep_the_asset_order_and_report_in_input_order():
+    executed = []
+    lock = threading.Lock()
+
+    def execute(request: dict) -> ProcessingResponse:
+        # the later requests of each asset finish first if they are not ordered.
+        threading.Event().wait(0.02 / (1 + request['seq']))
+        with lock:
+            executed.append((request['asset']['id'], request['seq']))
+        if request['seq'] == 3:
+            raise RuntimeError('boom')
+        return ProcessingResponse.done()
+
+    ts = TransactionSelector([
+        ('Unknown', lambda request: request['type'] == 'unknown', lambda _: None),
+        ('Purchase', lambda request: request['type'] == 'purchase', execute),
+        ('Change', lambda request: request['type'] == 'change', execute, lambda request, e: ProcessingResponse.fail()),
+    ])
+
+    requests = iter([
+        {'type': 'purchase', 'seq': 0, 'asset': {'id': 'AS-1'}},
+        {'type': 'purchase', 'seq': 1, 'asset': {'id': 'AS-2'}},
+        {'type': 'change', 'seq': 2, 'asset': {'id': 'AS-1'}},
+        {'type': 'change', 'seq': 3, 'asset': {'id': 'AS-2'}},
+        {'type': 'suspend', 'seq': 4, 'asset': {'id': 'AS-1'}},
+        {'type': 'purchase', 'seq': 5, 'asset': {'id': 'AS-1'}},
+    ])
+
+    results, stats = BatchExecutor(ts, max_workers=4).run(requests)
+
+    assert [result.request['seq'] for result in results] == [0, 1, 2, 3, 4, 5]
+    assert [result.statement for result in results] == ['Purchase', 'Purchase', 'Change', 'Change', None, 'Purchase']
+    assert [result.ok for result in results] == [True, True, True, True, False, True]
+    assert results[3].response.status == 'fail'
+    assert isinstance(results[4].error, TransactionStatementNotSelected)
+    assert [seq for asset, seq in executed if asset == 'AS-1'] == [0, 2, 5]
+    assert [seq for asset, seq in executed if asset == 'AS-2'] == [1, 3]
+    assert (stats.requests, stats.succeeded, stats.failed) == (6, 5, 1)
+    assert {name: statement.count for name, statement in stats.statements.items()} == {'Purchase': 3, 'Change': 2}
+    assert stats.throughput() > 0
+
+
+def test_batch_executor_should_report_any_selection_error_per_request():
+    ts = TransactionSelector([
+        ('Purchase', lambda request: request['type'] == 'purchase', lambda _: ProcessingResponse.done()),
+    ])
+
+    results, stats = BatchExecutor(ts).run([{'type': 'purchase'}, {'id': 'PR-1'}])
+
+    assert [result.ok for result in results] == [True, False]
+    assert isinstance(results[1].error, KeyError)
+    assert (stats.requests, stats.succeeded, stats.failed) == (2, 1, 1)
+
+
+def _graph_step(name: str, log: list, barrier: Optional[threading.Barrier] = None, fail: bool = False):
+    def __execute(request: dict) -> ProcessingResponse:
+        if barrier is not None:
+            # the independent branches must run at once to pass the barrier.
+            barrier.wait(5)
+        if fail:
+            raise RuntimeError(f'{name} failed')
+        log.append(('execute', name))
+        return ProcessingResponse.done()
+
+    def __compensate(request: dict, e: Exception) -> ProcessingResponse:
+        log.append(('compensate', name))
+        return ProcessingResponse.fail(output=str(e))
+
+    return name, lambda _: True, __execute, __compensate
+
+
+def test_transaction_graph_should_run_the_independent_branches_concurrently():
+    log = []
+    barrier = threading.Barrier(2)
+    graph = TransactionGraph() \
+        .add(_graph_step('Create Customer', log)) \
+        .add(_graph_step('Provision Licences', log, barrier), after=['Create Customer']) \
+        .add(_graph_step('Create Vendor Account', log, barrier), after=['Create Customer']) \
+        .add(('Notify', lambda _: False, approve_request), after=['Create Vendor Account']) \
+        .add(_graph_step('Approve', log), after=['Provision Licences', 'Notify'])
+
+    result = graph.execute(RequestBuilder().raw())
+
+    assert result.ok
+    assert result.completed == ['Create Customer', 'Provision Licences', 'Create Vendor Account', 'Approve']
+    assert result.skipped == ['Notify']
+    assert log[0] == ('execute', 'Create Customer')
+    assert log[-1] == ('execute', 'Approve')
+    assert result.response.status == 'success'
+
+
+def test_transaction_graph_should_compensate_in_reverse_topological_order():
+    log = []
+    graph = TransactionGraph(max_workers=1) \
+        .add(_graph_step('Create Customer', log)) \
+        .add(_graph_step('Provision Licences', log), after=['Create Customer']) \
+        .add(_graph_step('Create Vendor Account', log, fail=True), after=['Create Customer']) \
+        .add(('Create Subscription', should_create_subscription, create_subscription), after=['Provision Licences']) \
+        .add(_graph_step('Approve', log), after=['Create Vendor Account'])
+
+    result = graph.execute(RequestBuilder().raw())
+
+    assert not result.ok
+    assert list(result.failed) == ['Create Vendor Account']
+    assert 'Approve' not in result.completed
+    assert result.compensated == ['Create Vendor Account', 'Provision Licences', 'Create Customer']
+    assert log[-3:] == [
+        ('compensate', 'Create Vendor Account'),
+        ('compensate', 'Provision Licences'),
+        ('compensate', 'Create Customer'),
+    ]
+    # the tuple statements without compensation are not compensated.
+    assert 'Create Subscription' not in result.compensation_errors
+    assert result.response.status == 'fail'
+
+
+def test_transaction_graph_should_halt_on_non_successful_responses():
+    def provision(request: dict) -> ProcessingResponse:
+        return ProcessingResponse.reschedule(60)
+
+    log = []
+    journal = SQLiteSagaJournal()
+    graph = TransactionGraph(max_workers=1, journal=journal) \
+        .add(_graph_step('Create Customer', log)) \
+        .add(('Provision Licences', lambda _: True, provision), after=['Create Customer']) \
+        .add(_graph_step('Approve', log), after=['Provision Licences'])
+
+    result = graph.execute({'id': 'PR-1'})
+
+    assert not result.ok
+    assert list(result.halted) == ['Provision Licences']
+    assert result.completed == ['Create Customer']
+    assert result.compensated == []
+    assert result.response.status == 'reschedule'
+    assert log == [('execute', 'Create Customer')]
+    assert list(journal.completed('PR-1')) == ['Create Customer']
+
+
+def test_transaction_graph_should_validate_the_dependencies():
+    with pytest.raises(ValueError):
+        TransactionGraph().add(CreateCustomer()).add(CreateCustomer())
+
+    with pytest.raises(ValueError):
+        TransactionGraph().add(CreateCustomer(), after=['Unknown']).order()
+
+    graph = TransactionGraph() \
+        .add(('A', should_approve_request, approve_request), after=['B']) \
+        .add(('B', should_approve_request, approve_request), after=['A'])
+
+    with pytest.raises(ValueError):
+        graph.execute({})
+
+
+def test_transaction_graph_should_resume_the_journaled_request_from_the_first_incomplete_statement(tmp_path):
+    calls = []
+    vendor_available = [False]
+
+    def create_account(request: dict) -> ProcessingResponse:
+        calls.append('Create Account')
+        return ProcessingResponse(status='success', output={'account_id': 'ACC-1'})
+
+    def provision(request: dict) -> ProcessingResponse:
+        calls.append('Provision')
+        if not vendor_available[0]:
+            raise TimeoutError('vendor timeout')
+        return ProcessingResponse.done()
+
+    def graph(journal: SQLiteSagaJournal) -> TransactionGraph:
+        return TransactionGraph(journal=journal) \
+            .add(('Create Account', lambda _: True, create_account)) \
+            .add(('Provision', lambda _: True, provision), after=['Create Account']) \
+            .add(('Approve', lambda _: True, approve_request), after=['Provision'])
+
+    request = RequestBuilder().with_id('PR-0000-0000-0000-001').raw()
+
+    first = graph(SQLiteSagaJournal(str(tmp_path / 'saga.db'))).execute(request)
+
+    vendor_available[0] = True
+    journal = SQLiteSagaJournal(str(tmp_path / 'saga.db'))
+    second = graph(journal).execute(request)
+
+    assert not first.ok
+    assert second.ok
+    assert second.resumed == ['Create Account']
+    assert second.responses['Create Account'].output == {'account_id': 'ACC-1'}
+    assert calls == ['Create Account', 'Provision', 'Provision']
+    assert list(journal.completed('PR-0000-0000-0000-001')) == ['Create Account', 'Provision', 'Approve']
+    assert graph(journal).execute(request).resumed == ['Create Account', 'Provision', 'Approve']
+
+    assert journal.prune(older_than=-1) == 3
+    assert journal.completed('PR-0000-0000-0000-001') == {}
+
+
+def test_saga_journal_should_forget_the_compensated_statements():
+    log = []
+    journal = SQLiteSagaJournal()
+    graph = TransactionGraph(journal=journal) \
+        .add(_graph_step('Create Customer', log)) \
+        .add(_graph_step('Create Vendor Account', log, fail=True), after=['Create Customer'])
+
+    result = graph.execute({'id': 'PR-1'})
+
+    assert result.compensated == ['Create Vendor Account', 'Create Customer']
+    assert journal.completed('PR-1') == {}